@@ -0,0 +1,129 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, get_ident
+
+from nio.util.threading import spawn
+
+from .fan_out import SignalIsolation
+from .router import ServiceTestRouter
+
+
+class AsyncServiceTestRouter(ServiceTestRouter):
+
+    """ Router delivering signals from a single asyncio event loop
+
+    Blocks doing light CPU work process their signals directly on the loop
+    thread, one delivery after the other, in the order they were notified.
+    Blocks known to block on I/O are offloaded to a thread pool executor,
+    one delivery at a time per block so their signals stay in order too.
+
+    Deliveries notified before the loop is started are held and handed to
+    the loop once it starts, those notified after it stopped are dropped
+    with a warning.
+    """
+
+    # block types whose process_signals blocks on I/O
+    blocking_block_types = frozenset(
+        ("HostMetrics", "HostSpecs", "Publisher", "Subscriber"))
+
+    def __init__(self, signal_isolation=SignalIsolation.copy_on_write,
+                 executor_workers=4, blocking_blocks=(),
+                 instrumentation=None, coalescer=None):
+        """
+        Args:
+            signal_isolation (SignalIsolation): how receivers are isolated
+                from each other's changes to the signals
+            executor_workers (int): threads running blocking blocks
+            blocking_blocks (iterable): names of blocks to offload to the
+                executor, on top of the blocking_block_types blocks
+            instrumentation (RouterInstrumentation): when given, record
+                hops and block processing times into it
+            coalescer (SignalCoalescer): when given, batch the signals
+                sent to each block input before delivering them
+        """
+        super().__init__(False, signal_isolation=signal_isolation,
+                         instrumentation=instrumentation, coalescer=coalescer)
+        self._executor_workers = executor_workers
+        self._blocking_block_names = set(blocking_blocks)
+        self._blocking = set()
+        self._block_locks = {}
+        self._executor = None
+        self._loop = None
+        self._loop_thread = None
+        self._loop_thread_id = None
+        self._loop_started = Event()
+        self._pending = []
+        self._pending_lock = Lock()
+
+    def configure(self, context):
+        super().configure(context)
+        self._blocking = {
+            block for name, block in self._blocks.items()
+            if name in self._blocking_block_names or
+            type(block).__name__ in self.blocking_block_types}
+
+    def start(self):
+        if self._loop is not None:
+            return
+        self._executor = ThreadPoolExecutor(self._executor_workers)
+        self._loop = asyncio.new_event_loop()
+        self._loop_started.clear()
+        self._loop_thread = spawn(self._run_loop)
+        self._loop_started.wait()
+        with self._pending_lock:
+            pending, self._pending = self._pending, None
+        for args in pending or ():
+            self._loop.call_soon_threadsafe(self._schedule, *args)
+
+    def stop(self):
+        super().stop()
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join(1)
+        self._executor.shutdown(wait=False)
+        self._loop = None
+        # thread ids are reused, no other thread may pass for the loop's
+        self._loop_thread_id = None
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop_thread_id = get_ident()
+        self._loop.call_soon(self._loop_started.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def _deliver(self, to_block, signals, input_id):
+        args = (to_block, signals, input_id)
+        if get_ident() == self._loop_thread_id:
+            self._schedule(*args)
+            return
+        with self._pending_lock:
+            if self._pending is not None:
+                self._pending.append(args)
+                return
+        try:
+            self._loop.call_soon_threadsafe(self._schedule, *args)
+        except (AttributeError, RuntimeError):
+            self.logger.warning(
+                "Router stopped, dropping signals for {}".format(
+                    to_block.name()))
+
+    def _schedule(self, to_block, signals, input_id):
+        """ Runs on the loop thread, queue a delivery to the block """
+        process_args = (signals,) if input_id is None else (signals, input_id)
+        if to_block in self._blocking:
+            self._loop.create_task(self._offload(to_block, process_args))
+        else:
+            # callbacks run in the order they were scheduled
+            self._loop.call_soon(to_block.process_signals, *process_args)
+
+    async def _offload(self, to_block, process_args):
+        lock = self._block_locks.get(to_block)
+        if lock is None:
+            lock = self._block_locks[to_block] = asyncio.Lock()
+        async with lock:
+            await self._loop.run_in_executor(
+                self._executor, to_block.process_signals, *process_args)
@@ -0,0 +1,82 @@
+""" Throughput of persistence saves under each commit mode
+
+Saves 10k block states into a collection from several threads, the way
+the blocks of a service back up their state. Files used to be written in
+place, that is timed alongside the atomic modes: renaming a temporary
+file without fsync, fsyncing the file and its directory on every save,
+and group commit, where concurrent saves share directory fsyncs.
+"""
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from nio.modules.context import ModuleContext
+from nio.util.codec import save_pickle
+
+from ..modules.module_persistence_file.atomic import CommitMode
+from ..modules.module_persistence_file.persistence import Persistence
+from .common import print_table
+
+SAVES = 10000
+THREADS = 8
+STATE = {"group_{}".format(index): {"value": index, "prev": index - 1}
+         for index in range(20)}
+
+
+def _persistence(folder, commit_mode, commit_window=0):
+    context = ModuleContext()
+    context.root_folder = folder
+    context.root_id = "service"
+    context.format = Persistence.Format.pickle.value
+    context.commit_mode = commit_mode
+    context.commit_window = commit_window
+    Persistence.configure(context)
+    return Persistence()
+
+
+def _in_place(persistence, index):
+    save_pickle(persistence._get_collection_item_filename(
+        "block_{}".format(index % 100), "states", True), STATE)
+
+
+def _save(persistence, index):
+    persistence.save(STATE, "block_{}".format(index % 100), "states")
+
+
+def _run(save, persistence, saves, threads):
+    start = perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda index: save(persistence, index),
+                          range(saves)))
+    return perf_counter() - start
+
+
+def run(saves=SAVES, threads=THREADS):
+    rows = []
+    for name, mode, window, save in (
+            ("in place", CommitMode.atomic, 0, _in_place),
+            ("atomic", CommitMode.atomic, 0, _save),
+            ("durable", CommitMode.durable, 0, _save),
+            ("group", CommitMode.group, 0, _save),
+            ("group 1ms", CommitMode.group, 0.001, _save)):
+        folder = tempfile.mkdtemp()
+        try:
+            persistence = _persistence(folder, mode, window)
+            elapsed = _run(save, persistence, saves, threads)
+        finally:
+            shutil.rmtree(folder)
+        if mode is CommitMode.durable:
+            syncs = saves
+        elif mode is CommitMode.group:
+            syncs = Persistence._committer.stats()["syncs"]
+        else:
+            syncs = 0
+        rows.append((name, "{:.0f}".format(saves / elapsed),
+                     "{:.1f}us".format(elapsed / saves * 1e6), syncs))
+    print_table(("{} saves, {} threads".format(saves, threads), "saves/s",
+                 "per save", "dir fsyncs"), rows)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,74 @@
+""" Backing up a grouped block state, saved whole vs as deltas
+
+A StateChange-like state of 10k groups is backed up 100 times, a few
+groups changing between backups. Saved whole, every backup writes the
+whole state; with delta saves, backups append the groups changed and the
+state is saved whole every `delta_saves` backups. Bytes written are read
+from /proc/self/io, Linux only.
+"""
+import random
+import shutil
+import tempfile
+from time import perf_counter
+
+from nio.modules.context import ModuleContext
+
+from ..modules.module_persistence_file.persistence import Persistence
+from .common import print_table
+
+GROUPS = 10000
+BACKUPS = 100
+
+
+def _written():
+    """ Bytes written by this process so far """
+    with open("/proc/self/io") as io:
+        for line in io:
+            if line.startswith("wchar:"):
+                return int(line.split()[1])
+
+
+def _backups(delta_saves, churn, groups, backups):
+    folder = tempfile.mkdtemp()
+    try:
+        context = ModuleContext()
+        context.root_folder = folder
+        context.root_id = "service"
+        context.format = Persistence.Format.pickle.value
+        context.delta_saves = delta_saves
+        Persistence.configure(context)
+        persistence = Persistence()
+        rng = random.Random(1)
+        states = {"host_{}".format(index): {"state": 0, "prev": 0}
+                  for index in range(groups)}
+        state = {"_states": states, "_backup_time": 0}
+        elapsed = written = 0
+        for _ in range(backups):
+            for _ in range(churn):
+                group = states["host_{}".format(rng.randrange(groups))]
+                group["prev"], group["state"] = group["state"], rng.random()
+            before = _written()
+            start = perf_counter()
+            persistence.save(state, "ClientState", "states")
+            elapsed += perf_counter() - start
+            written += _written() - before
+        assert persistence.load("ClientState", "states") == state
+        return elapsed, written
+    finally:
+        shutil.rmtree(folder)
+
+
+def run(groups=GROUPS, backups=BACKUPS):
+    rows = []
+    for churn in (10, 100, 1000):
+        for name, delta_saves in (("whole", 0), ("deltas, every 20", 20)):
+            elapsed, written = _backups(delta_saves, churn, groups, backups)
+            rows.append(("{}, {} changes".format(name, churn),
+                         "{:.1f}ms".format(elapsed / backups * 1e3),
+                         "{:.0f}KiB".format(written / backups / 1024)))
+    print_table(("{} groups".format(groups), "per backup",
+                 "written per backup"), rows)
+
+
+if __name__ == "__main__":
+    run()
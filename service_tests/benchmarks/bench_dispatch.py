@@ -0,0 +1,90 @@
+""" Throughput and latency of asynchronous signal delivery
+
+Signals are pushed through a chain of relay blocks, either spawning a
+thread for every hop, going through the bounded MailboxDispatcher worker
+pool or processing them on the AsyncServiceTestRouter event loop.
+Latency is measured from the moment a signal enters the chain until the
+last block processes it.
+"""
+from statistics import median
+from threading import Event
+from time import perf_counter
+
+from nio.router.context import RouterContext
+from nio.signal.base import Signal
+
+from ..async_router import AsyncServiceTestRouter
+from ..dispatch import MailboxDispatcher
+from ..router import ServiceTestRouter
+from .common import NullBlock, fan_graph, print_table, quiet
+
+CHAIN_LENGTH = 5
+SIGNALS = 2000
+WORKERS = (1, 4, 8)
+
+
+class Relay(NullBlock):
+
+    router = None
+
+    def process_signals(self, signals, input_id=None):
+        self.router.notify_signals(self, signals, "__default_terminal_value")
+
+
+class Sink(NullBlock):
+
+    def __init__(self, name, expected):
+        super().__init__(name)
+        self.expected = expected
+        self.latencies = []
+        self.done = Event()
+
+    def process_signals(self, signals, input_id=None):
+        now = perf_counter()
+        self.latencies.extend(now - signal.sent for signal in signals)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def _run_chain(router, length, count):
+    execution, _ = fan_graph(length)
+    Relay.router = router
+    blocks = {"block_{}".format(index): Relay("block_{}".format(index))
+              for index in range(length - 1)}
+    sink = blocks["block_{}".format(length - 1)] = \
+        Sink("block_{}".format(length - 1), count)
+    router.configure(RouterContext(execution=execution, blocks=blocks))
+    router.start()
+    start = perf_counter()
+    with quiet():
+        for _ in range(count):
+            router.notify_signals(
+                blocks["block_0"], [Signal({"sent": perf_counter()})],
+                "__default_terminal_value")
+        completed = sink.done.wait(60)
+    elapsed = perf_counter() - start
+    router.stop()
+    latencies = sorted(sink.latencies)
+    if not completed or not latencies:
+        return "timed out", "-", "-", len(latencies)
+    return ("{:.0f}/s".format(len(latencies) / elapsed),
+            "{:.2f}ms".format(median(latencies) * 1e3),
+            "{:.2f}ms".format(latencies[int(len(latencies) * 0.99)] * 1e3),
+            len(latencies))
+
+
+def run(length=CHAIN_LENGTH, count=SIGNALS, workers=WORKERS):
+    rows = [("spawn per hop",) +
+            _run_chain(ServiceTestRouter(False), length, count)]
+    for worker_count in workers:
+        dispatcher = MailboxDispatcher(
+            workers=worker_count, queue_depth=count)
+        rows.append(("{} workers".format(worker_count),) + _run_chain(
+            ServiceTestRouter(False, dispatcher=dispatcher), length, count))
+    rows.append(("asyncio",) +
+                _run_chain(AsyncServiceTestRouter(), length, count))
+    print_table(("mode", "throughput", "p50", "p99", "delivered"), rows)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,101 @@
+""" Substituting environment variables in 500 block configs
+
+Block configs are copies of the ones under etc/blocks, with placeholders
+of 30 variables, INSTANCE_TAG and PROJECT_URL among them, spread over
+their strings. Substitution used to walk every config once per variable
+with a regex built per string, that is timed alongside the single pass
+compiled pattern, on a cold cache and on strings substituted before.
+"""
+import copy
+import glob
+import json
+import os
+import re
+
+from ..env_vars import EnvVarSubstitution
+from .common import best_of, print_table
+
+CONFIGS = 500
+VARIABLES = 30
+ETC_BLOCKS = os.path.join(
+    os.path.dirname(__file__), "..", "..", "etc", "blocks")
+
+
+def _replace_env_var(config, name, value):
+    """ Substitution as it was, a walk per variable """
+    for property in config:
+        if isinstance(config[property], str):
+            config[property] = re.sub("\\[\\[" + name + "\\]\\]", str(value),
+                                      config[property])
+        elif isinstance(config[property], dict):
+            _replace_env_var(config[property], name, value)
+        elif isinstance(config[property], list):
+            new_list = []
+            for item in config[property]:
+                if isinstance(item, str):
+                    new_list.append(re.sub("\\[\\[" + name + "\\]\\]",
+                                           str(value), item))
+                elif isinstance(item, dict):
+                    new_list.append(_replace_env_var(item, name, value))
+            config[property] = new_list
+    return config
+
+
+def _per_variable(configs, env_vars):
+    # configs were changed in place, the shared ones are copied first
+    for config in configs:
+        config = copy.deepcopy(config)
+        for name, value in env_vars.items():
+            config = _replace_env_var(config, name, value)
+
+
+def _single_pass(configs, env_vars):
+    substitution = EnvVarSubstitution(env_vars)
+    for config in configs:
+        substitution.replace(config)
+
+
+def _with_placeholders(config, names, counter):
+    """ Copy of config with a placeholder added to every string """
+    if isinstance(config, dict):
+        return {key: _with_placeholders(value, names, counter)
+                for key, value in config.items()}
+    if isinstance(config, list):
+        return [_with_placeholders(value, names, counter)
+                for value in config]
+    if isinstance(config, str):
+        counter[0] += 1
+        return "{}[[{}]]".format(config, names[counter[0] % len(names)])
+    return config
+
+
+def run(configs=CONFIGS, variables=VARIABLES):
+    env_vars = {"INSTANCE_TAG": "edge|laptop",
+                "PROJECT_URL": "https://project.example.com"}
+    for index in range(variables - len(env_vars)):
+        env_vars["VARIABLE_{}".format(index)] = "value_{}".format(index)
+    samples = []
+    for filename in sorted(glob.glob(os.path.join(ETC_BLOCKS, "*.cfg"))):
+        with open(filename) as file:
+            samples.append(json.load(file))
+    counter = [0]
+    loaded = [_with_placeholders(samples[index % len(samples)],
+                                 sorted(env_vars), counter)
+              for index in range(configs)]
+    warm = EnvVarSubstitution(env_vars)
+    for config in loaded:
+        warm.replace(config)
+    rows = []
+    for name, substitute in (
+            ("walk per variable", lambda: _per_variable(loaded, env_vars)),
+            ("single pass", lambda: _single_pass(loaded, env_vars)),
+            ("single pass, strings cached",
+             lambda: [warm.replace(config) for config in loaded])):
+        rows.append((name, "{:.1f}ms".format(
+            best_of(substitute, 1, repeat=3) * 1e3)))
+    print_table(("{} configs, {} variables".format(configs, variables),
+                 "substitution"), rows)
+
+
+if __name__ == "__main__":
+    run()
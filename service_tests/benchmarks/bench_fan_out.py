@@ -0,0 +1,101 @@
+""" Latency and allocations of fanning signals out to several receivers
+
+Compares strict isolation, a deep copy of the signal list per receiver,
+against copy-on-write views over a snapshot of the notified signals.
+Receivers either read a scalar attribute, like the Filter blocks checking
+a limit, or dump the whole signal with to_dict(), which forces the views
+to copy everything.
+"""
+import tracemalloc
+
+from nio.router.context import RouterContext
+from nio.signal.base import Signal
+
+from ..fan_out import SignalIsolation
+from ..router import ServiceTestRouter
+from .common import NullBlock, best_of, format_us, print_table, quiet
+
+FAN_OUTS = (2, 4, 8, 16)
+SIGNALS = 10
+NOTIFICATIONS = 500
+
+
+class ScalarReader(NullBlock):
+
+    def process_signals(self, signals, input_id=None):
+        for signal in signals:
+            signal.cpu_percentage_overall
+        super().process_signals(signals, input_id)
+
+
+class DictReader(NullBlock):
+
+    def process_signals(self, signals, input_id=None):
+        for signal in signals:
+            signal.to_dict()
+        super().process_signals(signals, input_id)
+
+
+def _host_signal(index):
+    """ Signal shaped like the HostMetrics output of ClientMetrics """
+    return Signal({
+        "cpu_percentage_overall": 50 + index,
+        "cpu_percentage_per_cpu": [12.5, 50.0, 75.0, 62.5],
+        "net_io_counters": {"bytes_sent": 100, "bytes_recv": 200,
+                            "packets": {"sent": 1, "recv": 2}},
+        "virtual_memory": {"available": 1e5, "total": 1e10, "used": 6e9},
+        "disk_usage": {"free": 1e9, "percent": 41.7, "total": 16e9},
+        "name": "host_{}".format(index),
+    })
+
+
+def _router(isolation, fan_out, receiver_class):
+    receivers = ["receiver_{}".format(index) for index in range(fan_out)]
+    blocks = {name: receiver_class(name) for name in receivers}
+    blocks["sender"] = NullBlock("sender")
+    execution = [{
+        "name": "sender",
+        "receivers": {"__default_terminal_value": [
+            {"name": name, "input": "__default_terminal_value"}
+            for name in receivers]}
+    }]
+    router = ServiceTestRouter(True, signal_isolation=isolation)
+    router.configure(RouterContext(execution=execution, blocks=blocks))
+    return router, blocks["sender"]
+
+
+def _allocated(notify):
+    """ Peak bytes allocated while notifying once """
+    # tracing starts afresh, the peak is that of notifying
+    tracemalloc.start()
+    try:
+        notify()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(fan_outs=FAN_OUTS, notifications=NOTIFICATIONS):
+    signals = [_host_signal(index) for index in range(SIGNALS)]
+    rows = []
+    for receiver_class in (ScalarReader, DictReader):
+        for fan_out in fan_outs:
+            row = [receiver_class.__name__, fan_out]
+            for isolation in (SignalIsolation.strict,
+                              SignalIsolation.copy_on_write):
+                router, sender = _router(isolation, fan_out, receiver_class)
+
+                def notify():
+                    router.notify_signals(
+                        sender, signals, "__default_terminal_value")
+
+                with quiet():
+                    row.append(format_us(best_of(notify, notifications)))
+                    row.append("{:.1f}KB".format(_allocated(notify) / 1024))
+            rows.append(row)
+    print_table(("receivers", "fan-out", "strict", "strict alloc",
+                 "cow", "cow alloc"), rows)
+
+
+if __name__ == "__main__":
+    run()
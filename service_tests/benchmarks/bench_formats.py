@@ -0,0 +1,49 @@
+""" Encoding and decoding block state in each persistence format
+
+The state is shaped like the one AppendState and StateChange persist: a
+dict of groups, each holding numeric values. Binary is timed with the
+msgpack package when it is installed and with the pure python packer.
+"""
+from unittest.mock import patch
+
+from ..modules.module_persistence_file import codec
+from .common import best_of, print_table
+
+GROUPS = 1000
+STATE = {
+    "_states": {
+        "host_{}".format(index): {
+            "value": index * 1.5, "prev": index * 1.5 - 0.25,
+            "count": index * 37, "up": index % 2 == 0,
+            "samples": [index + step / 10 for step in range(8)]}
+        for index in range(GROUPS)},
+    "_version": 3,
+}
+
+
+def _row(name, dumps, loads, number):
+    data = dumps(STATE)
+    assert loads(data) == STATE
+    return (name, "{:.2f}ms".format(best_of(lambda: dumps(STATE), number) *
+                                    1e3),
+            "{:.2f}ms".format(best_of(lambda: loads(data), number) * 1e3),
+            "{:.1f}KiB".format(len(data) / 1024))
+
+
+def run(number=10):
+    rows = [
+        _row("pickle", codec.dumps_pickle, codec.loads_pickle, number),
+        _row("json", codec.dumps_json, codec.loads_json, number),
+    ]
+    if codec.msgpack is not None:
+        rows.append(_row("binary, msgpack", codec.dumps_binary,
+                         codec.loads_binary, number))
+    with patch.object(codec, "msgpack", None):
+        rows.append(_row("binary, pure python", codec.dumps_binary,
+                         codec.loads_binary, number))
+    print_table(("{} groups".format(GROUPS), "encode", "decode", "size"),
+                rows)
+
+
+if __name__ == "__main__":
+    run()
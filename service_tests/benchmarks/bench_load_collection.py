@@ -0,0 +1,89 @@
+""" Loading a collection of 5k block configs
+
+Block configs are copies of the ones under etc/blocks, saved as json the
+way the core persistence keeps them. The collection used to be listed with
+listdir and parsed file by file, that is timed alongside scandir with
+sequential and parallel parsing on a cold parse cache, and a warm load
+where no file changed.
+"""
+import glob
+import json
+import os
+import shutil
+import tempfile
+from time import perf_counter
+from unittest.mock import patch
+
+from nio.modules.context import ModuleContext
+from nio.util.codec import load_json
+
+from ..modules.module_persistence_file import persistence
+from ..modules.module_persistence_file.persistence import Persistence
+from .common import print_table
+
+CONFIGS = 5000
+ETC_BLOCKS = os.path.join(
+    os.path.dirname(__file__), "..", "..", "etc", "blocks")
+
+
+def _persistence(folder):
+    context = ModuleContext()
+    context.root_folder = folder
+    context.root_id = ""
+    context.format = Persistence.Format.json.value
+    Persistence.configure(context)
+    return Persistence()
+
+
+def _listdir(folder):
+    """ load_collection as it was, listdir and a parse per file """
+    result = {}
+    for filename in os.listdir(folder):
+        if os.path.splitext(filename)[1] != ".cfg":
+            continue
+        name = os.path.splitext(os.path.basename(filename))[0]
+        result[name] = load_json(os.path.join(folder, filename))
+    return result
+
+
+def _cold(store):
+    Persistence._parsed.clear()
+    return store.load_collection("blocks")
+
+
+def run(configs=CONFIGS):
+    samples = []
+    for filename in sorted(glob.glob(os.path.join(ETC_BLOCKS, "*.cfg"))):
+        with open(filename) as file:
+            samples.append(json.load(file))
+    folder = tempfile.mkdtemp()
+    try:
+        store = _persistence(folder)
+        store.save_collection(
+            {"block_{}".format(index): samples[index % len(samples)]
+             for index in range(configs)}, "blocks")
+        blocks = os.path.join(folder, "blocks")
+        rows = []
+        for name, load in (
+                ("listdir, sequential", lambda: _listdir(blocks)),
+                ("scandir, sequential", lambda: _cold(store)),
+                ("scandir, parallel", lambda: _cold(store)),
+                ("unchanged", lambda: store.load_collection("blocks"))):
+            # only the parallel load goes through the thread pool
+            parallel_min = configs if name == "scandir, sequential" else \
+                persistence.PARALLEL_PARSE_MIN
+            with patch.object(persistence, "PARALLEL_PARSE_MIN",
+                              parallel_min):
+                start = perf_counter()
+                loaded = load()
+                elapsed = perf_counter() - start
+            assert len(loaded) == configs
+            rows.append((name, "{:.1f}ms".format(elapsed * 1e3)))
+    finally:
+        shutil.rmtree(folder)
+    print_table(("{} block configs".format(configs), "load_collection"),
+                rows)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,62 @@
+""" Collection operations of the files and log persistence backends
+
+Saves, loads and removes a collection of 5k block states, a file per item
+with the files backend and a single log with the log backend, then
+rewrites every item one by one, which leaves stale records for the log
+to compact.
+"""
+import shutil
+import tempfile
+from time import perf_counter
+
+from nio.modules.context import ModuleContext
+
+from ..modules.module_persistence_file.persistence import Persistence
+from .common import print_table
+
+ITEMS = 5000
+STATE = {"group_{}".format(index): {"value": index, "prev": index - 1}
+         for index in range(20)}
+
+
+def _persistence(folder, backend):
+    context = ModuleContext()
+    context.root_folder = folder
+    context.root_id = "service"
+    context.format = Persistence.Format.pickle.value
+    context.backend = backend
+    Persistence.configure(context)
+    return Persistence()
+
+
+def _timed(operation):
+    start = perf_counter()
+    operation()
+    return perf_counter() - start
+
+
+def run(items=ITEMS):
+    collection = {"block_{}".format(index): STATE for index in range(items)}
+    rows = []
+    for backend in Persistence.Backend:
+        folder = tempfile.mkdtemp()
+        try:
+            persistence = _persistence(folder, backend)
+            timings = (
+                _timed(lambda: persistence.save_collection(
+                    collection, "states")),
+                _timed(lambda: persistence.load_collection("states")),
+                _timed(lambda: [persistence.save(STATE, id, "states")
+                                for id in collection]),
+                _timed(lambda: persistence.remove_collection("states")))
+            Persistence.finalize()
+        finally:
+            shutil.rmtree(folder)
+        rows.append([backend.name] +
+                    ["{:.1f}ms".format(timing * 1e3) for timing in timings])
+    print_table(("{} items".format(items), "save_collection",
+                 "load_collection", "save each", "remove_collection"), rows)
+
+
+if __name__ == "__main__":
+    run()
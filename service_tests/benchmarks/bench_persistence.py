@@ -0,0 +1,284 @@
+""" Benchmark and load test of the file persistence
+
+Times load, save, load_collection, save_collection and remove_collection
+in each format over item sizes and collection sizes, along with readers
+and writers loading and saving concurrently. Results are printed as a
+table and can be written as json; given a baseline, a run written
+earlier, the benchmark exits with status 1 when an operation got slower
+than the baseline by more than the tolerance.
+
+    python -m service_tests.benchmarks.bench_persistence --output run.json
+    python -m service_tests.benchmarks.bench_persistence --baseline run.json
+
+The quick profile (the default) runs in seconds, the full one covers
+items up to 10MB and collections up to 100k items and takes a while, and
+needs a few GB of disk.
+"""
+import argparse
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+from threading import Event
+from time import perf_counter
+
+from nio.modules.context import ModuleContext
+
+from ..modules.module_persistence_file.persistence import Persistence
+from .common import print_table
+
+KB = 1024
+MB = 1024 * KB
+PROFILES = {
+    "quick": dict(item_sizes=(KB, 100 * KB, MB),
+                  collection_sizes=(10, 1000), threads=(8,),
+                  repeat=3, load_test_seconds=0.5),
+    "full": dict(item_sizes=(KB, 10 * KB, 100 * KB, MB, 10 * MB),
+                 collection_sizes=(10, 1000, 10000, 100000),
+                 threads=(8, 32), repeat=5, load_test_seconds=3),
+}
+# items of collections are this size
+COLLECTION_ITEM_SIZE = KB
+# bytes of a group of an item, in json
+_GROUP_SIZE = 64
+# calls are repeated within a timing until it takes this long
+_MIN_TIMING = 0.02
+
+
+def make_item(size, seed=0):
+    """ A block state of about size bytes, a dict of numeric groups """
+    rng = random.Random(seed)
+    return {"group_{:06d}".format(index): {
+        "value": round(rng.random() * 1000, 3),
+        "count": rng.randrange(1 << 20), "up": index % 2 == 0}
+        for index in range(max(size // _GROUP_SIZE, 1))}
+
+
+def _size_name(size):
+    return "{}MB".format(size // MB) if size >= MB else \
+        "{}KB".format(size // KB)
+
+
+def _persistence(folder, format, backend):
+    context = ModuleContext()
+    context.root_folder = folder
+    context.root_id = "service"
+    context.format = format.value
+    context.backend = backend
+    Persistence.configure(context)
+    return Persistence()
+
+
+def _time(func, repeat, setup=None):
+    """ Median seconds of func over repeat timings, after a warm up call
+
+    Without setup, each timing calls func as many times as it takes to
+    last _MIN_TIMING, for quick calls to be timed reliably.
+    """
+    number = 1
+    if setup is None:
+        start = perf_counter()
+        func()
+        warm_up = perf_counter() - start
+        number = max(int(_MIN_TIMING / max(warm_up, 1e-9)), 1)
+    times = []
+    for run in range(repeat + (setup is not None)):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        if run or setup is None:
+            times.append((perf_counter() - start) / number)
+    return median(times)
+
+
+def _clear_parse_cache():
+    Persistence._parsed.clear()
+
+
+def _item_results(persistence, format, item_sizes, repeat):
+    for size in item_sizes:
+        item = make_item(size)
+        persistence.save(item, "item")
+        yield (dict(operation="save", format=format.name,
+                    item_size=size),
+               _time(lambda: persistence.save(item, "item"), repeat), 1)
+        yield (dict(operation="load", format=format.name, item_size=size),
+               _time(lambda: persistence.load("item"), repeat), 1)
+        persistence.remove("item")
+
+
+def _collection_results(persistence, format, collection_sizes, repeat):
+    item = make_item(COLLECTION_ITEM_SIZE)
+    for count in collection_sizes:
+        items = {"block_{}".format(index): item for index in range(count)}
+        base = dict(format=format.name, item_size=COLLECTION_ITEM_SIZE,
+                    collection_size=count)
+        yield (dict(base, operation="save_collection"),
+               _time(lambda: persistence.save_collection(items, "states"),
+                     repeat), count)
+        yield (dict(base, operation="load_collection"),
+               _time(lambda: persistence.load_collection("states"), repeat,
+                     _clear_parse_cache), count)
+        yield (dict(base, operation="remove_collection"),
+               _time(lambda: persistence.remove_collection("states"), repeat,
+                     lambda: persistence.save_collection(items, "states")),
+               count)
+
+
+def _load_test(persistence, format, threads, seconds):
+    """ Half the threads load and half save random items of a collection
+    for a while, returns the results of the loads and saves
+    """
+    item = make_item(COLLECTION_ITEM_SIZE)
+    ids = ["block_{}".format(index) for index in range(100)]
+    persistence.save_collection({id: item for id in ids}, "states")
+    stop = Event()
+
+    def work(writer):
+        rng = random.Random()
+        latencies = []
+        while not stop.is_set():
+            id = rng.choice(ids)
+            start = perf_counter()
+            if writer:
+                persistence.save(item, id, "states")
+            else:
+                persistence.load(id, "states")
+            latencies.append(perf_counter() - start)
+        return writer, latencies
+
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(work, index % 2 == 1)
+                   for index in range(threads)]
+        stop.wait(seconds)
+        stop.set()
+        latencies = {False: [], True: []}
+        for future in futures:
+            writer, thread_latencies = future.result()
+            latencies[writer].extend(thread_latencies)
+    persistence.remove_collection("states")
+    for writer, operation in ((False, "concurrent_load"),
+                              (True, "concurrent_save")):
+        times = sorted(latencies[writer]) or [0]
+        yield (dict(operation=operation, format=format.name,
+                    item_size=COLLECTION_ITEM_SIZE, threads=threads),
+               median(times), 1,
+               dict(ops_per_second=round(len(times) / seconds, 1),
+                    p99=times[int(len(times) * 0.99)]))
+
+
+def run_suite(profile="quick", formats=None,
+              backend=Persistence.Backend.files):
+    """ Run the benchmarks of a profile
+
+    Returns:
+        list: a dict per result, seconds is the median per operation,
+            item_seconds the same per item of a collection
+    """
+    settings = PROFILES[profile]
+    results = []
+    for format in formats or list(Persistence.Format):
+        folder = tempfile.mkdtemp()
+        try:
+            persistence = _persistence(folder, format, backend)
+            measured = list(_item_results(
+                persistence, format, settings["item_sizes"],
+                settings["repeat"]))
+            measured.extend(_collection_results(
+                persistence, format, settings["collection_sizes"],
+                settings["repeat"]))
+            measured = [result + ({},) for result in measured]
+            for threads in settings["threads"]:
+                measured.extend(_load_test(
+                    persistence, format, threads,
+                    settings["load_test_seconds"]))
+            Persistence.finalize()
+        finally:
+            shutil.rmtree(folder)
+        for scenario, seconds, count, extra in measured:
+            scenario["backend"] = backend.name
+            scenario["id"] = "/".join(
+                str(scenario[key]) for key in (
+                    "operation", "backend", "format", "item_size",
+                    "collection_size", "threads") if key in scenario)
+            results.append(dict(scenario, seconds=seconds,
+                                item_seconds=seconds / count, **extra))
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """ Results slower than their baseline by more than tolerance
+
+    Returns:
+        list: (result, baseline result) tuples
+    """
+    baseline = {result["id"]: result for result in baseline}
+    return [(result, baseline[result["id"]]) for result in results
+            if result["id"] in baseline and result["seconds"] >
+            baseline[result["id"]]["seconds"] * (1 + tolerance)]
+
+
+def _print_results(results):
+    rows = []
+    for result in results:
+        rows.append((result["operation"], result["format"],
+                     _size_name(result["item_size"]),
+                     result.get("collection_size", ""),
+                     result.get("threads", ""),
+                     "{:.3f}ms".format(result["seconds"] * 1e3),
+                     "{:.1f}us".format(result["item_seconds"] * 1e6),
+                     result.get("ops_per_second", "")))
+    print_table(("operation", "format", "item", "items", "threads",
+                 "median", "per item", "ops/s"), rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m service_tests.benchmarks.bench_persistence",
+        description="Benchmark the file persistence")
+    parser.add_argument("--profile", choices=sorted(PROFILES),
+                        default="quick")
+    parser.add_argument("--formats", default="",
+                        help="comma separated formats, all by default")
+    parser.add_argument("--backend", default="files",
+                        choices=[backend.name for backend in
+                                 Persistence.Backend])
+    parser.add_argument("--output", help="write the results as json")
+    parser.add_argument("--baseline",
+                        help="results to compare with, exits with status "
+                             "1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown tolerated over the baseline, 0.25 "
+                             "by default")
+    args = parser.parse_args(argv)
+    formats = [Persistence.Format[name]
+               for name in args.formats.split(",") if name]
+    results = run_suite(args.profile, formats,
+                        Persistence.Backend[args.backend])
+    _print_results(results)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(dict(profile=args.profile,
+                           python=platform.python_version(),
+                           machine=platform.machine(), results=results),
+                      output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            slower = regressions(results, json.load(baseline)["results"],
+                                 args.tolerance)
+        for result, previous in slower:
+            print("REGRESSION {}: {:.3f}ms, baseline {:.3f}ms".format(
+                result["id"], result["seconds"] * 1e3,
+                previous["seconds"] * 1e3))
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+""" Per-hop dispatch cost of ServiceTestRouter as the service graph grows
+
+The router resolves receivers through the routing table compiled in
+configure(), so the cost of a hop should stay flat regardless of the
+number of blocks in the service. The linear scan over the execution list
+the router used to do on every hop is timed alongside for reference, as
+is the cost of a hop with the router instrumentation enabled.
+"""
+from nio.router.context import RouterContext
+from nio.signal.base import Signal
+
+from ..instrumentation import RouterInstrumentation
+from ..router import ServiceTestRouter
+from .common import best_of, fan_graph, format_us, print_table, quiet
+
+SIZES = (10, 100, 1000, 5000)
+HOPS = 2000
+
+
+def _linear_receivers(execution, name):
+    """ Receiver lookup as done before the routing table existed """
+    return [block["receivers"] for block in execution
+            if block["name"] == name][0]
+
+
+def run(sizes=SIZES, hops=HOPS):
+    rows = []
+    signals = [Signal({"sim": 1})]
+    for size in sizes:
+        row = [size]
+        for instrumentation in (None, RouterInstrumentation()):
+            execution, blocks = fan_graph(size)
+            router = ServiceTestRouter(
+                synchronous=True, instrumentation=instrumentation)
+            router.configure(
+                RouterContext(execution=execution, blocks=blocks))
+            # the second to last block is the worst case for a linear scan
+            sender = blocks["block_{}".format(size - 2)]
+            with quiet():
+                row.append(format_us(best_of(
+                    lambda: router.notify_signals(
+                        sender, signals, "__default_terminal_value"),
+                    hops)))
+        row.append(format_us(best_of(
+            lambda: _linear_receivers(execution, sender.name()), hops)))
+        rows.append(row)
+    print_table(("blocks", "per hop", "instrumented", "linear scan"), rows)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,216 @@
+""" Scheduling and cancelling jobs with the synchronous scheduler
+
+Schedules jobs, then cancels all of them in random order, the way Sleep
+and MergeStreams blocks keep cancelling and rescheduling their jobs.
+Cancelling used to remove the event from the heap and heapify it again,
+that approach is timed alongside for the smaller job counts.
+
+Then compares the heap and timing wheel queue backends with many
+repeating jobs, like hundreds of services with Driver intervals, backup
+intervals and Publisher timeouts: scheduling the jobs, then jumping ahead
+in time so that a share of them fire and get rescheduled.
+
+Then measures memory per job and scheduling throughput at 1M jobs, one
+by one and in a single schedule_many batch, next to the namedtuple and
+uuid4 records events used to be.
+
+Last simulates a day of a service with a 1 second Driver and a few slower
+jobs, jumping ahead, fast forwarding, and coalescing the missed runs.
+"""
+import gc
+import heapq
+import random
+import tracemalloc
+from collections import namedtuple
+from datetime import timedelta
+from time import perf_counter
+from uuid import uuid4
+
+from nio.modules.context import ModuleContext
+from nio.util.runner import RunnerStatus
+
+from ..modules.module_scheduler_synchronous.queues import QueueBackend
+from ..modules.module_scheduler_synchronous.scheduler import \
+    CatchUpPolicy, SynchronousSchedulerRunner
+from .common import print_table
+
+JOB_COUNTS = (1000, 10000, 100000)
+# job counts the remove and heapify approach is timed for
+LEGACY_JOB_COUNTS = (1000, 10000)
+BACKEND_JOB_COUNTS = (1000, 100000, 1000000)
+# seconds jumped ahead, jobs repeat every 1 to 60 seconds
+JUMP = 5
+MEMORY_JOB_COUNT = 1000000
+# simulated span and job intervals of the soak simulation
+SOAK_SECONDS = 86400
+SOAK_INTERVALS = (1, 10, 60, 3600)
+
+
+def scheduler(**settings):
+    """ A configured scheduler accepting jobs, its thread is not started so
+    only the cost of the scheduler data structures is measured.
+    """
+    context = ModuleContext()
+    context.min_interval = 0.01
+    context.resolution = 0.01
+    for name, value in settings.items():
+        setattr(context, name, value)
+    runner = SynchronousSchedulerRunner()
+    runner.configure(context)
+    runner.status = RunnerStatus.started
+    return runner
+
+
+def _noop():
+    pass
+
+
+def _legacy_cancel(queue, events):
+    for event in events:
+        if event in queue:
+            queue.remove(event)
+            heapq.heapify(queue)
+
+
+def run_cancel(job_counts=JOB_COUNTS, legacy_job_counts=LEGACY_JOB_COUNTS):
+    rows = []
+    delta = timedelta(seconds=3600)
+    for count in job_counts:
+        runner = scheduler()
+        start = perf_counter()
+        jobs = [runner.schedule_task(_noop, delta, True)
+                for _ in range(count)]
+        scheduled = perf_counter() - start
+        random.shuffle(jobs)
+        events = [runner._events[job] for job in jobs]
+        queue = list(runner._queue)
+
+        start = perf_counter()
+        for job in jobs:
+            runner.unschedule(job)
+        cancelled = perf_counter() - start
+
+        legacy = "-"
+        if count in legacy_job_counts:
+            start = perf_counter()
+            _legacy_cancel(queue, events)
+            legacy = "{:.3f}s".format(perf_counter() - start)
+        rows.append((count, "{:.3f}s".format(scheduled),
+                     "{:.3f}s".format(cancelled), legacy))
+    print_table(("jobs", "schedule", "cancel", "remove+heapify"), rows)
+
+
+def run_backends(job_counts=BACKEND_JOB_COUNTS, jump=JUMP):
+    rows = []
+    for count in job_counts:
+        rng = random.Random(count)
+        deltas = [timedelta(seconds=rng.randint(1, 60))
+                  for _ in range(count)]
+        for backend in QueueBackend:
+            runner = scheduler(queue_backend=backend)
+            start = perf_counter()
+            for delta in deltas:
+                runner.schedule_task(_noop, delta, True)
+            scheduled = perf_counter() - start
+
+            # what jump_ahead does, without its sleep
+            start = perf_counter()
+            runner.offset += jump
+            runner._execute_pending_tasks()
+            jumped = perf_counter() - start
+            fired = sum(jump // delta.total_seconds() for delta in deltas)
+            rows.append((count, backend.name,
+                         "{:.3f}s".format(scheduled),
+                         "{:.2f}us".format(scheduled / count * 1e6),
+                         int(fired),
+                         "{:.2f}us".format(jumped / max(fired, 1) * 1e6)))
+    print_table(("jobs", "backend", "schedule", "per job", "fired",
+                 "per fire"), rows)
+
+
+_LegacyEvent = namedtuple(
+    'Event', 'time, id, target, frequency, args, kwargs')
+
+
+def _legacy_schedule(tasks):
+    """ Events as they used to be stored, in a heap and a dictionary """
+    queue = []
+    events = {}
+    for _, delta, _ in tasks:
+        event_id = uuid4().hex
+        event = _LegacyEvent(delta.total_seconds(), event_id, _noop,
+                             delta.total_seconds(), (), {})
+        heapq.heappush(queue, event)
+        events[event_id] = event
+    return queue, events
+
+
+def _schedule_one_by_one(tasks):
+    runner = scheduler()
+    for target, delta, repeatable in tasks:
+        runner.schedule_task(target, delta, repeatable)
+    return runner
+
+
+def _schedule_many(tasks):
+    runner = scheduler()
+    runner.schedule_many(tasks)
+    return runner
+
+
+def run_memory(count=MEMORY_JOB_COUNT):
+    rng = random.Random(count)
+    tasks = [(_noop, timedelta(seconds=rng.randint(1, 60)), True)
+             for _ in range(count)]
+    rows = []
+    for name, schedule in (("namedtuple + uuid4", _legacy_schedule),
+                           ("schedule_task", _schedule_one_by_one),
+                           ("schedule_many", _schedule_many)):
+        gc.collect()
+        start = perf_counter()
+        result = schedule(tasks)
+        elapsed = perf_counter() - start
+        del result
+        gc.collect()
+        # memory measured apart, tracing slows allocations down
+        tracemalloc.start()
+        result = schedule(tasks)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del result
+        rows.append((name, "{:.0f}".format(count / elapsed),
+                     "{:.0f}B".format(size / count)))
+    print_table(("{} jobs".format(count), "jobs/s", "memory/job"), rows)
+
+
+def run_soak(seconds=SOAK_SECONDS, intervals=SOAK_INTERVALS):
+    rows = []
+    for method, catch_up in (("jump_ahead", None),
+                             ("fast_forward", None),
+                             ("jump_ahead", CatchUpPolicy.once),
+                             ("fast_forward", CatchUpPolicy.once)):
+        runner = scheduler()
+        runs = []
+        for interval in intervals:
+            runner.schedule_task(
+                runs.append, timedelta(seconds=interval), True, interval)
+        start = perf_counter()
+        getattr(runner, method)(seconds, catch_up)
+        elapsed = perf_counter() - start
+        rows.append((method, catch_up.name if catch_up else "-",
+                     len(runs), "{:.3f}s".format(elapsed)))
+    print_table(("simulate a day", "catch up", "runs", "time"), rows)
+
+
+def run():
+    run_cancel()
+    print()
+    run_backends()
+    print()
+    run_memory()
+    print()
+    run_soak()
+
+
+if __name__ == "__main__":
+    run()
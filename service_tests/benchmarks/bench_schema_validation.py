@@ -0,0 +1,79 @@
+""" Validating published signals against a topic schema
+
+Signals shaped like the client statistics published by the service are
+validated against their topic's schema. Every signal used to go through
+jsonschema.validate, building a validator and checking the schema each
+time, that is timed alongside the validator compiled once per topic,
+validating every signal and 1 in 10.
+"""
+import json
+import os
+import tempfile
+
+import jsonschema
+from nio.signal.base import Signal
+
+from ..env_vars import substitution
+from ..topic_schema import TopicValidators, compile_topic_schema
+from .common import best_of, format_us, print_table
+
+SIGNALS = 1000
+TOPIC = "dni.client_stats.TEST"
+SCHEMA = {
+    "type": "object",
+    "required": ["name", "cpu_percentage_overall", "timestamp"],
+    "properties": {
+        "name": {"type": "string"},
+        "cpu_percentage_overall": {"type": "number", "minimum": 0,
+                                   "maximum": 100},
+        "virtual_memory_used": {"type": "number"},
+        "virtual_memory_total": {"type": "number"},
+        "disk_usage_percent": {"type": "number"},
+        "net_io_counters_bytes_sent": {"type": "integer"},
+        "net_io_counters_bytes_recv": {"type": "integer"},
+        "timestamp": {"type": "string"},
+        "violations": {"type": "array", "items": {"type": "string"}},
+    },
+}
+
+
+def _signals(count):
+    return [Signal({"name": "client", "cpu_percentage_overall": index % 100,
+                    "virtual_memory_used": 6e9, "virtual_memory_total": 1e10,
+                    "disk_usage_percent": 41.7,
+                    "net_io_counters_bytes_sent": index,
+                    "net_io_counters_bytes_recv": 2 * index,
+                    "timestamp": "2020-01-01T00:00:00Z",
+                    "violations": ["cpu"] if index % 7 == 0 else []})
+            for index in range(count)]
+
+
+def _validate_each(signals):
+    for signal in signals:
+        jsonschema.validate(signal.to_dict(), SCHEMA)
+
+
+def run(count=SIGNALS):
+    signals = _signals(count)
+    with tempfile.NamedTemporaryFile("w", suffix=".json",
+                                     delete=False) as schema_file:
+        json.dump({TOPIC: SCHEMA}, schema_file)
+    try:
+        validators = compile_topic_schema(schema_file.name, substitution({}))
+    finally:
+        os.remove(schema_file.name)
+    compiled = TopicValidators(validators)
+    sampled = TopicValidators(validators, {"dni.client_stats.*": 10})
+    rows = []
+    for name, validate in (
+            ("jsonschema.validate", lambda: _validate_each(signals)),
+            ("compiled", lambda: compiled.validate(signals, TOPIC)),
+            ("compiled, 1 in 10", lambda: sampled.validate(signals, TOPIC))):
+        seconds = best_of(validate, 1, repeat=3)
+        rows.append((name, "{:.1f}ms".format(seconds * 1e3),
+                     format_us(seconds / count)))
+    print_table(("{} signals".format(count), "total", "per signal"), rows)
+
+
+if __name__ == "__main__":
+    run()
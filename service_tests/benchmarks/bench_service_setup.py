@@ -0,0 +1,130 @@
+""" Per-test setUp time of a suite of service tests
+
+Runs a suite of trivial tests, 100 by default, of a service of 20 blocks
+generated in a temporary folder, with blocks discovered once per process,
+as NioServiceTestCase does, and discovered again in every setUp, as they
+were before the block registry. Blocks are discovered in the project's
+blocks package, those of the service are stand-ins doing nothing. Run
+from the project root:
+
+    python -m service_tests.benchmarks.bench_service_setup
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from statistics import median
+from time import perf_counter
+
+from .. import block_registry
+from ..service_test_case import NioServiceTestCase
+from .common import NullBlock, print_table, quiet
+
+
+SERVICE = "Benchmark"
+
+
+class _Block(NullBlock):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.configure = self.start = self.stop = lambda *args: None
+
+
+def _project(root_folder, blocks):
+    """ Save the configs of a service of blocks in a chain """
+    names = ["block_{}".format(index) for index in range(blocks)]
+    for collection in ("blocks", "services"):
+        os.makedirs(os.path.join(root_folder, collection))
+    for name in names:
+        with open(os.path.join(root_folder, "blocks",
+                               "{}.cfg".format(name)), "w") as f:
+            json.dump({"name": name, "type": "NotInstalled",
+                       "log_level": "NOTSET"}, f)
+    execution = [{"name": name, "receivers": {"__default_terminal_value": [
+        {"name": receiver, "input": "__default_terminal_value"}
+        for receiver in names[index + 1:index + 2]]}}
+        for index, name in enumerate(names)]
+    with open(os.path.join(root_folder, "services",
+                           "{}.cfg".format(SERVICE)), "w") as f:
+        json.dump({"name": SERVICE, "execution": execution,
+                   "mappings": []}, f)
+
+
+def _test_case(root_folder, tests, discover_every_test):
+    """ A NioServiceTestCase class with tests trivial tests, timing their
+    setUp in its `setup_seconds` list
+    """
+
+    class SetupTimed(NioServiceTestCase):
+
+        service_name = SERVICE
+        # blocks are not started, only setUp is timed
+        auto_start = False
+        setup_seconds = []
+
+        def get_context(self, module_name, module):
+            context = super().get_context(module_name, module)
+            if module_name == "persistence":
+                context.root_folder = root_folder
+            return context
+
+        def _init_block(self, block_config, blocks, mocks=None):
+            if block_config["type"] not in blocks:
+                return _Block(block_config["name"])
+            return super()._init_block(block_config, blocks, mocks)
+
+        def setUp(self):
+            start = perf_counter()
+            if discover_every_test:
+                block_registry.clear()
+            super().setUp()
+            self.setup_seconds.append(perf_counter() - start)
+
+    for index in range(tests):
+        setattr(SetupTimed, "test_{:04d}".format(index), lambda self: None)
+    return SetupTimed
+
+
+def _run(root_folder, tests, discover_every_test):
+    test_case = _test_case(root_folder, tests, discover_every_test)
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(test_case)
+    block_registry.clear()
+    with quiet():
+        result = unittest.TextTestRunner(stream=io.StringIO()).run(suite)
+    if not result.wasSuccessful():
+        raise RuntimeError((result.errors + result.failures)[0][1])
+    return test_case.setup_seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m service_tests.benchmarks.bench_service_setup",
+        description="Time the setUp of service tests")
+    parser.add_argument("--tests", type=int, default=100)
+    parser.add_argument("--blocks", type=int, default=20)
+    args = parser.parse_args(argv)
+    root_folder = tempfile.mkdtemp()
+    try:
+        _project(root_folder, args.blocks)
+        timings = [(name, _run(root_folder, args.tests, discover_every_test))
+                   for name, discover_every_test in (
+                       ("discover every test", True), ("registry", False))]
+    finally:
+        shutil.rmtree(root_folder)
+    rows = []
+    for name, seconds in timings:
+        seconds = sorted(seconds)
+        rows.append((name, len(seconds),
+                     "{:.2f}ms".format(seconds[0] * 1e3),
+                     "{:.2f}ms".format(median(seconds) * 1e3),
+                     "{:.2f}ms".format(seconds[int(len(seconds) * 0.9)] * 1e3),
+                     "{:.2f}s".format(sum(seconds))))
+    print_table(("blocks", "tests", "min", "median", "p90", "total"), rows)
+
+
+if __name__ == "__main__":
+    main()
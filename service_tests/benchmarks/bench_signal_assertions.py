@@ -0,0 +1,77 @@
+""" Asserting every published signal was published
+
+A test asserting each of the signals a service published used to scan the
+published signals with assertDictEqual per assertion, quadratic in the
+number of signals. That is timed alongside lookups in the signal index
+kept as signals are published, including building the index. Scans of more
+than SCAN_MAX signals take minutes and are skipped.
+"""
+import unittest
+from time import perf_counter
+
+from nio.signal.base import Signal
+
+from ..signal_index import SignalIndex
+from .common import format_us, print_table
+
+SIZES = (100, 300, 1000, 5000)
+SCAN_MAX = 300
+
+
+class _Assertions(unittest.TestCase):
+
+    def runTest(self):
+        pass  # pragma: no cover
+
+    def assert_signal_published(self, published_signals, signal_dict):
+        """ assert_signal_published as it was """
+        for published_signal in published_signals:
+            try:
+                self.assertDictEqual(published_signal.to_dict(), signal_dict)
+                return
+            except Exception:
+                continue
+        self.fail("Signal has not been published: {}".format(signal_dict))
+
+
+def _signal_dicts(count):
+    return [{"name": "client_{}".format(index % 50), "sequence": index,
+             "cpu": index % 100, "violations": ["cpu"] if index % 7 else []}
+            for index in range(count)]
+
+
+def _scan(signal_dicts):
+    published = [Signal(signal_dict) for signal_dict in signal_dicts]
+    assertions = _Assertions()
+    for signal_dict in signal_dicts:
+        assertions.assert_signal_published(published, signal_dict)
+
+
+def _indexed(signal_dicts):
+    published = []
+    index = SignalIndex()
+    index.extend(published, [Signal(signal_dict)
+                             for signal_dict in signal_dicts], "topic")
+    for signal_dict in signal_dicts:
+        assert index.count(published, signal_dict, "topic")
+
+
+def run():
+    rows = []
+    for size in SIZES:
+        signal_dicts = _signal_dicts(size)
+        for name, assert_all in (("assertDictEqual scan", _scan),
+                                 ("index", _indexed)):
+            if assert_all is _scan and size > SCAN_MAX:
+                rows.append((size, name, "skipped", ""))
+                continue
+            start = perf_counter()
+            assert_all(signal_dicts)
+            elapsed = perf_counter() - start
+            rows.append((size, name, "{:.1f}ms".format(elapsed * 1e3),
+                         format_us(elapsed / size)))
+    print_table(("signals", "assertions", "total", "per assertion"), rows)
+
+
+if __name__ == "__main__":
+    run()
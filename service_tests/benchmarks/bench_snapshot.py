@@ -0,0 +1,86 @@
+""" Startup load of 5k block configs, from their files vs a snapshot
+
+Cold starts are timed in a new process, the way an instance starts,
+warm ones by loading again in the same process. A snapshot load opens
+the memory-mapped snapshot and decodes either a single config or all of
+them, a directory load parses every file (warm loads hit the parse
+cache).
+"""
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+from nio.modules.context import ModuleContext
+
+from ..modules.module_persistence_file.persistence import Persistence
+from ..modules.module_persistence_file.snapshot import SNAPSHOT_NAME, \
+    build_snapshot
+from .common import print_table
+
+CONFIGS = 5000
+ETC_BLOCKS = os.path.join(
+    os.path.dirname(__file__), "..", "..", "etc", "blocks")
+MODES = ("directory", "snapshot, one config", "snapshot, all configs")
+
+
+def _load(folder, mode):
+    """ Configure the persistence and load the blocks, returns seconds """
+    start = perf_counter()
+    context = ModuleContext()
+    context.root_folder = folder
+    context.root_id = ""
+    context.format = Persistence.Format.json.value
+    if mode != "directory":
+        context.snapshot = os.path.join(folder, SNAPSHOT_NAME)
+    Persistence.configure(context)
+    blocks = Persistence().load_collection("blocks")
+    if mode == "snapshot, all configs":
+        list(blocks.values())
+    else:
+        blocks["block_0"]
+    return perf_counter() - start
+
+
+def run(configs=CONFIGS):
+    samples = []
+    for filename in sorted(glob.glob(os.path.join(ETC_BLOCKS, "*.cfg"))):
+        with open(filename) as file:
+            samples.append(json.load(file))
+    folder = tempfile.mkdtemp()
+    try:
+        context = ModuleContext()
+        context.root_folder = folder
+        context.root_id = ""
+        context.format = Persistence.Format.json.value
+        Persistence.configure(context)
+        Persistence().save_collection(
+            {"block_{}".format(index): samples[index % len(samples)]
+             for index in range(configs)}, "blocks")
+        start = perf_counter()
+        build_snapshot(folder, ["blocks"])
+        build = perf_counter() - start
+        rows = []
+        for mode in MODES:
+            cold = float(subprocess.check_output(
+                [sys.executable, "-m", __spec__.name, folder, mode]))
+            _load(folder, mode)
+            warm = _load(folder, mode)
+            rows.append((mode, "{:.1f}ms".format(cold * 1e3),
+                         "{:.1f}ms".format(warm * 1e3)))
+    finally:
+        shutil.rmtree(folder)
+    print_table(("{} block configs".format(configs), "cold", "warm"), rows)
+    print("snapshot built in {:.1f}ms".format(build * 1e3))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # cold start, in a new process
+        print(_load(*sys.argv[1:]))
+    else:
+        run()
@@ -0,0 +1,71 @@
+""" Idle CPU use and firing jitter of the scheduler thread
+
+The scheduler thread either polls, waking up at least every resolution
+(0.01 seconds in tests) even with nothing due, or is tickless, sleeping
+until the next job is due and woken up early when an earlier job is
+scheduled. Measures the CPU used by the process while the scheduler sits
+idle with a job due in an hour, then how late one-shot jobs fire relative
+to their due time.
+"""
+import random
+from datetime import timedelta
+from statistics import mean
+from threading import Event
+from time import monotonic, process_time, sleep
+
+from .bench_scheduler import scheduler
+from .common import format_us, print_table
+
+IDLE_SECONDS = 2
+JOBS = 200
+
+
+def _idle_cpu(runner, seconds=IDLE_SECONDS):
+    """ Percentage of a CPU used while the scheduler has nothing due """
+    job = runner.schedule_task(lambda: None, timedelta(hours=1), False)
+    start = process_time()
+    sleep(seconds)
+    used = process_time() - start
+    runner.unschedule(job)
+    return used / seconds * 100
+
+
+def _lateness(runner, jobs=JOBS):
+    """ How late each of a series of one-shot jobs fired, in seconds """
+    rng = random.Random(jobs)
+    late = []
+    for _ in range(jobs):
+        fired = Event()
+        delta = rng.uniform(0.001, 0.02)
+        due = monotonic() + delta
+
+        def _fire():
+            late.append(monotonic() - due)
+            fired.set()
+
+        runner.schedule_task(_fire, timedelta(seconds=delta), False)
+        fired.wait(1)
+    return sorted(late)
+
+
+def run():
+    rows = []
+    for tickless in (False, True):
+        runner = scheduler(tickless=tickless)
+        runner.start()
+        try:
+            cpu = _idle_cpu(runner)
+            late = _lateness(runner)
+        finally:
+            runner.stop()
+        rows.append(("tickless" if tickless else "polling",
+                     "{:.2f}%".format(cpu),
+                     format_us(mean(late)),
+                     format_us(late[int(len(late) * 0.99)]),
+                     format_us(late[-1])))
+    print_table(("thread", "idle cpu", "mean late", "p99 late", "max late"),
+                rows)
+
+
+if __name__ == "__main__":
+    run()
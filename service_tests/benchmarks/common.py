@@ -0,0 +1,80 @@
+""" Helpers shared by the service_tests micro-benchmarks
+
+Benchmarks are plain scripts, run them from the project root with:
+
+    python -m service_tests.benchmarks.<benchmark module>
+"""
+import contextlib
+import io
+from time import perf_counter
+
+
+def best_of(func, number, repeat=5):
+    """ Run func `number` times, `repeat` times over, and return the best
+    average time per call in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@contextlib.contextmanager
+def quiet():
+    """ Swallow anything printed to stdout while benchmarking """
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def print_table(headers, rows):
+    """ Print rows of values aligned under the given headers """
+    widths = [max(len(str(value)) for value in column)
+              for column in zip(headers, *rows)]
+    line = "  ".join("{{:>{}}}".format(width) for width in widths)
+    print(line.format(*headers))
+    for row in rows:
+        print(line.format(*row))
+
+
+def format_us(seconds):
+    """ Format a duration in seconds as microseconds """
+    return "{:.2f}us".format(seconds * 1e6)
+
+
+class NullBlock(object):
+    """ Minimal stand-in for a block, it only counts what it processes """
+
+    def __init__(self, name):
+        self._name = name
+        self.count = 0
+
+    def name(self):
+        return self._name
+
+    def process_signals(self, signals, input_id=None):
+        self.count += len(signals)
+
+
+def fan_graph(size, fan_out=1):
+    """ Build a service execution of `size` blocks.
+
+    Every block sends to the next `fan_out` blocks, except for the last
+    blocks which have no receivers.
+
+    Returns:
+        (execution, blocks): execution list and dict of NullBlocks by name
+    """
+    names = ["block_{}".format(index) for index in range(size)]
+    execution = []
+    for index, name in enumerate(names):
+        receivers = [{"name": receiver, "input": "__default_terminal_value"}
+                     for receiver in names[index + 1:index + 1 + fan_out]]
+        execution.append({
+            "name": name,
+            "receivers": {"__default_terminal_value": receivers}
+        })
+    return execution, {name: NullBlock(name) for name in names}
@@ -0,0 +1,46 @@
+""" Block classes discovered once per process, by type name
+
+Discovering blocks imports and scans every module of the blocks package,
+the service tests of a process share the classes discovered instead of
+discovering them again in every setUp.
+"""
+from threading import Lock
+
+from niocore.core.loader.discover import Discover
+
+# (package, base class, discoverable) -> type name -> block class
+_discovered = {}
+_discovered_lock = Lock()
+
+
+def block_classes(package, base, discoverable):
+    """ Block classes of a package by type name
+
+    Discovered on first use, classes sharing a name are resolved to the
+    first one discovered. A failed discovery is tried again on next use.
+
+    Args:
+        package (str): package to discover blocks in
+        base (type): class blocks derive from
+        discoverable (callable): discoverable(class) tells whether a
+            class is a block to discover
+
+    Returns:
+        dict: type name -> block class
+    """
+    key = (package, base, discoverable)
+    with _discovered_lock:
+        classes = _discovered.get(key)
+        if classes is None:
+            classes = {}
+            for block_class in Discover.discover_classes(
+                    package, base, discoverable):
+                classes.setdefault(block_class.__name__, block_class)
+            _discovered[key] = classes
+        return classes
+
+
+def clear():
+    """ Forget the classes discovered, for blocks to be discovered again """
+    with _discovered_lock:
+        _discovered.clear()
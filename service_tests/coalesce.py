@@ -0,0 +1,89 @@
+from datetime import timedelta
+from threading import RLock
+
+from nio.modules.scheduler import Job
+
+
+class SignalCoalescer(object):
+
+    """ Batches the signals sent to each block input
+
+    Signals sent to the same block and input are buffered and handed over
+    in a single process_signals call, once `max_size` signals are buffered
+    or `window` seconds after the first of them was buffered, whichever
+    comes first. Windows are timed by the scheduler module, so a
+    synchronous service test moves them forward with jump_ahead.
+
+    Without a window, signals stay buffered until `max_size` is reached or
+    flush() is called.
+    """
+
+    def __init__(self, window=None, max_size=None):
+        """
+        Args:
+            window (float): seconds to buffer signals for
+            max_size (int): number of signals triggering a delivery
+        """
+        if not window and not max_size:
+            raise ValueError("Coalescing needs a window or a max size")
+        self._window = timedelta(seconds=window) if window else None
+        self._max_size = max_size
+        self._deliver = None
+        self._lock = RLock()
+        # (block, input_id) -> buffered signals
+        self._buffers = {}
+        # (block, input_id) -> Job flushing the buffer at the window end
+        self._jobs = {}
+
+    def bind(self, deliver):
+        """ Set the callable delivering batches, deliver(block, signals,
+        input_id)
+        """
+        self._deliver = deliver
+
+    def add(self, block, signals, input_id):
+        key = (block, input_id)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = []
+            buffer.extend(signals)
+            if self._max_size and len(buffer) >= self._max_size:
+                batch = self._take(key)
+            else:
+                batch = None
+                if self._window and key not in self._jobs:
+                    self._jobs[key] = Job(
+                        self._flush_key, self._window, False, key)
+        if batch:
+            self._deliver(block, batch, input_id)
+
+    def flush(self):
+        """ Deliver every buffered signal right away """
+        with self._lock:
+            batches = [(key, self._take(key)) for key in list(self._buffers)]
+        for (block, input_id), batch in batches:
+            if batch:
+                self._deliver(block, batch, input_id)
+
+    def stop(self):
+        """ Cancel pending windows and discard buffered signals """
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+            self._jobs.clear()
+            self._buffers.clear()
+
+    def _flush_key(self, key):
+        with self._lock:
+            self._jobs.pop(key, None)
+            batch = self._take(key)
+        if batch:
+            self._deliver(key[0], batch, key[1])
+
+    def _take(self, key):
+        """ Remove and return a buffer, cancelling its window """
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            job.cancel()
+        return self._buffers.pop(key, None)
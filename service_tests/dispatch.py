@@ -0,0 +1,181 @@
+from collections import deque
+from enum import Enum
+from queue import Queue
+from threading import Condition, RLock, local
+
+from nio.util.logging import get_nio_logger
+from nio.util.threading import spawn
+
+
+class QueueFullPolicy(Enum):
+    """ What to do with signals sent to a block whose mailbox is full
+
+    block: wait until the block's mailbox has room again
+    drop_oldest: discard the oldest signals waiting in the mailbox
+    drop_newest: discard the signals being sent
+    """
+    block = 1
+    drop_oldest = 2
+    drop_newest = 3
+
+
+class _Mailbox(object):
+
+    __slots__ = ("block", "messages", "scheduled", "not_full")
+
+    def __init__(self, block, lock):
+        self.block = block
+        self.messages = deque()
+        # True while the mailbox is queued for, or drained by, a worker
+        self.scheduled = False
+        self.not_full = Condition(lock)
+
+
+class MailboxDispatcher(object):
+
+    """ Delivers signals to blocks from a bounded pool of worker threads
+
+    Every block gets a mailbox holding up to `queue_depth` pending
+    deliveries. A mailbox is drained by one worker at a time, so a block
+    processes signals in the order they were sent to it, while different
+    blocks are processed concurrently by up to `workers` threads.
+
+    When a mailbox is full, `full_policy` decides what happens. The block
+    policy applies backpressure to the threads feeding the service
+    (scheduler jobs, subscribers, tests); workers delivering signals
+    between blocks are never blocked, since a worker waiting on another
+    worker could deadlock the pool. Nor are threads dispatching before the
+    dispatcher starts, no worker would ever make room. In both cases the
+    mailbox grows past `queue_depth`, deliveries queued past it are counted
+    as overflowed.
+    """
+
+    def __init__(self, workers=4, queue_depth=100,
+                 full_policy=QueueFullPolicy.block, batch_size=10):
+        if workers < 1 or queue_depth < 1:
+            raise ValueError("workers and queue_depth must be positive")
+        self._workers = workers
+        self._queue_depth = queue_depth
+        self._full_policy = full_policy
+        # deliveries a worker makes from a mailbox before moving on to
+        # other mailboxes
+        self._batch_size = batch_size
+        self._lock = RLock()
+        self._mailboxes = {}
+        self._ready = Queue()
+        self._threads = []
+        self._running = False
+        # deliveries are queued until the dispatcher starts, and refused
+        # once it stops
+        self._stopped = False
+        self._worker_state = local()
+        self.delivered = 0
+        self.dropped = 0
+        self.overflowed = 0
+        self.logger = get_nio_logger("MailboxDispatcher")
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._stopped = False
+        self._threads = [spawn(self._work) for _ in range(self._workers)]
+
+    def stop(self, timeout=1):
+        """ Stop the workers, discarding pending deliveries, deliveries are
+        refused until started again
+        """
+        with self._lock:
+            self._stopped = True
+            for mailbox in self._mailboxes.values():
+                mailbox.messages.clear()
+                mailbox.not_full.notify_all()
+            if not self._running:
+                return
+            self._running = False
+        for _ in self._threads:
+            self._ready.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def dispatch(self, block, signals, input_id=None):
+        """ Queue signals for delivery to block.process_signals
+
+        With the block policy, a full mailbox takes the signals anyway when
+        dispatching from a worker or before the dispatcher starts, see
+        `overflowed` in stats.
+
+        Returns:
+            bool: False if the signals were dropped
+        """
+        with self._lock:
+            mailbox = self._mailboxes.get(block)
+            if mailbox is None:
+                mailbox = self._mailboxes[block] = _Mailbox(block, self._lock)
+            if len(mailbox.messages) >= self._queue_depth:
+                if self._full_policy is QueueFullPolicy.drop_newest:
+                    self.dropped += 1
+                    return False
+                elif self._full_policy is QueueFullPolicy.drop_oldest:
+                    mailbox.messages.popleft()
+                    self.dropped += 1
+                elif self._running and \
+                        not getattr(self._worker_state, "is_worker", False):
+                    mailbox.not_full.wait_for(
+                        lambda: len(mailbox.messages) < self._queue_depth or
+                        self._stopped)
+                elif not self._stopped:
+                    self.overflowed += 1
+            if self._stopped:
+                return False
+            mailbox.messages.append((signals, input_id))
+            if not mailbox.scheduled:
+                mailbox.scheduled = True
+                self._ready.put(mailbox)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "overflowed": self.overflowed,
+                "pending": {mailbox.block.name(): len(mailbox.messages)
+                            for mailbox in self._mailboxes.values()
+                            if mailbox.messages},
+            }
+
+    def _work(self):
+        self._worker_state.is_worker = True
+        while True:
+            mailbox = self._ready.get()
+            if mailbox is None:
+                return
+            self._drain(mailbox)
+
+    def _drain(self, mailbox):
+        for _ in range(self._batch_size):
+            with self._lock:
+                if not mailbox.messages:
+                    mailbox.scheduled = False
+                    return
+                signals, input_id = mailbox.messages.popleft()
+                mailbox.not_full.notify()
+            try:
+                if input_id is None:
+                    mailbox.block.process_signals(signals)
+                else:
+                    mailbox.block.process_signals(signals, input_id)
+            except Exception:
+                self.logger.exception(
+                    "Delivering signals to {}".format(mailbox.block.name()))
+            with self._lock:
+                self.delivered += 1
+        with self._lock:
+            # give other mailboxes a turn before draining this one further
+            if mailbox.messages:
+                self._ready.put(mailbox)
+            else:
+                mailbox.scheduled = False
@@ -0,0 +1,72 @@
+""" Substitution of [[NAME]] environment variable placeholders in configs
+
+A single pattern matching the placeholders of every variable is compiled
+per set of variables, and configs are rewritten in one pass over their
+tree. Strings substituted are cached, a string seen before is not matched
+again.
+"""
+import re
+from functools import lru_cache
+
+# sets of variables kept
+SUBSTITUTIONS = 32
+# strings substituted kept per set of variables
+STRING_CACHE_SIZE = 4096
+
+
+def substitution(env_vars):
+    """ EnvVarSubstitution of a set of variables, shared by every user of
+    the same variables and values
+    """
+    return _substitution(tuple(sorted(
+        (name, str(value)) for name, value in env_vars.items())))
+
+
+@lru_cache(maxsize=SUBSTITUTIONS)
+def _substitution(env_vars):
+    return EnvVarSubstitution(dict(env_vars))
+
+
+class EnvVarSubstitution(object):
+
+    """ Replaces the [[NAME]] placeholders of a set of variables
+
+    Placeholders are replaced in the strings of a config, at any depth of
+    dicts and lists, keys are left as they are. Values are inserted as
+    they are, a value holding a placeholder is not substituted again.
+    """
+
+    def __init__(self, env_vars, cache_size=STRING_CACHE_SIZE):
+        """
+        Args:
+            env_vars (dict): variable name -> value, values are converted
+                to strings
+            cache_size (int): strings substituted kept in the cache
+        """
+        self._values = {name: str(value) for name, value in env_vars.items()}
+        self._pattern = re.compile(r"\[\[({})\]\]".format("|".join(
+            re.escape(name) for name in self._values))) \
+            if self._values else None
+        self._substitute = lru_cache(maxsize=cache_size)(self._substitute)
+
+    def replace(self, config):
+        """ A copy of config with its placeholders replaced, config is left
+        unchanged
+        """
+        if isinstance(config, str):
+            return self.replace_string(config)
+        if isinstance(config, dict):
+            return {key: self.replace(value) for key, value in config.items()}
+        if isinstance(config, list):
+            return [self.replace(value) for value in config]
+        return config
+
+    def replace_string(self, value):
+        """ A string with its placeholders replaced """
+        if self._pattern is None or "[[" not in value:
+            return value
+        return self._substitute(value)
+
+    def _substitute(self, value):
+        return self._pattern.sub(
+            lambda match: self._values[match.group(1)], value)
@@ -0,0 +1,201 @@
+from copy import copy, deepcopy
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from functools import lru_cache
+from threading import Lock
+
+from nio.signal.base import Signal
+
+# attribute values of these types can be shared between receivers as is
+_IMMUTABLE_TYPES = frozenset((
+    type(None), bool, int, float, complex, str, bytes,
+    date, datetime, time, timedelta))
+
+
+class SignalIsolation(Enum):
+    """ How the router isolates the signals handed to each receiver
+
+    strict: every receiver gets its own deep copy of the signal list, useful
+        when debugging a block suspected of mutating shared signals.
+    copy_on_write: the mutable attribute values of the notified signals are
+        copied once into a snapshot shared by all receivers, a receiver
+        only gets its own copy of a value when it accesses it.
+    """
+    strict = 1
+    copy_on_write = 2
+
+
+def _rebuild_signal(state):
+    signal = Signal.__new__(Signal)
+    signal.__dict__.update(state)
+    return signal
+
+
+@lru_cache(maxsize=None)
+def _class_dir(cls):
+    """ Attribute names of a view class, without those of the view """
+    return frozenset(name for name in dir(cls)
+                     if not name.startswith("_cow_"))
+
+
+class _Snapshot(object):
+
+    """ Mutable attribute values of a notified signal, as they were when
+    notified, shared by the views handed to its receivers
+
+    Views holding the snapshot still have values to take from it. The last
+    one takes its values as they are, the others copy them.
+    """
+
+    __slots__ = ("values", "holders", "lock")
+
+    def __init__(self, values, holders):
+        self.values = values
+        self.holders = holders
+        self.lock = Lock()
+
+
+class CopyOnWriteSignal(Signal):
+
+    """ Signal view sharing its attribute values with the other receivers
+
+    Immutable attribute values are shared with the notified signal right
+    away. Mutable values (dicts, lists, ...) are left in a snapshot taken
+    when the signal is notified, a receiver gets its own copy of a value
+    the first time it accesses it, as blocks may change it in place. A
+    receiver never sees changes made to the signal after it was notified,
+    nor changes made by the other receivers.
+
+    Blocks reading attributes, setting them or calling to_dict() get the
+    same behaviour they would get from a deep copy. Blocks that read the
+    signal's __dict__ directly should be tested with strict isolation.
+    """
+
+    __slots__ = ("_cow_snapshot", "_cow_pending")
+
+    @classmethod
+    def views(cls, source, count):
+        """ Views of a signal for count receivers
+
+        Args:
+            source (Signal): signal notified, plain or a view
+            count (int): number of receivers
+
+        Returns:
+            list: CopyOnWriteSignal for each receiver
+        """
+        shared = {}
+        mutable = {}
+        for name, value in source.__dict__.items():
+            if type(value) in _IMMUTABLE_TYPES:
+                shared[name] = value
+            else:
+                mutable[name] = value
+        if type(source) is cls:
+            # values the source view has not taken from its own snapshot
+            values = source._cow_snapshot.values
+            mutable.update((name, values[name])
+                           for name in source._cow_pending)
+        snapshot = _Snapshot(deepcopy(mutable), count if mutable else 0)
+        views = []
+        for _ in range(count):
+            view = cls.__new__(cls)
+            view.__dict__.update(shared)
+            view._cow_snapshot = snapshot
+            view._cow_pending = set(mutable)
+            views.append(view)
+        return views
+
+    def __getattr__(self, name):
+        # only called when the attribute is not found the regular way
+        if name.startswith("_cow_") or name not in self._cow_pending:
+            raise AttributeError(name)
+        self._take((name,))
+        return self.__dict__[name]
+
+    def __setattr__(self, name, value):
+        if not name.startswith("_cow_"):
+            self._discard(name)
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if name in self._cow_pending:
+            self._discard(name)
+        else:
+            super().__delattr__(name)
+
+    def __dir__(self):
+        return list(_class_dir(type(self)).union(
+            self.__dict__, self._cow_pending))
+
+    def _take(self, names):
+        """ Take values from the snapshot, copied unless no other view
+        needs them
+        """
+        snapshot = self._cow_snapshot
+        with snapshot.lock:
+            last = snapshot.holders == 1
+        values = {name: snapshot.values[name] for name in names}
+        if not last:
+            # a single deepcopy memo for values sharing objects
+            values = deepcopy(values)
+        self.__dict__.update(values)
+        self._cow_pending.difference_update(names)
+        if not self._cow_pending:
+            self._release()
+
+    def _discard(self, name):
+        if name in self._cow_pending:
+            self._cow_pending.discard(name)
+            if not self._cow_pending:
+                self._release()
+
+    def _release(self):
+        snapshot = self._cow_snapshot
+        with snapshot.lock:
+            snapshot.holders -= 1
+
+    def _materialize(self):
+        if self._cow_pending:
+            self._take(tuple(self._cow_pending))
+
+    def to_dict(self, *args, **kwargs):
+        self._materialize()
+        return super().to_dict(*args, **kwargs)
+
+    def __reduce_ex__(self, protocol):
+        # copies and pickles of a view are plain signals
+        self._materialize()
+        return _rebuild_signal, (self.__dict__,)
+
+
+def _deep_copy(value):
+    """ Deep copy a value, falling back to a shallow copy """
+    try:
+        return deepcopy(value)
+    except Exception:
+        return copy(value)
+
+
+def isolate_strict(signals, receivers):
+    """ A deep copy of the signal list for each of the receivers """
+    return [_deep_copy(signals) for _ in range(receivers)]
+
+
+def isolate_copy_on_write(signals, receivers):
+    """ Copy-on-write views of the signal list for each of the receivers,
+    signals of other types than Signal are deep copied for each
+    """
+    columns = []
+    for signal in signals:
+        if type(signal) is Signal or type(signal) is CopyOnWriteSignal:
+            columns.append(CopyOnWriteSignal.views(signal, receivers))
+        else:
+            columns.append([_deep_copy(signal) for _ in range(receivers)])
+    return [list(views) for views in zip(*columns)]
+
+
+ISOLATION = {
+    SignalIsolation.strict: isolate_strict,
+    SignalIsolation.copy_on_write: isolate_copy_on_write,
+}
@@ -0,0 +1,112 @@
+from collections import defaultdict, deque
+from threading import Lock
+from time import time
+
+
+class Histogram(object):
+
+    """ Histogram of durations with power of two microsecond buckets
+
+    Bucket n counts durations between 2**(n-1) and 2**n microseconds,
+    bucket 0 counts durations under a microsecond.
+    """
+
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = defaultdict(int)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        self.buckets[int(seconds * 1e6).bit_length()] += 1
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {"<{}us".format(2 ** bucket): self.buckets[bucket]
+                        for bucket in sorted(self.buckets)},
+        }
+
+
+class RouterInstrumentation(object):
+
+    """ Records what flows through a ServiceTestRouter
+
+    Keeps, per edge of the service graph, how many notifications and
+    signals went through it, per block, histograms of the wall and CPU
+    time spent in process_signals and how many calls raised, plus the
+    most recent hops in a ring buffer of `trace_size` entries.
+
+    snapshot() returns all of it as JSON serializable data.
+    """
+
+    def __init__(self, trace_size=100):
+        self._lock = Lock()
+        self._trace_size = trace_size
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (from block, to block, input_id) -> [notifications, signals]
+            self._edges = defaultdict(lambda: [0, 0])
+            self._wall = defaultdict(Histogram)
+            self._cpu = defaultdict(Histogram)
+            self._exceptions = defaultdict(int)
+            self._trace = deque(maxlen=self._trace_size)
+
+    def record_hop(self, from_name, to_name, input_id, signal_count):
+        with self._lock:
+            edge = self._edges[(from_name, to_name, input_id)]
+            edge[0] += 1
+            edge[1] += signal_count
+            self._trace.append(
+                (time(), from_name, to_name, input_id, signal_count))
+
+    def record_process(self, block_name, wall, cpu, failed):
+        with self._lock:
+            self._wall[block_name].add(wall)
+            self._cpu[block_name].add(cpu)
+            if failed:
+                self._exceptions[block_name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "edges": [
+                    {"from": from_name, "to": to_name, "input": input_id,
+                     "notifications": notifications, "signals": signals}
+                    for (from_name, to_name, input_id),
+                    (notifications, signals) in self._edges.items()],
+                "blocks": {
+                    block_name: {
+                        "wall": self._wall[block_name].snapshot(),
+                        "cpu": self._cpu[block_name].snapshot(),
+                        "exceptions": self._exceptions[block_name],
+                    } for block_name in self._wall},
+                "trace": [
+                    {"time": timestamp, "from": from_name, "to": to_name,
+                     "input": input_id, "signals": signals}
+                    for timestamp, from_name, to_name, input_id, signals
+                    in self._trace],
+            }
+
+    def slowest_blocks(self, count=5):
+        """ Names of the blocks with the most wall time in process_signals
+        """
+        with self._lock:
+            ranked = sorted(self._wall.items(),
+                            key=lambda item: item[1].total, reverse=True)
+        return [block_name for block_name, _ in ranked[:count]]
@@ -0,0 +1,126 @@
+import os
+from enum import Enum
+from threading import Event, Lock
+from time import sleep
+from uuid import uuid4
+
+
+class CommitMode(Enum):
+    """ How saved files are written and made durable """
+    # written to a temporary file renamed over the target, without fsync
+    atomic = 1
+    # as atomic, the file and its directory are fsynced on every save
+    durable = 2
+    # as durable, saves waiting on the same commit share directory fsyncs
+    group = 3
+
+
+def save_atomically(filename, save, mode=CommitMode.atomic, committer=None):
+    """ Save a file through a temporary file renamed over it
+
+    A crash while saving leaves either the previous or the new file, never
+    a partially written one. Temporary files are hidden and end in .tmp.
+
+    Args:
+        filename (str): path of the file to save
+        save (callable): save(path) writes the file contents to path
+        mode (CommitMode): how the file is made durable
+        committer (GroupCommitter): shares directory fsyncs between saves,
+            required in group mode
+    """
+    directory, basename = os.path.split(filename)
+    # created by save, with the same permissions as the file would have
+    temp_filename = os.path.join(
+        directory, ".{}.{}.tmp".format(basename, uuid4().hex))
+    try:
+        save(temp_filename)
+        if mode is not CommitMode.atomic:
+            _fsync(temp_filename)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+    if mode is CommitMode.durable:
+        _fsync(directory)
+    elif mode is CommitMode.group:
+        committer.commit(directory)
+
+
+def _fsync(path):
+    """ fsync a file or a directory """
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class _Commit(object):
+
+    def __init__(self):
+        self.directories = set()
+        self.done = Event()
+        self.error = None
+
+
+class GroupCommitter(object):
+
+    """ Shares directory fsyncs between concurrent saves
+
+    A save waits for its directory to be fsynced. The first save of a
+    commit waits `window` seconds and for the previous commit to be done,
+    meanwhile the saves arriving join its commit, then their directories
+    are fsynced once for all of them.
+    """
+
+    def __init__(self, window=0):
+        """
+        Args:
+            window (float): seconds a commit waits for saves to join it
+        """
+        self._window = window
+        # guards the commit saves join
+        self._lock = Lock()
+        # held while fsyncing a commit's directories
+        self._sync_lock = Lock()
+        self._commit = None
+        self._stats = dict(saves=0, commits=0, syncs=0)
+
+    def commit(self, directory):
+        """ Return once directory was fsynced after this call """
+        with self._lock:
+            self._stats["saves"] += 1
+            commit = self._commit
+            leader = commit is None
+            if leader:
+                commit = self._commit = _Commit()
+            commit.directories.add(directory)
+        if leader:
+            self._sync(commit)
+        else:
+            commit.done.wait()
+        if commit.error is not None:
+            raise commit.error
+
+    def stats(self):
+        """ Counters of the saves, commits and directory fsyncs """
+        with self._lock:
+            return dict(self._stats)
+
+    def _sync(self, commit):
+        if self._window:
+            sleep(self._window)
+        with self._sync_lock:
+            with self._lock:
+                # saves from now on join the next commit
+                self._commit = None
+                self._stats["commits"] += 1
+                self._stats["syncs"] += len(commit.directories)
+            try:
+                for directory in commit.directories:
+                    _fsync(directory)
+            except Exception as error:
+                commit.error = error
+            finally:
+                commit.done.set()
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Event, RLock
+
+from nio.util.logging import get_nio_logger
+from nio.util.threading import spawn
+
+
+class WriteBackCache(object):
+
+    """ Size bounded LRU cache of persisted items
+
+    Loaded items are kept in memory, the least recently used ones are
+    evicted once more than `size` items are cached. Saved items are kept
+    as dirty entries and written to disk every `flush_interval` seconds,
+    when evicted, and when flushed.
+
+    Items are copied as they are saved and loaded, as writing them to disk
+    and reading them back would, so that changes made to an item saved or
+    loaded never reach the cache.
+    """
+
+    def __init__(self, size, read, write, delete, flush_interval=None):
+        """
+        Args:
+            size (int): maximum number of items cached
+            read (callable): read(key) loads an item from disk
+            write (callable): write(item, key) saves an item to disk
+            delete (callable): delete(key) removes an item from disk
+            flush_interval (float): seconds between flushes of the dirty
+                items, when None they are written on eviction and flush()
+        """
+        self.logger = get_nio_logger("WriteBackCache")
+        self._size = size
+        self._read = read
+        self._write = write
+        self._delete = delete
+        self._flush_interval = flush_interval
+        # key -> item, least recently used first
+        self._items = OrderedDict()
+        self._dirty = set()
+        # held around disk access too, so that an older value of an item
+        # is never written over a newer one
+        self._lock = RLock()
+        self._stop_event = Event()
+        self._flush_thread = None
+        self._stats = dict(hits=0, misses=0, flushes=0, evictions=0)
+
+    def start(self):
+        if self._flush_interval and self._flush_thread is None:
+            self._stop_event.clear()
+            self._flush_thread = spawn(self._flush_periodically)
+
+    def stop(self):
+        """ Stop flushing periodically and write the dirty items """
+        self._stop_event.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        self.flush()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self._stats["hits"] += 1
+                return deepcopy(self._items[key])
+            self._stats["misses"] += 1
+            item = self._items[key] = self._read(key)
+            self._evict()
+            return deepcopy(item)
+
+    def put(self, item, key):
+        item = deepcopy(item)
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            self._dirty.add(key)
+            self._evict()
+
+    def remove(self, key):
+        """ Drop an item, from disk too """
+        with self._lock:
+            self._items.pop(key, None)
+            self._dirty.discard(key)
+            self._delete(key)
+
+    def discard(self, prefix):
+        """ Drop the items whose key starts with prefix, without writing
+        them
+        """
+        with self._lock:
+            for key in [key for key in self._items if key.startswith(prefix)]:
+                del self._items[key]
+                self._dirty.discard(key)
+
+    def flush(self, prefix=""):
+        """ Write the dirty items whose key starts with prefix """
+        with self._lock:
+            for key in [key for key in self._dirty if key.startswith(prefix)]:
+                self._write(self._items[key], key)
+                self._dirty.discard(key)
+                self._stats["flushes"] += 1
+
+    def stats(self):
+        """ Counters of the cache hits, misses, items written and evicted,
+        along with the number of items cached and dirty
+        """
+        with self._lock:
+            return dict(self._stats, size=len(self._items),
+                        dirty=len(self._dirty))
+
+    def _evict(self):
+        """ Drop the least recently used items past the size, writing them
+        when dirty. Must be called holding the lock.
+        """
+        while len(self._items) > self._size:
+            key, item = self._items.popitem(last=False)
+            if key in self._dirty:
+                self._write(item, key)
+                self._dirty.discard(key)
+                self._stats["flushes"] += 1
+            self._stats["evictions"] += 1
+
+    def _flush_periodically(self):
+        while not self._stop_event.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # log any exception, keep flushing
+                self.logger.exception("Failed to flush cached items")
@@ -0,0 +1,274 @@
+""" Encoding of persisted items to bytes
+
+The binary format is MessagePack. The msgpack package is used when it is
+installed, otherwise items are packed and unpacked in pure python; both
+read each other's output and write the same bytes. Values MessagePack has
+no type for, such as datetimes or sets, and values of any other type than
+the exact builtin ones it has a type for, such as tuples or dict
+subclasses, are kept as safepickle payloads in an extension type. Any item
+safepickle can save is saved in binary too, and loaded as it would be from
+a pickle.
+"""
+import json
+import os
+import pickle as unsafepickle
+import struct
+
+from safepickle import safepickle as pickle
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+# MessagePack extension type of safepickle payloads
+SAFEPICKLE_EXT = 1
+
+
+def dumps_pickle(item):
+    return pickle.dumps(item)
+
+
+def loads_pickle(data):
+    try:
+        return pickle.loads(data)
+    except Exception:
+        # items pickled before safepickle was used, see nio.util.codec
+        return unsafepickle.loads(data)
+
+
+def dumps_json(item):
+    return json.dumps(item, separators=(',', ':'), sort_keys=True).encode()
+
+
+def loads_json(data):
+    return json.loads(data.decode())
+
+
+def dumps_binary(item):
+    if msgpack is not None:
+        return msgpack.packb(item, use_bin_type=True, strict_types=True,
+                             default=_to_ext)
+    out = bytearray()
+    _pack(item, out)
+    return bytes(out)
+
+
+def loads_binary(data):
+    if msgpack is not None:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False,
+                               ext_hook=_from_ext)
+    item, position = _unpack(data, 0)
+    if position != len(data):
+        raise ValueError("{} bytes left unpacking".format(
+            len(data) - position))
+    return item
+
+
+def load_binary(path):
+    """ Loads a file in binary format, as nio.util.codec loads others
+
+    Args:
+        path (str): path to file
+
+    Returns:
+        file contents as a dictionary
+    """
+    data = {}
+    if os.path.isfile(path):
+        with open(path, 'rb') as f:
+            data = loads_binary(f.read())
+    return data
+
+
+def save_binary(path, data):
+    """ Saves a file in binary format
+
+    Args:
+        path (str): path to file
+        data (dict): data to save
+    """
+    with open(path, 'wb') as f:
+        f.write(dumps_binary(data))
+
+
+def _to_ext(item):
+    return msgpack.ExtType(SAFEPICKLE_EXT, pickle.dumps(item))
+
+
+def _from_ext(code, data):
+    if code == SAFEPICKLE_EXT:
+        return pickle.loads(data)
+    return msgpack.ExtType(code, data)  # pragma: no cover
+
+
+def _pack_int(item, out):
+    if 0 <= item < 0x80:
+        out.append(item)
+    elif -0x20 <= item < 0:
+        out.append(item & 0xff)
+    elif item >= 0:
+        if item <= 0xff:
+            out += b"\xcc" + struct.pack(">B", item)
+        elif item <= 0xffff:
+            out += b"\xcd" + struct.pack(">H", item)
+        elif item <= 0xffffffff:
+            out += b"\xce" + struct.pack(">I", item)
+        elif item <= 0xffffffffffffffff:
+            out += b"\xcf" + struct.pack(">Q", item)
+        else:
+            _pack_ext(item, out)
+    elif item >= -0x80:
+        out += b"\xd0" + struct.pack(">b", item)
+    elif item >= -0x8000:
+        out += b"\xd1" + struct.pack(">h", item)
+    elif item >= -0x80000000:
+        out += b"\xd2" + struct.pack(">i", item)
+    elif item >= -0x8000000000000000:
+        out += b"\xd3" + struct.pack(">q", item)
+    else:
+        _pack_ext(item, out)
+
+
+def _pack_length(length, fix, fix_max, codes, out):
+    """ Header of a str, bin, array or map of length items """
+    if length <= fix_max:
+        out.append(fix | length)
+    elif length <= 0xff and codes[0] is not None:
+        out += struct.pack(">BB", codes[0], length)
+    elif length <= 0xffff:
+        out += struct.pack(">BH", codes[1], length)
+    else:
+        out += struct.pack(">BI", codes[2], length)
+
+
+# length -> code of the fixext types
+_FIXEXT = {1: 0xd4, 2: 0xd5, 4: 0xd6, 8: 0xd7, 16: 0xd8}
+
+
+def _pack_ext(item, out):
+    data = pickle.dumps(item)
+    if len(data) in _FIXEXT:
+        out += struct.pack(">Bb", _FIXEXT[len(data)], SAFEPICKLE_EXT)
+    elif len(data) <= 0xff:
+        out += struct.pack(">BBb", 0xc7, len(data), SAFEPICKLE_EXT)
+    elif len(data) <= 0xffff:
+        out += struct.pack(">BHb", 0xc8, len(data), SAFEPICKLE_EXT)
+    else:
+        out += struct.pack(">BIb", 0xc9, len(data), SAFEPICKLE_EXT)
+    out += data
+
+
+def _pack(item, out):
+    kind = type(item)
+    if item is None:
+        out.append(0xc0)
+    elif kind is bool:
+        out.append(0xc3 if item else 0xc2)
+    elif kind is int:
+        _pack_int(item, out)
+    elif kind is float:
+        out += b"\xcb" + struct.pack(">d", item)
+    elif kind is str:
+        data = item.encode()
+        _pack_length(len(data), 0xa0, 0x1f, (0xd9, 0xda, 0xdb), out)
+        out += data
+    elif kind is bytes:
+        # bin has no fix variant
+        _pack_length(len(item), 0, -1, (0xc4, 0xc5, 0xc6), out)
+        out += item
+    elif kind is list:
+        _pack_length(len(item), 0x90, 0x0f, (None, 0xdc, 0xdd), out)
+        for value in item:
+            _pack(value, out)
+    elif kind is dict:
+        _pack_length(len(item), 0x80, 0x0f, (None, 0xde, 0xdf), out)
+        for key, value in item.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        _pack_ext(item, out)
+
+
+# code -> struct and kind of the values with a fixed size
+_FIXED = {
+    0xca: (struct.Struct(">f"), None), 0xcb: (struct.Struct(">d"), None),
+    0xcc: (struct.Struct(">B"), None), 0xcd: (struct.Struct(">H"), None),
+    0xce: (struct.Struct(">I"), None), 0xcf: (struct.Struct(">Q"), None),
+    0xd0: (struct.Struct(">b"), None), 0xd1: (struct.Struct(">h"), None),
+    0xd2: (struct.Struct(">i"), None), 0xd3: (struct.Struct(">q"), None),
+}
+# code -> struct of the length and kind of the values with a length
+_SIZED = {
+    0xd9: (struct.Struct(">B"), str), 0xda: (struct.Struct(">H"), str),
+    0xdb: (struct.Struct(">I"), str), 0xc4: (struct.Struct(">B"), bytes),
+    0xc5: (struct.Struct(">H"), bytes), 0xc6: (struct.Struct(">I"), bytes),
+    0xdc: (struct.Struct(">H"), list), 0xdd: (struct.Struct(">I"), list),
+    0xde: (struct.Struct(">H"), dict), 0xdf: (struct.Struct(">I"), dict),
+    0xc7: (struct.Struct(">Bb"), "ext"), 0xc8: (struct.Struct(">Hb"), "ext"),
+    0xc9: (struct.Struct(">Ib"), "ext"),
+}
+
+
+def _unpack(data, position):
+    """ Unpack the item at position, returns it and the position after it
+    """
+    code = data[position]
+    position += 1
+    if code < 0x80:
+        return code, position
+    if code >= 0xe0:
+        return code - 0x100, position
+    if code < 0x90:
+        kind, length = dict, code & 0x0f
+    elif code < 0xa0:
+        kind, length = list, code & 0x0f
+    elif code < 0xc0:
+        kind, length = str, code & 0x1f
+    elif code in _FIXED:
+        fixed = _FIXED[code][0]
+        return (fixed.unpack_from(data, position)[0],
+                position + fixed.size)
+    elif code in _SIZED or 0xd4 <= code <= 0xd8:
+        if code in _SIZED:
+            sized, kind = _SIZED[code]
+            header = sized.unpack_from(data, position)
+            position += sized.size
+        else:
+            # fixext, of 1, 2, 4, 8 or 16 bytes
+            kind = "ext"
+            header = (1 << (code - 0xd4),) + struct.unpack_from(
+                ">b", data, position)
+            position += 1
+        length = header[0]
+        if kind == "ext":
+            end = position + length
+            if header[1] != SAFEPICKLE_EXT:
+                raise ValueError("Unknown extension type {}".format(
+                    header[1]))
+            return pickle.loads(bytes(data[position:end])), end
+    elif code == 0xc0:
+        return None, position
+    elif code == 0xc2:
+        return False, position
+    elif code == 0xc3:
+        return True, position
+    else:
+        raise ValueError("Unsupported MessagePack code {:#x}".format(code))
+    if kind is str:
+        end = position + length
+        return bytes(data[position:end]).decode(), end
+    if kind is bytes:
+        end = position + length
+        return bytes(data[position:end]), end
+    if kind is list:
+        items = []
+        for _ in range(length):
+            item, position = _unpack(data, position)
+            items.append(item)
+        return items, position
+    items = {}
+    for _ in range(length):
+        key, position = _unpack(data, position)
+        items[key], position = _unpack(data, position)
+    return items, position
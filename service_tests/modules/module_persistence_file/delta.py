@@ -0,0 +1,199 @@
+import os
+import struct
+from threading import Lock
+
+# inode of the item file the records of a delta log apply to
+_HEADER = struct.Struct("<Q")
+# length of a record
+_LENGTH = struct.Struct("<I")
+
+
+def _flatten(item, dumps):
+    """ Encoded values of an item by path, one level into dict values, so
+    that a state dict of groups is saved by group
+
+    Returns:
+        dict: path -> encoded value, None for dict values
+    """
+    entries = {}
+    for key, value in item.items():
+        if type(value) is dict:
+            entries[(key,)] = None
+            for sub_key, sub_value in value.items():
+                entries[(key, sub_key)] = dumps(sub_value)
+        else:
+            entries[(key,)] = dumps(value)
+    return entries
+
+
+def delta_filename(filename):
+    """ Delta log of an item file, hidden next to it """
+    directory, basename = os.path.split(filename)
+    return os.path.join(directory, ".{}.delta".format(basename))
+
+
+def remove_deltas(filename):
+    """ Remove the delta log of an item file, if any """
+    try:
+        os.remove(delta_filename(filename))
+    except FileNotFoundError:
+        pass
+
+
+def load_deltas(filename, item, loads):
+    """ Apply the delta log of an item file to the item loaded from it
+
+    Records of a log written for a previous version of the file are
+    ignored, as is a record torn at the end of the log.
+
+    Args:
+        filename (str): item file the item was loaded from
+        item (dict): item loaded
+        loads (callable): decodes records, in the item's format
+
+    Returns:
+        the item with its changes applied
+    """
+    try:
+        with open(delta_filename(filename), "rb") as log:
+            data = log.read()
+    except FileNotFoundError:
+        return item
+    if not isinstance(item, dict) or len(data) < _HEADER.size or \
+            _HEADER.unpack_from(data)[0] != os.stat(filename).st_ino:
+        return item
+    position = _HEADER.size
+    while position + _LENGTH.size <= len(data):
+        start = position + _LENGTH.size
+        end = start + _LENGTH.unpack_from(data, position)[0]
+        if end > len(data):
+            break
+        changed, removed = loads(data[start:end])
+        for path, value in changed:
+            if len(path) == 1:
+                item[path[0]] = value
+            else:
+                item[path[0]][path[1]] = value
+        for path in removed:
+            if len(path) == 1:
+                item.pop(path[0], None)
+            elif isinstance(item.get(path[0]), dict):
+                item[path[0]].pop(path[1], None)
+        position = end
+    return item
+
+
+class DeltaLog(object):
+
+    """ Saves dict items as the keys changed since they were last saved
+
+    The first save of an item after it was loaded writes it whole, the
+    following ones append the keys changed and removed to a delta log next
+    to the item file, so that saving scales with the keys changing rather
+    than with the size of the item. Keys of dict values are compared too,
+    a block state keeping its groups in a dict saves the groups changed.
+    Every `consolidate_every` deltas, or once the log outgrows the item
+    file, the item is saved whole again and its log removed.
+
+    A delta log applies to the item file it was started for only, a log
+    left behind by a crash after saving the item whole is ignored.
+    """
+
+    def __init__(self, consolidate_every, sync=False, committer=None):
+        """
+        Args:
+            consolidate_every (int): deltas appended before the item is
+                saved whole
+            sync (bool): fsync delta logs on every append
+            committer (GroupCommitter): when given, appends share delta log
+                fsyncs through it
+        """
+        self._consolidate_every = consolidate_every
+        self._sync = sync
+        self._committer = committer
+        # filename -> (path -> encoded value) as last saved, and the number
+        # of deltas appended since saved whole
+        self._checkpoints = {}
+        self._lock = Lock()
+        self._stats = dict(deltas=0, consolidations=0, delta_bytes=0)
+
+    def save(self, item, filename, save_whole, dumps):
+        """ Save an item, appending its changes to its delta log when
+        possible
+
+        Args:
+            item (dict): item to save
+            filename (str): item file
+            save_whole (callable): save_whole() saves the item to its file
+            dumps (callable): encodes values and records, in the item's
+                format
+        """
+        encoded = _flatten(item, dumps)
+        with self._lock:
+            checkpoint = self._checkpoints.get(filename)
+            appended = checkpoint is not None and \
+                checkpoint[1] < self._consolidate_every and \
+                self._append(item, encoded, filename, checkpoint, dumps)
+            if not appended:
+                save_whole()
+                remove_deltas(filename)
+                self._checkpoints[filename] = (encoded, 0)
+                self._stats["consolidations"] += 1
+        if appended and self._committer is not None:
+            # outside the lock, for concurrent appends to share fsyncs
+            self._committer.commit(delta_filename(filename))
+
+    def discard(self, filename):
+        """ Forget an item and remove its delta log """
+        with self._lock:
+            self._checkpoints.pop(filename, None)
+            remove_deltas(filename)
+
+    def stats(self):
+        """ Counters of the deltas appended, their bytes and the items
+        saved whole
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _append(self, item, encoded, filename, checkpoint, dumps):
+        """ Append the changes of an item to its log, returns False when it
+        is to be saved whole instead
+        """
+        previous, deltas = checkpoint
+        changed = []
+        for path, value in encoded.items():
+            if path not in previous or previous[path] != value:
+                changed.append([list(path), {} if value is None else
+                                item[path[0]] if len(path) == 1 else
+                                item[path[0]][path[1]]])
+        removed = [list(path) for path in previous if path not in encoded]
+        record = dumps([changed, removed])
+        log_filename = delta_filename(filename)
+        try:
+            size = os.path.getsize(log_filename)
+        except FileNotFoundError:
+            size = 0
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return False
+        if size + len(record) > stat.st_size:
+            return False
+        data = _LENGTH.pack(len(record)) + record
+        if not size:
+            data = _HEADER.pack(stat.st_ino) + data
+        try:
+            with open(log_filename, "ab") as log:
+                log.write(data)
+                if self._sync and self._committer is None:
+                    log.flush()
+                    os.fsync(log.fileno())
+        except Exception:
+            # the log may end in a torn record, save whole next time
+            del self._checkpoints[filename]
+            raise
+        self._checkpoints[filename] = (encoded, deltas + 1)
+        self._stats["deltas"] += 1
+        self._stats["delta_bytes"] += len(data)
+        return True
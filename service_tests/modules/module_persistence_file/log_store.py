@@ -0,0 +1,260 @@
+import os
+import struct
+from threading import RLock
+
+from nio.util.logging import get_nio_logger
+from nio.util.threading import spawn
+
+# name of the log holding the items of a folder
+LOG_NAME = "items.log"
+# logs are not compacted until they hold this many bytes of stale records
+COMPACTION_MIN_BYTES = 64 * 1024
+
+# operation, format, id length and value length of a record
+_HEADER = struct.Struct("<BBHI")
+_PUT = 1
+_DELETE = 2
+
+
+def _record(operation, format, id, value=b""):
+    key = id.encode()
+    return _HEADER.pack(operation, format, len(key), len(value)) + key + value
+
+
+def _parse(data, base=0):
+    """ Parse the records in data, found at offset base of the log
+
+    Returns:
+        list of (operation, format, id, value offset, value length, record
+            length) tuples, and the length of data holding whole records
+    """
+    records = []
+    position = 0
+    while position + _HEADER.size <= len(data):
+        operation, format, key_length, value_length = \
+            _HEADER.unpack_from(data, position)
+        key_start = position + _HEADER.size
+        value_start = key_start + key_length
+        end = value_start + value_length
+        if end > len(data) or operation not in (_PUT, _DELETE):
+            break
+        records.append((operation, format,
+                        data[key_start:value_start].decode(),
+                        base + value_start, value_length, end - position))
+        position = end
+    return records, position
+
+
+class LogStore(object):
+
+    """ Items of a folder kept in a single append-only log file
+
+    Saving an item appends a record with its encoded value and removing it
+    appends a deletion record. An in-memory index maps each id to the
+    offset of its latest value, it is built by reading the log when the
+    store is opened; a record torn by a crash at the end of the log is
+    truncated away.
+
+    Once stale records take more room than the live ones, the log is
+    compacted in a background thread, rewriting the live records to a new
+    log that replaces the old one.
+    """
+
+    def __init__(self, filename, sync=False, committer=None):
+        """
+        Args:
+            filename (str): path of the log
+            sync (bool): fsync the log on every change
+            committer (GroupCommitter): when given, changes share log fsyncs
+                through it
+        """
+        self.logger = get_nio_logger("LogStore")
+        self._filename = filename
+        self._sync = sync
+        self._committer = committer
+        self._lock = RLock()
+        # id -> (value offset, value length, format, record length)
+        self._index = {}
+        self._size = 0
+        self._live = 0
+        self._stale = 0
+        self._compaction = None
+        # changes when the log is cleared, abandoning a compaction
+        self._generation = 0
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self._fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_APPEND)
+        self._load()
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, id):
+        """ Return the (format, value) of an item, None if not found """
+        with self._lock:
+            entry = self._index.get(id)
+            if entry is None:
+                return None
+            offset, length, format, _ = entry
+            return format, os.pread(self._fd, length, offset)
+
+    def items(self):
+        """ Return the (id, format, value) of every item """
+        with self._lock:
+            return [(id, format, os.pread(self._fd, length, offset))
+                    for id, (offset, length, format, _) in self._index.items()]
+
+    def put(self, id, format, value):
+        self.put_many([(id, format, value)])
+
+    def put_many(self, items):
+        """ Save (id, format, value) items with a single write """
+        records = [(id, format, _record(_PUT, format, id, value))
+                   for id, format, value in items]
+        with self._lock:
+            offset = self._append(b"".join(
+                record for _, _, record in records))
+            for id, format, record in records:
+                value_length = len(record) - (
+                    _HEADER.size + len(id.encode()))
+                self._set(id, (offset + len(record) - value_length,
+                               value_length, format, len(record)))
+                offset += len(record)
+            self._compact_if_needed()
+        self._commit()
+
+    def delete(self, id):
+        """ Remove an item, returns whether it was found """
+        with self._lock:
+            if id not in self._index:
+                return False
+            record = _record(_DELETE, 0, id)
+            self._append(record)
+            self._unset(id)
+            self._stale += len(record)
+            self._compact_if_needed()
+        self._commit()
+        return True
+
+    def clear(self):
+        """ Remove every item, emptying the log """
+        with self._lock:
+            os.ftruncate(self._fd, 0)
+            self._index.clear()
+            self._size = self._live = self._stale = 0
+            self._generation += 1
+        self._commit()
+
+    def close(self):
+        """ Wait for the compactions in progress and close the log """
+        compaction = self._compaction
+        while compaction is not None:
+            compaction.join()
+            compaction = self._compaction
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def stats(self):
+        with self._lock:
+            return dict(items=len(self._index), size=self._size,
+                        live=self._live, stale=self._stale)
+
+    def _load(self):
+        data = os.pread(self._fd, os.fstat(self._fd).st_size, 0)
+        records, length = _parse(data)
+        if length < len(data):
+            self.logger.warning(
+                "Truncating {} bytes torn at the end of {}".format(
+                    len(data) - length, self._filename))
+            os.ftruncate(self._fd, length)
+        self._size = length
+        self._apply(records)
+
+    def _apply(self, records):
+        for operation, format, id, offset, length, record_length in records:
+            if operation == _PUT:
+                self._set(id, (offset, length, format, record_length))
+            else:
+                self._unset(id)
+                self._stale += record_length
+
+    def _set(self, id, entry):
+        self._unset(id)
+        self._index[id] = entry
+        self._live += entry[3]
+
+    def _unset(self, id):
+        entry = self._index.pop(id, None)
+        if entry is not None:
+            self._live -= entry[3]
+            self._stale += entry[3]
+
+    def _append(self, data):
+        """ Append data to the log, returns the offset it was written at """
+        offset = self._size
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+        self._size += len(data)
+        return offset
+
+    def _commit(self):
+        if self._committer is not None:
+            self._committer.commit(self._filename)
+        elif self._sync:
+            with self._lock:
+                os.fsync(self._fd)
+
+    def _compact_if_needed(self):
+        if self._stale > max(self._live, COMPACTION_MIN_BYTES) and \
+                self._compaction is None:
+            self._compaction = spawn(self._compact)
+
+    def _compact(self):
+        """ Rewrite the live records to a new log replacing this one """
+        temp_filename = "{}.compact".format(self._filename)
+        try:
+            with self._lock:
+                generation = self._generation
+                index = dict(self._index)
+                end = self._size
+            # the log is append-only, records up to end stay in place
+            records = [_record(_PUT, format, id,
+                               os.pread(self._fd, length, offset))
+                       for id, (offset, length, format, _) in index.items()]
+            with open(temp_filename, "wb") as temp:
+                for record in records:
+                    temp.write(record)
+                with self._lock:
+                    if generation != self._generation:
+                        return
+                    # records appended while compacting
+                    tail = os.pread(self._fd, self._size - end, end)
+                    temp.write(tail)
+                    temp.flush()
+                    os.fsync(temp.fileno())
+                    data = b"".join(records)
+                    compacted, _ = _parse(data)
+                    appended, _ = _parse(tail, len(data))
+                    os.replace(temp_filename, self._filename)
+                    fd = os.open(self._filename, os.O_RDWR | os.O_APPEND)
+                    os.close(self._fd)
+                    self._fd = fd
+                    self._index.clear()
+                    self._size = len(data) + len(tail)
+                    self._live = self._stale = 0
+                    self._apply(compacted)
+                    self._apply(appended)
+        except Exception:
+            self.logger.exception(
+                "Failed to compact {}".format(self._filename))
+        finally:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            with self._lock:
+                self._compaction = None
+                # records appended while compacting may call for another
+                if self._fd is not None:
+                    self._compact_if_needed()
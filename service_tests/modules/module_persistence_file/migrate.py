@@ -0,0 +1,67 @@
+import os
+import sys
+
+from nio.util.codec import load_json, load_pickle
+
+from .codec import dumps_binary, dumps_json, dumps_pickle, load_binary, \
+    loads_binary, loads_json, loads_pickle
+from .delta import load_deltas, remove_deltas
+from .log_store import LOG_NAME, LogStore
+from .persistence import Persistence
+
+# extension -> format, load and dumps of item files, and loads of their
+# delta logs
+_FILES = {
+    ".dat": (Persistence.Format.pickle.value, load_pickle, dumps_pickle,
+             loads_pickle),
+    ".cfg": (Persistence.Format.json.value, load_json, dumps_json,
+             loads_json),
+    ".bin": (Persistence.Format.binary.value, load_binary, dumps_binary,
+             loads_binary),
+}
+
+
+def migrate_to_log(root_folder):
+    """ Move the item files under a folder to the logs of their folders
+
+    Items already in a log are overwritten by their files, with the
+    changes of their delta logs applied. Each file and its delta log are
+    removed once its folder's log holds it, so that an interrupted
+    migration can be run again.
+
+    Args:
+        root_folder (str): persistence folder to migrate
+
+    Returns:
+        int: number of items migrated
+    """
+    migrated = 0
+    for folder, _, filenames in os.walk(root_folder):
+        items = []
+        for filename in filenames:
+            id, extension = os.path.splitext(filename)
+            # temporary files start with a dot
+            if extension not in _FILES or filename.startswith("."):
+                continue
+            format, load, dumps, loads = _FILES[extension]
+            path = os.path.join(folder, filename)
+            item = load_deltas(path, load(path), loads)
+            items.append((path, id, format, dumps(item)))
+        if not items:
+            continue
+        store = LogStore(os.path.join(folder, LOG_NAME), sync=True)
+        try:
+            store.put_many([item[1:] for item in items])
+        finally:
+            store.close()
+        for path, *_ in items:
+            os.remove(path)
+            remove_deltas(path)
+        migrated += len(items)
+    return migrated
+
+
+if __name__ == "__main__":
+    # python -m service_tests.modules.module_persistence_file.migrate FOLDER
+    for folder in sys.argv[1:]:
+        print("{}: {} items migrated".format(folder, migrate_to_log(folder)))
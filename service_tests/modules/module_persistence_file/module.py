@@ -5,6 +5,7 @@ from nio.modules.settings import Settings
 from nio import discoverable
 
 from . import Persistence
+from .atomic import CommitMode
 
 
 @discoverable
@@ -17,6 +18,8 @@ class FilePersistenceModule(PersistenceModule):
         self.proxy_persistence_class(Persistence)
 
     def finalize(self):
+        # write the items left in the cache
+        Persistence.finalize()
         super().finalize()
 
     def prepare_core_context(self):
@@ -29,6 +32,12 @@ class FilePersistenceModule(PersistenceModule):
             'persistence', 'configuration_data', fallback="etc"))
         # save/load files as json
         context.format = Persistence.Format.json.value
+        # snapshot of the 'blocks' and 'services' collections, used while
+        # none of their files changed, see snapshot.build_snapshot
+        snapshot = Settings.get(
+            'persistence', 'configuration_snapshot', fallback='')
+        context.snapshot = os.path.join(context.root_folder, snapshot) \
+            if snapshot else None
         return context
 
     def prepare_service_context(self, service_context=None):
@@ -41,4 +50,25 @@ class FilePersistenceModule(PersistenceModule):
             'persistence', 'data', fallback='etc/persist'))
         # save/load block persisted files as pickle
         context.format = Persistence.Format.pickle.value
+        # number of items to cache in memory, 0 disables caching
+        context.cache_size = Settings.getint(
+            'persistence', 'cache_size', fallback=0)
+        # seconds between writes of the cached items, when 0 they are
+        # written when evicted from the cache and on shutdown
+        context.cache_flush_interval = Settings.getfloat(
+            'persistence', 'cache_flush_interval', fallback=0) or None
+        # how block persisted files are made durable
+        context.commit_mode = CommitMode[Settings.get(
+            'persistence', 'commit_mode', fallback='atomic')]
+        # seconds a group commit waits for more saves to share its fsyncs
+        context.commit_window = Settings.getfloat(
+            'persistence', 'commit_window', fallback=0)
+        # changes of block persisted items appended between saving them
+        # whole, 0 saves them whole every time
+        context.delta_saves = Settings.getint(
+            'persistence', 'delta_saves', fallback=0)
+        # whether block persisted items are kept a file per item or in a
+        # log per folder
+        context.backend = Persistence.Backend[Settings.get(
+            'persistence', 'backend', fallback='files')]
         return context
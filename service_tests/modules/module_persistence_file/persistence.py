@@ -1,9 +1,24 @@
+import copy
 import os
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from threading import Lock
 
 from nio.util.codec import load_pickle, load_json, save_pickle, save_json
 from nio.util.logging import get_nio_logger
 
+from .atomic import CommitMode, GroupCommitter, save_atomically
+from .cache import WriteBackCache
+from .codec import dumps_binary, dumps_json, dumps_pickle, load_binary, \
+    loads_binary, loads_json, loads_pickle, save_binary
+from .delta import DeltaLog, delta_filename, load_deltas, remove_deltas
+from .log_store import LOG_NAME, LogStore
+from .snapshot import open_snapshot
+
+# collections with more files to parse than this are parsed in parallel
+PARALLEL_PARSE_MIN = 16
+PARSE_WORKERS = min(8, os.cpu_count() or 1)
+
 
 class Persistence(object):
 
@@ -21,15 +36,63 @@ class Persistence(object):
     When item does not belong to a collection, its filename will be then:
     [root_folder]/[root_id]_[id] if root_id is not empty, otherwise:
     [root_folder]/[id]
+
+    When configured with a cache size, items go through a write-back LRU
+    cache, saved items reach the disk every cache flush interval, when
+    evicted from the cache and when the module is finalized.
+
+    Files are saved through a temporary file renamed over them, so that a
+    crash never leaves a partially written file, and made durable as the
+    configured commit mode specifies. When configured with delta saves,
+    dict items are saved as the keys changed since their last save, see
+    DeltaLog.
+
+    Collections are loaded parsing their files over a thread pool. Parsed
+    files are cached process-wide by path, modification time and size, so
+    that unchanged files are never parsed again; their items are shared,
+    load_collection returns shallow copies of them.
+
+    Items are loaded in the format of their file, found by extension, so
+    that items saved before the format was changed can still be loaded;
+    items in the configured format take precedence.
+
+    When configured with a snapshot built by snapshot.build_snapshot,
+    collections are served from it, decoded on access, as long as none of
+    their files changed since it was built.
+
+    With the log backend, the items of each folder are kept in a single
+    append-only log file instead, see LogStore. Items keep the same ids and
+    collections, and the commit mode applies to the log.
     """
 
     class Format(Enum):
         pickle = 1
         json = 2
+        # MessagePack, see codec
+        binary = 3
+
+    class Backend(Enum):
+        # a file per item
+        files = 1
+        # a log per folder, holding its items
+        log = 2
 
     _root_id = ''
     _root_folder = None
     _format = Format.pickle
+    _cache = None
+    _commit_mode = CommitMode.atomic
+    _committer = None
+    _backend = Backend.files
+    # log filename -> LogStore
+    _stores = {}
+    _stores_lock = Lock()
+    # path -> ((mtime, size, inode), item) of the files parsed
+    _parsed = {}
+    _parsed_lock = Lock()
+    _parse_pool = None
+    _snapshot = None
+    _deltas = None
 
     def __init__(self):
         """ Constructor for the Persistence module
@@ -46,6 +109,8 @@ class Persistence(object):
         implementation is proxied, since it makes use of cls which will always
         be the implementation.
         """
+        # items cached or logged are written as configured before
+        cls.finalize()
         cls._root_id = context.root_id
         cls._root_folder = context.root_folder
         try:
@@ -54,6 +119,53 @@ class Persistence(object):
             # If the persistence target directory already exists, move on
             pass
         cls._format = context.format
+        cls._commit_mode = getattr(context, "commit_mode", CommitMode.atomic)
+        cls._committer = GroupCommitter(
+            getattr(context, "commit_window", 0)) \
+            if cls._commit_mode is CommitMode.group else None
+        cls._backend = getattr(context, "backend", Persistence.Backend.files)
+        delta_saves = getattr(context, "delta_saves", 0)
+        cls._deltas = DeltaLog(
+            delta_saves, cls._commit_mode is not CommitMode.atomic,
+            cls._committer) if delta_saves else None
+        snapshot = getattr(context, "snapshot", None)
+        if snapshot and os.path.isfile(snapshot):
+            cls._snapshot = open_snapshot(
+                snapshot, cls._root_folder, _EXTENSIONS[cls._format])
+        cache_size = getattr(context, "cache_size", 0)
+        if cache_size:
+            persistence = cls()
+            cls._cache = WriteBackCache(
+                cache_size, persistence._load_file, persistence._save_file,
+                persistence._remove_file,
+                getattr(context, "cache_flush_interval", None))
+            cls._cache.start()
+
+    @classmethod
+    def finalize(cls):
+        """ Write the items saved to the cache, stop caching, close the
+        logs and drop the snapshot
+        """
+        if cls._cache is not None:
+            cls._cache.stop()
+            cls._cache = None
+        with cls._stores_lock:
+            for store in cls._stores.values():
+                store.close()
+            cls._stores.clear()
+        # shared with the next configure while unchanged
+        cls._snapshot = None
+
+    @classmethod
+    def cache_stats(cls):
+        """ Counters of the cache, None when not caching
+
+        Returns:
+            dict: cache hits, misses, items written to disk and evicted,
+                along with the number of items cached and dirty
+        """
+        if cls._cache is not None:
+            return cls._cache.stats()
 
     def load(self, id, collection=None, default=None):
         """ Load an item from the persistence store.
@@ -69,10 +181,10 @@ class Persistence(object):
         """
         if collection is not None:
             filename = self._get_collection_item_filename(id, collection)
-            return self._load_file(filename) or default
+            return self._load_cached(filename) or default
         else:
             filename = self._get_item_filename(id)
-            return self._load_file(filename) or default
+            return self._load_cached(filename) or default
 
     def load_collection(self, collection, default=None):
         """ Load a collection from the persistence store.
@@ -86,14 +198,20 @@ class Persistence(object):
         """
         result = {}
         collection_folder = self._get_collection_folder(collection)
-        extension = self._get_file_extension()
-        if os.path.isdir(collection_folder):
-            for filename in os.listdir(collection_folder):
-                if os.path.splitext(filename)[1] != extension:
-                    continue
-                name = os.path.splitext(os.path.basename(filename))[0]
-                result[name] = self._load_file(
-                    os.path.join(collection_folder, filename))
+        if self._cache is not None:
+            self._cache.flush(os.path.join(collection_folder, ""))
+        if self._snapshot is not None:
+            snapshot = self._snapshot.collection(
+                os.path.relpath(collection_folder, self._root_folder))
+            if snapshot is not None:
+                return snapshot or default
+        if self._backend is Persistence.Backend.log:
+            store = self._get_store(collection_folder)
+            if store is not None:
+                for id, format, value in store.items():
+                    result[id] = _CODECS[format][1](value)
+        elif os.path.isdir(collection_folder):
+            result = self._load_files(collection_folder)
         return result or default
 
     def save(self, item, id, collection=None):
@@ -107,10 +225,10 @@ class Persistence(object):
         """
         if collection is not None:
             filename = self._get_collection_item_filename(id, collection, True)
-            self._save_file(item, filename)
+            self._save_cached(item, filename)
         else:
             filename = self._get_item_filename(id)
-            self._save_file(item, filename)
+            self._save_cached(item, filename)
 
     def save_collection(self, items, collection):
         """ Save a collection to the persistence store.
@@ -120,11 +238,18 @@ class Persistence(object):
             collection (str): Specifies the collection to save
         """
         collection_folder = self._get_collection_folder(collection, True)
+        if self._backend is Persistence.Backend.log and self._cache is None:
+            # appended to the collection's log with a single write
+            dumps = _CODECS[self._format][0]
+            self._get_store(collection_folder, True).put_many(
+                [(id, self._format, dumps(item))
+                 for id, item in items.items()])
+            return
         for id, item in items.items():
             filename = \
                 os.path.join(collection_folder,
                              "{}{}".format(id, self._get_file_extension()))
-            self._save_file(item, filename)
+            self._save_cached(item, filename)
 
     def remove(self, id, collection=None):
         """ Remove an item from the persistence store.
@@ -136,12 +261,12 @@ class Persistence(object):
         """
         if collection is not None:
             filename = self._get_collection_item_filename(id, collection)
-            if os.path.isfile(filename):
-                os.remove(filename)
         else:
             filename = self._get_item_filename(id)
-            if os.path.isfile(filename):
-                os.remove(filename)
+        if self._cache is not None:
+            self._cache.remove(filename)
+        else:
+            self._remove_file(filename)
 
     def remove_collection(self, collection):
         """ Remove a collection from the persistence store.
@@ -150,12 +275,17 @@ class Persistence(object):
             collection (str): Specifies the collection to remove
         """
         collection_folder = self._get_collection_folder(collection)
-        if os.path.isdir(collection_folder):
-            extension = self._get_file_extension()
+        if self._cache is not None:
+            self._cache.discard(os.path.join(collection_folder, ""))
+        if self._backend is Persistence.Backend.log:
+            store = self._get_store(collection_folder)
+            if store is not None:
+                store.clear()
+        elif os.path.isdir(collection_folder):
             for filename in os.listdir(collection_folder):
-                if os.path.splitext(filename)[1] != extension:
+                if os.path.splitext(filename)[1] not in _FORMATS:
                     continue
-                os.remove(os.path.join(collection_folder, filename))
+                self._remove_file(os.path.join(collection_folder, filename))
 
     def _get_collection_folder(self, collection, ensure_dirs=False):
         """ Find out folder location for given collection
@@ -213,10 +343,122 @@ class Persistence(object):
                             "{}{}".format(filename, self._get_file_extension()))
 
     def _get_file_extension(self):
-        if self._format == Persistence.Format.pickle.value:
-            return ".dat"
+        return _EXTENSIONS[self._format]
+
+    def _find_file(self, filename):
+        """ File an item is saved to, in any format
+
+        Args:
+            filename (str): filename of the item in the configured format
+
+        Returns:
+            Filename of the item, None if it does not exist
+        """
+        if os.path.isfile(filename):
+            return filename
+        base = os.path.splitext(filename)[0]
+        for extension in _FORMATS:
+            if os.path.isfile(base + extension):
+                return base + extension
+
+    def _get_store(self, folder, create=False):
+        """ Log of the items of a folder
+
+        Args:
+            folder (str): folder the item files would be in
+            create (bool): if True, the log is created if it does not exist
+
+        Returns:
+            LogStore, None when the log does not exist and create is False
+        """
+        filename = os.path.join(folder, LOG_NAME)
+        with self._stores_lock:
+            store = self._stores.get(filename)
+            if store is None and (create or os.path.isfile(filename)):
+                store = self._stores[filename] = LogStore(
+                    filename, self._commit_mode is not CommitMode.atomic,
+                    self._committer)
+            return store
+
+    def _get_record(self, filename, create=False):
+        """ Log and id an item filename maps to with the log backend """
+        folder, basename = os.path.split(filename)
+        return (self._get_store(folder, create),
+                os.path.splitext(basename)[0])
+
+    def _load_files(self, folder):
+        """ Load the item files of a folder, parsing the changed ones
+
+        Args:
+            folder (str): folder to load
+
+        Returns:
+            dict: id -> item, copied from the parse cache
+        """
+        own_extension = self._get_file_extension()
+        files = {}
+        # delta log -> (mtime, size), changing an item as much as its file
+        deltas = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                name, extension = os.path.splitext(entry.name)
+                if extension == ".delta" and entry.name.startswith("."):
+                    stat = entry.stat()
+                    deltas[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                if extension not in _FORMATS or entry.name.startswith(".") \
+                        or name in files and extension != own_extension:
+                    continue
+                stat = entry.stat()
+                files[name] = (entry.path,
+                               (stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        items = {}
+        changed = []
+        with self._parsed_lock:
+            for name, (path, key) in files.items():
+                key += deltas.get(
+                    os.path.basename(delta_filename(path)), ())
+                parsed = self._parsed.get(path)
+                if parsed is not None and parsed[0] == key:
+                    items[name] = parsed[1]
+                else:
+                    changed.append((name, path, key))
+        paths = [path for _, path, _ in changed]
+        if len(changed) > PARALLEL_PARSE_MIN:
+            # a chunk of files per worker, tasks cost more than parsing
+            chunk = -(-len(paths) // PARSE_WORKERS)
+            loaded = [item for items in self._get_parse_pool().map(
+                lambda start: [self._load_file(path)
+                               for path in paths[start:start + chunk]],
+                range(0, len(paths), chunk)) for item in items]
+        else:
+            loaded = map(self._load_file, paths)
+        with self._parsed_lock:
+            for (name, path, key), item in zip(changed, loaded):
+                items[name] = item
+                if item is not None:
+                    self._parsed[path] = (key, item)
+        # callers get their own items, the cached ones are never changed
+        return {name: copy.deepcopy(item) for name, item in items.items()}
+
+    @classmethod
+    def _get_parse_pool(cls):
+        with cls._parsed_lock:
+            if Persistence._parse_pool is None:
+                # process-wide, its threads are joined on exit
+                Persistence._parse_pool = ThreadPoolExecutor(
+                    PARSE_WORKERS, thread_name_prefix="persistence-parse")
+            return Persistence._parse_pool
+
+    def _load_cached(self, filename):
+        if self._cache is not None:
+            return self._cache.get(filename)
+        return self._load_file(filename)
+
+    def _save_cached(self, item, filename):
+        if self._cache is not None:
+            self._cache.put(item, filename)
         else:
-            return ".cfg"
+            self._save_file(item, filename)
 
     def _load_file(self, filename):
         """ Load a file into a dictionary
@@ -229,10 +471,24 @@ class Persistence(object):
                 message will be logged and an empty dict is returned.
         """
         try:
-            if self._format == Persistence.Format.pickle.value:
-                return load_pickle(filename)
+            if self._backend is Persistence.Backend.log:
+                store, id = self._get_record(filename)
+                record = store.get(id) if store is not None else None
+                if record is not None:
+                    format, value = record
+                    return _CODECS[format][1](value)
             else:
-                return load_json(filename)
+                path = self._find_file(filename)
+                if path is None:
+                    return {}
+                format = _FORMATS[os.path.splitext(path)[1]]
+                if format == Persistence.Format.pickle.value:
+                    item = load_pickle(path)
+                elif format == Persistence.Format.json.value:
+                    item = load_json(path)
+                else:
+                    item = load_binary(path)
+                return load_deltas(path, item, _CODECS[format][1])
         except Exception:  # pragma: no cover
             self.logger.exception(
                 "Failed to parse {} file {}".format(self._format, filename))
@@ -246,11 +502,58 @@ class Persistence(object):
             item (dict): item information to save
             filename (str): Absolute path to filename
         """
+        if self._format == Persistence.Format.pickle.value:
+            save = save_pickle
+        elif self._format == Persistence.Format.json.value:
+            save = save_json
+        else:
+            save = save_binary
         try:
-            if self._format == Persistence.Format.pickle.value:
-                save_pickle(filename, item)
+            if self._backend is Persistence.Backend.log:
+                store, id = self._get_record(filename, True)
+                store.put(id, self._format, _CODECS[self._format][0](item))
             else:
-                save_json(filename, item)
+                def save_whole():
+                    save_atomically(filename, lambda path: save(path, item),
+                                    self._commit_mode, self._committer)
+                if self._deltas is not None and isinstance(item, dict):
+                    self._deltas.save(item, filename, save_whole,
+                                      _CODECS[self._format][0])
+                else:
+                    save_whole()
         except Exception:  # pragma: no cover
             self.logger.exception(
                 "Failed to save {} file {}".format(self._format, filename))
+
+    def _remove_file(self, filename):
+        if self._backend is Persistence.Backend.log:
+            store, id = self._get_record(filename)
+            if store is not None:
+                store.delete(id)
+        else:
+            # in every format, as it is loaded in any
+            path = self._find_file(filename)
+            while path is not None:
+                with self._parsed_lock:
+                    self._parsed.pop(path, None)
+                if self._deltas is not None:
+                    self._deltas.discard(path)
+                else:
+                    remove_deltas(path)
+                os.remove(path)
+                path = self._find_file(filename)
+
+
+# format -> extension of item files
+_EXTENSIONS = {
+    Persistence.Format.pickle.value: ".dat",
+    Persistence.Format.json.value: ".cfg",
+    Persistence.Format.binary.value: ".bin",
+}
+_FORMATS = {extension: format for format, extension in _EXTENSIONS.items()}
+# format -> (dumps, loads) of the values kept in logs
+_CODECS = {
+    Persistence.Format.pickle.value: (dumps_pickle, loads_pickle),
+    Persistence.Format.json.value: (dumps_json, loads_json),
+    Persistence.Format.binary.value: (dumps_binary, loads_binary),
+}
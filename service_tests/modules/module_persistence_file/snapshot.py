@@ -0,0 +1,261 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from threading import Lock
+
+from nio.util.logging import get_nio_logger
+
+from .atomic import save_atomically
+from .codec import loads_binary, loads_json, loads_pickle
+
+# name of the snapshot built in a root folder
+SNAPSHOT_NAME = "configuration.snapshot"
+# collections the core persistence loads on startup
+COLLECTIONS = ("blocks", "services")
+
+_MAGIC = b"NIOSNAP1"
+# magic and length of the index
+_HEADER = struct.Struct("<8sI")
+# extension -> format and loads of item files, see Persistence.Format
+_FORMATS = {
+    ".dat": (1, loads_pickle),
+    ".cfg": (2, loads_json),
+    ".bin": (3, loads_binary),
+}
+_LOADS = {format: loads for format, loads in _FORMATS.values()}
+# (filename, root folder, extension) -> ((mtime, size, inode), snapshot)
+_opened = {}
+_opened_lock = Lock()
+
+
+def _scan(folder, extension):
+    """ Item files of a folder, in the format of extension first
+
+    Returns:
+        dict: id -> (filename, mtime, size)
+    """
+    files = {}
+    if not os.path.isdir(folder):
+        return files
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            id, entry_extension = os.path.splitext(entry.name)
+            if entry_extension not in _FORMATS or \
+                    entry.name.startswith(".") or \
+                    id in files and entry_extension != extension:
+                continue
+            stat = entry.stat()
+            files[id] = (entry.name, stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def build_snapshot(root_folder, collections=COLLECTIONS, extension=".cfg",
+                   filename=None):
+    """ Compile the collections of a folder into a snapshot file
+
+    The snapshot keeps the contents of every item file along with its
+    modification time and size, it is written atomically.
+
+    Args:
+        root_folder (str): persistence folder holding the collections
+        collections (list): collections to compile
+        extension (str): extension of the files taking precedence when an
+            item has several
+        filename (str): snapshot file, SNAPSHOT_NAME in root_folder by
+            default
+
+    Returns:
+        int: number of items compiled
+    """
+    filename = filename or os.path.join(root_folder, SNAPSHOT_NAME)
+    index = {}
+    chunks = []
+    offset = 0
+    for collection in collections:
+        files = _scan(os.path.join(root_folder, collection), extension)
+        items = {}
+        for id, (name, _, _) in files.items():
+            with open(os.path.join(root_folder, collection, name), "rb") as f:
+                data = f.read()
+            items[id] = (offset, len(data),
+                         _FORMATS[os.path.splitext(name)[1]][0])
+            chunks.append(data)
+            offset += len(data)
+        index[collection] = {"files": files, "items": items}
+    index = json.dumps(index, separators=(",", ":")).encode()
+
+    def write(path):
+        with open(path, "wb") as snapshot:
+            snapshot.write(_HEADER.pack(_MAGIC, len(index)))
+            snapshot.write(index)
+            for chunk in chunks:
+                snapshot.write(chunk)
+
+    save_atomically(filename, write)
+    return len(chunks)
+
+
+def open_snapshot(filename, root_folder, extension=".cfg"):
+    """ ConfigSnapshot of a file, shared while the file is unchanged """
+    stat = os.stat(filename)
+    key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    with _opened_lock:
+        opened = _opened.get((filename, root_folder, extension))
+        if opened is None or opened[0] != key:
+            opened = _opened[(filename, root_folder, extension)] = \
+                (key, ConfigSnapshot(filename, root_folder, extension))
+        return opened[1]
+
+
+class ConfigSnapshot(object):
+
+    """ Read-only view of the collections compiled by build_snapshot
+
+    The snapshot file is memory-mapped, processes on the same host share
+    its pages, and items are decoded when accessed. A collection is only
+    served while none of its files changed since the snapshot was built.
+    The file is unmapped once the snapshot and its collections are gone.
+    """
+
+    def __init__(self, filename, root_folder, extension=".cfg"):
+        """
+        Args:
+            filename (str): snapshot file
+            root_folder (str): folder the snapshot was built from
+            extension (str): extension of the files taking precedence
+        """
+        self.logger = get_nio_logger("ConfigSnapshot")
+        self._root_folder = root_folder
+        self._extension = extension
+        with open(filename, "rb") as snapshot:
+            self._map = mmap.mmap(snapshot.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, length = _HEADER.unpack_from(self._map) \
+            if len(self._map) >= _HEADER.size else (None, 0)
+        if magic != _MAGIC:
+            self._map.close()
+            raise ValueError("{} is not a snapshot".format(filename))
+        self._index = json.loads(
+            self._map[_HEADER.size:_HEADER.size + length].decode())
+        self._data = _HEADER.size + length
+
+    def collection(self, collection):
+        """ Items of a collection, None if not compiled or stale
+
+        Returns:
+            SnapshotCollection: dict of id -> item
+        """
+        entry = self._index.get(collection)
+        if entry is None:
+            return None
+        files = _scan(os.path.join(self._root_folder, collection),
+                      self._extension)
+        if files != {id: tuple(file) for id, file in entry["files"].items()}:
+            self.logger.warning(
+                "Snapshot of {} is stale, loading its files".format(
+                    collection))
+            return None
+        return SnapshotCollection(self, entry["items"])
+
+    def _decode(self, offset, length, format):
+        start = self._data + offset
+        return _LOADS[format](self._map[start:start + length])
+
+
+class _Encoded(object):
+
+    """ Item of a snapshot collection not decoded yet """
+
+    __slots__ = ("offset", "length", "format")
+
+    def __init__(self, offset, length, format):
+        self.offset = offset
+        self.length = length
+        self.format = format
+
+
+class SnapshotCollection(dict):
+
+    """ Items of a collection in a snapshot, decoded on first access
+
+    A dict of its own per load, changing it or its items changes neither
+    the snapshot nor the items other loads get. Items are decoded when
+    accessed, all of them when the collection is compared, copied or its
+    items or values are listed.
+    """
+
+    def __init__(self, snapshot, items):
+        super().__init__((id, _Encoded(*item)) for id, item in items.items())
+        self._snapshot = snapshot
+
+    def __getitem__(self, id):
+        item = super().__getitem__(id)
+        if type(item) is _Encoded:
+            item = self._snapshot._decode(
+                item.offset, item.length, item.format)
+            super().__setitem__(id, item)
+        return item
+
+    def __iter__(self):
+        # defined for dict(collection) to copy it through __getitem__
+        return super().__iter__()
+
+    def __eq__(self, other):
+        self._decode_all()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        self._decode_all()
+        return super().__ne__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._decode_all()
+        return super().__repr__()
+
+    def __reduce_ex__(self, protocol):
+        # copied and pickled as a dict, without the snapshot
+        return dict, (dict(self.items()),)
+
+    def get(self, id, default=None):
+        return self[id] if id in self else default
+
+    def setdefault(self, id, default=None):
+        if id in self:
+            return self[id]
+        self[id] = default
+        return default
+
+    def pop(self, id, *default):
+        if id in self:
+            self[id]
+        return super().pop(id, *default)
+
+    def popitem(self):
+        self._decode_all()
+        return super().popitem()
+
+    def copy(self):
+        return dict(self.items())
+
+    def items(self):
+        self._decode_all()
+        return super().items()
+
+    def values(self):
+        self._decode_all()
+        return super().values()
+
+    def _decode_all(self):
+        for id in list(super().__iter__()):
+            self[id]
+
+
+if __name__ == "__main__":
+    # python -m service_tests.modules.module_persistence_file.snapshot etc
+    for root_folder in sys.argv[1:]:
+        print("{}: {} items compiled".format(
+            root_folder, build_snapshot(root_folder)))
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from threading import Thread
+
+from nio.testing import NIOTestCase
+
+from ..atomic import CommitMode, GroupCommitter, save_atomically
+
+
+def _write(contents):
+    def save(path):
+        with open(path, "w") as file:
+            file.write(contents)
+    return save
+
+
+class TestAtomicWrites(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "item.cfg")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def _read(self):
+        with open(self.filename) as file:
+            return file.read()
+
+    def test_modes(self):
+        """ Every mode replaces the file and leaves no temporary file """
+        committer = GroupCommitter()
+        for mode in CommitMode:
+            save_atomically(self.filename, _write(mode.name), mode, committer)
+            self.assertEqual(self._read(), mode.name)
+        self.assertEqual(os.listdir(self.directory), ["item.cfg"])
+
+    def test_failed_save_keeps_file(self):
+        """ A save failing midway leaves the previous file in place """
+        save_atomically(self.filename, _write("previous"))
+
+        def _fail(path):
+            _write("partial")(path)
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            save_atomically(self.filename, _fail)
+        self.assertEqual(self._read(), "previous")
+        self.assertEqual(os.listdir(self.directory), ["item.cfg"])
+
+    def test_group_commit(self):
+        """ Concurrent saves share directory fsyncs """
+        committer = GroupCommitter(0.01)
+        threads = [Thread(target=save_atomically, args=(
+            os.path.join(self.directory, "{}.cfg".format(index)),
+            _write(str(index)), CommitMode.group, committer))
+            for index in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = committer.stats()
+        self.assertEqual(stats["saves"], 20)
+        self.assertLess(stats["syncs"], 20)
+        self.assertEqual(len(os.listdir(self.directory)), 20)
@@ -0,0 +1,125 @@
+import os
+import shutil
+
+from nio.modules.persistence import Persistence
+
+from ..codec import loads_pickle
+from ..delta import delta_filename
+from ..log_store import LOG_NAME, LogStore
+from ..migrate import migrate_to_log
+from ..persistence import Persistence as PersistenceModule
+from . import test_file_persistence
+
+
+class TestDeltaSaves(test_file_persistence.TestFilePersistence):
+
+    def get_context(self, module_name, module):
+        context = super().get_context(module_name, module)
+        if module_name == "persistence":
+            context.delta_saves = 3
+        return context
+
+    def setUp(self):
+        super().setUp()
+        self.persistence = Persistence()
+        self.filename = os.path.join(self.cfg_dir, "states", "block.dat")
+        self.state = {"group_{}".format(index): index for index in range(50)}
+        self.persistence.save(self.state, "block", "states")
+
+    def _save(self, **changes):
+        self.state.update(changes)
+        self.persistence.save(self.state, "block", "states")
+
+    def test_changes_appended(self):
+        """ Saves append the keys changed, the item file is left as is """
+        inode = os.stat(self.filename).st_ino
+        self._save(group_1="changed")
+        del self.state["group_2"]
+        self._save()
+        self.assertEqual(os.stat(self.filename).st_ino, inode)
+        self.assertTrue(os.path.isfile(delta_filename(self.filename)))
+        self.assertEqual(self.persistence.load("block", "states"),
+                         self.state)
+        self.assertEqual(
+            self.persistence.load_collection("states")["block"], self.state)
+        stats = Persistence._deltas.stats()
+        self.assertEqual(stats["deltas"], 2)
+        self.assertEqual(stats["consolidations"], 1)
+        self.assertLess(stats["delta_bytes"],
+                        os.path.getsize(self.filename) / 4)
+
+    def test_consolidation(self):
+        """ The item is saved whole again after consolidate_every deltas """
+        inode = os.stat(self.filename).st_ino
+        for value in range(4):
+            self._save(group_1=value)
+        self.assertNotEqual(os.stat(self.filename).st_ino, inode)
+        self.assertFalse(os.path.isfile(delta_filename(self.filename)))
+        self.assertEqual(self.persistence.load("block", "states"),
+                         self.state)
+
+    def test_restart(self):
+        """ Changes are loaded after a restart, which saves whole first """
+        self._save(group_1="changed")
+        PersistenceModule.configure(self.get_context("persistence", None))
+        self.assertEqual(self.persistence.load("block", "states"),
+                         self.state)
+        Persistence._deltas = PersistenceModule._deltas
+        self._save(group_1="again")
+        self.assertFalse(os.path.isfile(delta_filename(self.filename)))
+        self.assertEqual(self.persistence.load("block", "states"),
+                         self.state)
+
+    def test_stale_and_torn_logs(self):
+        """ Logs of a previous item file and torn records are ignored """
+        self._save(group_1="one")
+        self._save(group_2="two")
+        log = delta_filename(self.filename)
+        with open(log, "r+b") as file:
+            file.truncate(os.path.getsize(log) - 1)
+        self.assertEqual(self.persistence.load("block", "states")["group_2"],
+                         2)
+        shutil.copy(log, log + ".old")
+        self._save()
+        self._save()
+        os.replace(log + ".old", log)
+        self.assertEqual(self.persistence.load("block", "states"),
+                         self.state)
+
+    def test_remove(self):
+        self._save(group_1="changed")
+        self.persistence.remove("block", "states")
+        self.assertEqual(os.listdir(os.path.dirname(self.filename)), [])
+
+    def test_groups(self):
+        """ Groups of a state kept in a dict are saved by group """
+        self.state = {"_states": {"group_{}".format(index): [index]
+                                  for index in range(50)},
+                      "_backup": None}
+        self._save()
+        size = Persistence._deltas.stats()["delta_bytes"]
+        self.state["_states"]["group_1"] = ["changed"]
+        del self.state["_states"]["group_2"]
+        self._save()
+        self.assertLess(Persistence._deltas.stats()["delta_bytes"] - size,
+                        100)
+        self._save(_backup={"now": "a dict"})
+        self.assertEqual(self.persistence.load("block", "states"),
+                         self.state)
+        self._save(_states="no groups")
+        self.assertEqual(self.persistence.load("block", "states"),
+                         self.state)
+
+    def test_migrate_to_log(self):
+        """ Changes pending in delta logs are migrated with their items """
+        self._save(group_1="changed")
+        del self.state["group_2"]
+        self._save()
+        self.assertEqual(migrate_to_log(self.cfg_dir), 1)
+        folder = os.path.dirname(self.filename)
+        self.assertEqual(os.listdir(folder), [LOG_NAME])
+        store = LogStore(os.path.join(folder, LOG_NAME))
+        format, value = store.get("block")
+        store.close()
+        self.assertEqual(format, PersistenceModule.Format.pickle.value)
+        self.assertEqual(loads_pickle(value), self.state)
@@ -1,5 +1,6 @@
 import os
 import shutil
+import tempfile
 
 from nio.testing import NIOTestCase
 from nio.modules.persistence import Persistence
@@ -11,14 +12,9 @@ from ..module import FilePersistenceModule
 
 class TestFilePersistence(NIOTestCase):
 
-    cfg_dir = "{}/{}/".format(os.path.dirname(__file__), "persist_test")
-
     def setUp(self):
-        try:
-            os.mkdir(self.cfg_dir)
-        except FileExistsError:  # pragma: no cover
-            # No problem, the directory already exists
-            pass
+        # a folder per test, tests running in parallel never share files
+        self.cfg_dir = tempfile.mkdtemp()
 
         # set up here after doing all of the file stuff
         # this will proxy the modules and set them up
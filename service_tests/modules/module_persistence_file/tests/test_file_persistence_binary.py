@@ -0,0 +1,72 @@
+import os
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from unittest.mock import patch
+
+from nio.modules.persistence import Persistence
+from nio.testing import NIOTestCase
+
+from .. import codec
+from ..persistence import Persistence as PersistenceModule
+from . import test_file_persistence
+
+ITEM = {
+    "none": None, "flags": [True, False],
+    "ints": [0, -1, 300, -70000, 2 ** 40, 2 ** 70],
+    "float": 1.25, "text": "é" * 40, "bytes": b"\x00" * 300,
+    "nested": {"1": [{"a": (1, 2)}]}, 7: "int key", (1, "a"): "tuple key",
+    "when": datetime(2020, 1, 2, 3, 4, 5), "set": {1, 2},
+    "ordered": OrderedDict(b=1, a=2), "groups": defaultdict(list, a=[1]),
+}
+
+
+class TestBinaryFilePersistence(test_file_persistence.TestFilePersistence):
+
+    def get_context(self, module_name, module):
+        context = super().get_context(module_name, module)
+        if module_name == "persistence":
+            context.format = PersistenceModule.Format.binary.value
+        return context
+
+    def test_save_item_in_collection(self):
+        persistence = Persistence()
+        persistence.save(ITEM, "one", collection="col1")
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.cfg_dir, "col1", "one.bin")))
+        self.assertEqual(persistence.load("one", collection="col1"),
+                         ITEM)
+
+    def test_other_formats_loaded(self):
+        """ Items saved in another format are still loaded and removed """
+        persistence = Persistence()
+        Persistence._format = PersistenceModule.Format.pickle.value
+        persistence.save("pickled", "old")
+        persistence.save({"format": "pickle"}, "one", "col1")
+        persistence.save({"format": "pickle"}, "two", "col1")
+        Persistence._format = PersistenceModule.Format.binary.value
+        persistence.save({"format": "binary"}, "two", "col1")
+        self.assertEqual(persistence.load("old"), "pickled")
+        self.assertEqual(persistence.load_collection("col1"),
+                         {"one": {"format": "pickle"},
+                          "two": {"format": "binary"}})
+        persistence.remove("two", "col1")
+        self.assertEqual(os.listdir(os.path.join(self.cfg_dir, "col1")),
+                         ["one.dat"])
+
+
+class TestBinaryCodec(NIOTestCase):
+
+    def test_round_trip(self):
+        unpacked = codec.loads_binary(codec.dumps_binary(ITEM))
+        self.assertEqual(unpacked, ITEM)
+        self.assertIsInstance(unpacked["nested"]["1"][0]["a"], tuple)
+        self.assertIsInstance(unpacked["groups"], defaultdict)
+        self.assertEqual(unpacked, codec.loads_pickle(
+            codec.dumps_pickle(ITEM)))
+
+    def test_pure_python(self):
+        """ The pure python packer reads and writes MessagePack too """
+        packed = codec.dumps_binary(ITEM)
+        with patch.object(codec, "msgpack", None):
+            self.assertEqual(codec.loads_binary(packed), ITEM)
+            self.assertEqual(codec.dumps_binary(ITEM), packed)
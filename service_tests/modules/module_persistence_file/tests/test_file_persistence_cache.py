@@ -0,0 +1,92 @@
+import os
+
+from nio.modules.persistence import Persistence
+from nio.util.codec import load_pickle
+
+from ..log_store import LOG_NAME
+from ..persistence import Persistence as PersistenceModule
+from . import test_file_persistence
+
+
+class TestCachedFilePersistence(test_file_persistence.TestFilePersistence):
+
+    cache_size = 3
+
+    def get_context(self, module_name, module):
+        context = super().get_context(module_name, module)
+        if module_name == "persistence":
+            context.cache_size = self.cache_size
+        return context
+
+    def _filename(self, id, collection=""):
+        return os.path.join(self.cfg_dir, collection, "{}.dat".format(id))
+
+    def test_save_item_in_collection(self):
+        """ Items saved to a collection are listed before being written """
+        persistence = Persistence()
+        persistence.save({"field1": "value1"}, "one", collection="col1")
+        self.assertFalse(os.path.isfile(self._filename("one", "col1")))
+        self.assertEqual(len(persistence.load_collection("col1")), 1)
+        self.assertTrue(os.path.isfile(self._filename("one", "col1")))
+
+    def test_hits_and_misses(self):
+        """ Loads are served from memory once an item was loaded or saved """
+        persistence = Persistence()
+        persistence.save("value", "saved")
+        self.assertEqual(persistence.load("saved"), "value")
+        self.assertEqual(persistence.load("missing", default=1), 1)
+        self.assertEqual(persistence.load("missing", default=1), 1)
+        stats = PersistenceModule.cache_stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["flushes"], 0)
+        self.assertEqual(stats["dirty"], 1)
+        self.assertFalse(os.path.isfile(self._filename("saved")))
+
+    def test_eviction_writes_dirty_items(self):
+        """ The least recently used items are written when evicted """
+        persistence = Persistence()
+        for id in range(4):
+            persistence.save("value{}".format(id), "item{}".format(id))
+        self.assertTrue(os.path.isfile(self._filename("item0")))
+        self.assertFalse(os.path.isfile(self._filename("item3")))
+        stats = PersistenceModule.cache_stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["size"], 3)
+        # loaded back from disk
+        self.assertEqual(persistence.load("item0"), "value0")
+
+    def test_finalize_flushes(self):
+        """ Dirty items are written when the module is finalized """
+        persistence = Persistence()
+        persistence.save("value", "item_id")
+        persistence.save("removed", "removed_id")
+        persistence.remove("removed_id")
+        PersistenceModule.finalize()
+        self.assertTrue(os.path.isfile(self._filename("item_id")))
+        self.assertFalse(os.path.isfile(self._filename("removed_id")))
+        self.assertIsNone(PersistenceModule.cache_stats())
+
+    def test_items_copied(self):
+        """ Changes to items saved or loaded do not reach the cache """
+        persistence = Persistence()
+        item = {"values": [1]}
+        persistence.save(item, "item_id")
+        item["values"].append(2)
+        loaded = persistence.load("item_id")
+        self.assertEqual(loaded, {"values": [1]})
+        loaded["values"].append(3)
+        self.assertEqual(persistence.load("item_id"), {"values": [1]})
+        PersistenceModule.finalize()
+        self.assertEqual(Persistence().load("item_id"), {"values": [1]})
+
+    def test_configure_flushes_first(self):
+        """ Items cached are written as configured when saved """
+        persistence = Persistence()
+        persistence.save({"backend": "files"}, "item_id")
+        context = self.get_context("persistence", None)
+        context.backend = PersistenceModule.Backend.log
+        PersistenceModule.configure(context)
+        self.assertEqual(load_pickle(self._filename("item_id")),
+                         {"backend": "files"})
+        self.assertNotIn(LOG_NAME, os.listdir(self.cfg_dir))
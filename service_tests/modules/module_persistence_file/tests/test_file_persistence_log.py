@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+from time import sleep
+from unittest.mock import patch
+
+from nio.testing import NIOTestCase
+from nio.modules.persistence import Persistence
+from nio.util.codec import save_json, save_pickle
+
+from .. import log_store
+from ..codec import dumps_json, dumps_pickle
+from ..log_store import LOG_NAME, LogStore
+from ..migrate import migrate_to_log
+from ..persistence import Persistence as PersistenceModule
+from . import test_file_persistence
+
+
+class TestLogFilePersistence(test_file_persistence.TestFilePersistence):
+
+    def get_context(self, module_name, module):
+        context = super().get_context(module_name, module)
+        if module_name == "persistence":
+            context.backend = PersistenceModule.Backend.log
+        return context
+
+    def test_save_item_in_collection(self):
+        """ Items of a collection are kept in a single log """
+        persistence = Persistence()
+        persistence.save_collection({"one": 1, "two": 2}, "col1")
+        persistence.save("three", "three", collection="col1")
+        self.assertEqual(os.listdir(os.path.join(self.cfg_dir, "col1")),
+                         [LOG_NAME])
+        self.assertEqual(persistence.load_collection("col1"),
+                         {"one": 1, "two": 2, "three": "three"})
+
+    def test_items_survive_restart(self):
+        """ Items are read back from the log once the module restarts """
+        persistence = Persistence()
+        persistence.save("value", "item")
+        persistence.save({"a": 1}, "one", collection="col1")
+        persistence.remove("item")
+        PersistenceModule.finalize()
+        self.assertIsNone(persistence.load("item"))
+        self.assertEqual(persistence.load("one", collection="col1"),
+                         {"a": 1})
+
+    def test_missing_collection(self):
+        """ Loading a missing collection does not create its log """
+        persistence = Persistence()
+        self.assertEqual(persistence.load_collection("col1", default=1), 1)
+        persistence.remove_collection("col1")
+        self.assertFalse(os.path.exists(os.path.join(self.cfg_dir, "col1")))
+
+
+class TestLogStore(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, LOG_NAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_torn_record(self):
+        """ A record partially written at the end of the log is dropped """
+        store = LogStore(self.filename)
+        store.put("one", 1, b"1")
+        store.put("two", 1, b"2")
+        store.close()
+        size = os.path.getsize(self.filename)
+        with open(self.filename, "r+b") as file:
+            file.truncate(size - 1)
+        store = LogStore(self.filename)
+        self.assertEqual(store.items(), [("one", 1, b"1")])
+        store.put("three", 1, b"3")
+        store.close()
+        store = LogStore(self.filename)
+        self.assertEqual(store.get("three"), (1, b"3"))
+        self.assertIsNone(store.get("two"))
+        store.close()
+
+    @patch.object(log_store, "COMPACTION_MIN_BYTES", 100)
+    def test_compaction(self):
+        """ Stale records are dropped in the background """
+        store = LogStore(self.filename)
+        store.put("kept", 1, b"kept")
+        for value in range(100):
+            store.put("overwritten", 1, str(value).encode())
+        for _ in range(50):
+            if store._compaction is None:
+                break
+            sleep(0.01)
+        stats = store.stats()
+        self.assertLessEqual(stats["stale"], 100)
+        self.assertEqual(stats["size"], stats["live"] + stats["stale"])
+        self.assertEqual(os.path.getsize(self.filename), stats["size"])
+        self.assertEqual(store.get("overwritten"), (1, b"99"))
+        store.close()
+        store = LogStore(self.filename)
+        self.assertEqual(sorted(store.items()),
+                         [("kept", 1, b"kept"), ("overwritten", 1, b"99")])
+        store.close()
+
+    def test_clear(self):
+        store = LogStore(self.filename)
+        store.put_many([("one", 1, b"1"), ("two", 1, b"2")])
+        self.assertTrue(store.delete("one"))
+        self.assertFalse(store.delete("one"))
+        store.clear()
+        self.assertEqual(len(store), 0)
+        self.assertEqual(os.path.getsize(self.filename), 0)
+        store.close()
+
+    def test_migrate(self):
+        """ Item files are moved to the logs of their folders """
+        collection = os.path.join(self.directory, "service", "col1")
+        os.makedirs(collection)
+        save_pickle(os.path.join(self.directory, "service_item.dat"), [1])
+        save_json(os.path.join(collection, "one.cfg"), {"a": 1})
+        save_pickle(os.path.join(collection, "two.dat"), "two")
+        self.assertEqual(migrate_to_log(self.directory), 3)
+        self.assertEqual(os.listdir(collection), [LOG_NAME])
+        store = LogStore(os.path.join(collection, LOG_NAME))
+        self.assertEqual(
+            sorted(store.items()),
+            [("one", PersistenceModule.Format.json.value,
+              dumps_json({"a": 1})),
+             ("two", PersistenceModule.Format.pickle.value,
+              dumps_pickle("two"))])
+        store.close()
@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+from nio.modules.persistence import Persistence
+from nio.util.codec import load_pickle
+
+from .. import persistence as persistence_module
+from . import test_file_persistence
+
+
+class TestParseCache(test_file_persistence.TestFilePersistence):
+
+    def _load_collection(self, collection):
+        """ Load a collection, returns it along with the files parsed """
+        with patch.object(persistence_module, "load_pickle",
+                          wraps=load_pickle) as load:
+            items = Persistence().load_collection(collection)
+        return items, load.call_count
+
+    def test_unchanged_files_not_parsed(self):
+        """ Files are parsed again only once they change """
+        persistence = Persistence()
+        persistence.save_collection(
+            {"block_{}".format(index): {"value": index}
+             for index in range(40)}, "blocks")
+        items, parsed = self._load_collection("blocks")
+        self.assertEqual(len(items), 40)
+        self.assertEqual(parsed, 40)
+        items, parsed = self._load_collection("blocks")
+        self.assertEqual(items["block_7"], {"value": 7})
+        self.assertEqual(parsed, 0)
+        persistence.save({"value": "changed"}, "block_7", "blocks")
+        persistence.remove("block_8", "blocks")
+        items, parsed = self._load_collection("blocks")
+        self.assertEqual(parsed, 1)
+        self.assertEqual(items["block_7"], {"value": "changed"})
+        self.assertNotIn("block_8", items)
+
+    def test_items_copied(self):
+        """ Changing a loaded item does not change the cached one """
+        Persistence().save({"name": "block"}, "block", "blocks")
+        items, _ = self._load_collection("blocks")
+        items["block"]["name"] = "renamed"
+        items, parsed = self._load_collection("blocks")
+        self.assertEqual(parsed, 0)
+        self.assertEqual(items["block"], {"name": "block"})
+
+    def test_nested_values_copied(self):
+        """ Changing a nested value of a loaded item changes neither later
+        loads nor the item loaded on its own
+        """
+        persistence = Persistence()
+        persistence.save({"list": [1], "nested": {"x": 1}}, "a", "x")
+        items, _ = self._load_collection("x")
+        items["a"]["nested"]["x"] = 99
+        items["a"]["list"].append(2)
+        items, parsed = self._load_collection("x")
+        self.assertEqual(parsed, 0)
+        self.assertEqual(items["a"], {"list": [1], "nested": {"x": 1}})
+        self.assertEqual(persistence.load("a", collection="x"), items["a"])
@@ -0,0 +1,99 @@
+import copy
+import json
+import os
+import pickle
+from unittest.mock import patch
+
+from nio.modules.persistence import Persistence
+
+from ..persistence import Persistence as PersistenceModule
+from ..snapshot import SNAPSHOT_NAME, ConfigSnapshot, build_snapshot
+from . import test_file_persistence
+
+
+class TestSnapshot(test_file_persistence.TestFilePersistence):
+
+    def setUp(self):
+        super().setUp()
+        self.persistence = Persistence()
+        self.persistence.save_collection(
+            {"one": {"value": 1}, "two": {"value": 2}}, "blocks")
+        self.assertEqual(build_snapshot(self.cfg_dir, ["blocks"], ".dat"),
+                         2)
+        # served to the proxied interface as configure would
+        Persistence._snapshot = ConfigSnapshot(
+            os.path.join(self.cfg_dir, SNAPSHOT_NAME), self.cfg_dir, ".dat")
+
+    def _load_collection(self, collection):
+        """ Load a collection, returns it along with the decode mock """
+        decode = patch.object(Persistence._snapshot, "_decode",
+                              wraps=Persistence._snapshot._decode).start()
+        self.addCleanup(patch.stopall)
+        return self.persistence.load_collection(collection), decode
+
+    def test_decoded_on_access(self):
+        blocks, decode = self._load_collection("blocks")
+        self.assertIsInstance(blocks, dict)
+        self.assertEqual(len(blocks), 2)
+        self.assertEqual(sorted(blocks), ["one", "two"])
+        self.assertEqual(decode.call_count, 0)
+        self.assertEqual(blocks["one"], {"value": 1})
+        self.assertEqual(blocks.get("one"), {"value": 1})
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(blocks, {"one": {"value": 1}, "two": {"value": 2}})
+        self.assertEqual(decode.call_count, 2)
+
+    def test_decoded_when_copied(self):
+        """ Copies and dumps of a collection hold the decoded items """
+        expected = {"one": {"value": 1}, "two": {"value": 2}}
+        for copied in (lambda blocks: dict(blocks),
+                       lambda blocks: dict(**blocks),
+                       lambda blocks: blocks.copy(),
+                       copy.copy, copy.deepcopy,
+                       lambda blocks: pickle.loads(pickle.dumps(blocks)),
+                       lambda blocks: json.loads(json.dumps(blocks))):
+            blocks = self.persistence.load_collection("blocks")
+            result = copied(blocks)
+            self.assertIs(type(result), dict)
+            self.assertEqual(result, expected)
+        blocks = self.persistence.load_collection("blocks")
+        self.assertEqual(sorted(blocks.values(), key=repr),
+                         [{"value": 1}, {"value": 2}])
+        self.assertEqual(blocks.pop("two"), {"value": 2})
+
+    def test_loads_independent(self):
+        """ Changing a loaded collection or its items does not change the
+        snapshot nor the next loads
+        """
+        blocks = self.persistence.load_collection("blocks")
+        blocks["one"]["value"] = 3
+        blocks["three"] = {"value": 3}
+        del blocks["two"]
+        self.assertEqual(blocks, {"one": {"value": 3}, "three": {"value": 3}})
+        self.assertEqual(self.persistence.load_collection("blocks"),
+                         {"one": {"value": 1}, "two": {"value": 2}})
+
+    def test_stale(self):
+        """ Collections whose files changed are loaded from the files """
+        self.persistence.save({"value": "changed"}, "two", "blocks")
+        blocks = self.persistence.load_collection("blocks")
+        self.assertIsInstance(blocks, dict)
+        self.assertEqual(blocks["two"], {"value": "changed"})
+        # not compiled
+        self.assertEqual(self.persistence.load_collection(
+            "services", default="default"), "default")
+
+    def test_not_a_snapshot(self):
+        filename = os.path.join(self.cfg_dir, "one.dat")
+        self.persistence.save("item", "one")
+        with self.assertRaises(ValueError):
+            ConfigSnapshot(filename, self.cfg_dir)
+
+    def test_configured(self):
+        """ The snapshot is opened when configuring with it """
+        context = self.get_context("persistence", None)
+        context.snapshot = os.path.join(self.cfg_dir, SNAPSHOT_NAME)
+        PersistenceModule.configure(context)
+        self.assertIsNotNone(PersistenceModule._snapshot)
+        PersistenceModule.finalize()
+        self.assertIsNone(PersistenceModule._snapshot)
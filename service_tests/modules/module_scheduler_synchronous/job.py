@@ -10,6 +10,13 @@ class Job(object):
     def cancel(self):
         SyncScheduler.unschedule(self._job)
 
+    def configure(self, overlap=None, max_lateness=None, catch_up=None):
+        """ Set the job's overlap policy, lateness budget and catch up
+        policy, see SynchronousSchedulerRunner.configure_job
+        """
+        return SyncScheduler.configure_job(
+            self._job, overlap, max_lateness, catch_up)
+
     def jump_ahead(self, seconds):
         """ Jump the scheudler forward a certain number of seconds.
 
@@ -17,3 +24,9 @@ class Job(object):
         logic and temporal assertions.
         """
         SyncScheduler.jump_ahead(seconds)
+
+    def fast_forward(self, seconds, catch_up=None):
+        """ Move the scheduler forward one due event after the other, see
+        SynchronousSchedulerRunner.fast_forward
+        """
+        SyncScheduler.fast_forward(seconds, catch_up)
@@ -2,21 +2,41 @@ from nio.modules.context import ModuleContext
 from .job import Job
 from nio.modules.scheduler.module import SchedulerModule
 
-from .scheduler import SyncScheduler
+from .queues import QueueBackend
+from .scheduler import CatchUpPolicy, OverlapPolicy, SyncScheduler, \
+    SynchronousSchedulerRunner
 
 
 class SynchronousSchedulerModule(SchedulerModule):
 
+    # data structure holding pending events, a timing wheel suits many
+    # repeating jobs better than the default heap
+    queue_backend = QueueBackend.heap
+    # sleep until the next job is due instead of polling at the resolution
+    tickless = False
+    # threads running jobs, 0 runs them on the scheduler thread so that
+    # jobs fired by jump_ahead run in order
+    executor_workers = 0
+    # seconds jump_ahead waits for the runs it started on executor workers
+    jump_timeout = 10
+    # defaults for jobs, change a job's with Job.configure
+    overlap_policy = OverlapPolicy.queue
+    max_lateness = None
+    catch_up_policy = CatchUpPolicy.all
+
     def initialize(self, context):
         super().initialize(context)
         # For testing, use a job class that allows us to jump ahead in time
         self.proxy_job_class(Job)
 
-        SyncScheduler.do_configure(context)
-        SyncScheduler.do_start()
+        # a scheduler of its own, nothing is left over from a previous test
+        self.scheduler = SynchronousSchedulerRunner()
+        SyncScheduler.use(self.scheduler)
+        self.scheduler.do_configure(context)
+        self.scheduler.do_start()
 
     def finalize(self):
-        SyncScheduler.do_stop()
+        self.scheduler.do_stop()
         super().finalize()
 
     def prepare_core_context(self):
@@ -24,4 +44,11 @@ class SynchronousSchedulerModule(SchedulerModule):
         # set a fine resolution during tests
         context.min_interval = 0.01
         context.resolution = 0.01
+        context.queue_backend = self.queue_backend
+        context.tickless = self.tickless
+        context.executor_workers = self.executor_workers
+        context.jump_timeout = self.jump_timeout
+        context.overlap_policy = self.overlap_policy
+        context.max_lateness = self.max_lateness
+        context.catch_up_policy = self.catch_up_policy
         return context
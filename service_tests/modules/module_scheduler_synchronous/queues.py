@@ -0,0 +1,229 @@
+import heapq
+from enum import Enum
+
+
+class QueueBackend(Enum):
+    """ Data structure holding the scheduler's pending events """
+    heap = 1
+    timing_wheel = 2
+
+
+class HeapQueue(object):
+
+    """ Binary heap of events ordered by time
+
+    Insertion and removal of the first event are O(log n).
+    """
+
+    def __init__(self, resolution):
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        return iter(self._heap)
+
+    def reset(self, now):
+        self._heap[:] = []
+
+    def push(self, event):
+        heapq.heappush(self._heap, event)
+
+    def push_many(self, events):
+        size = len(self._heap) + len(events)
+        # heapifying is O(n), pushing the events one by one O(k log n)
+        if len(events) * size.bit_length() > size:
+            self._heap.extend(events)
+            heapq.heapify(self._heap)
+        else:
+            for event in events:
+                heapq.heappush(self._heap, event)
+
+    def first(self, now):
+        """ Return the earliest event if it is due at time now, else None """
+        if self._heap and self._heap[0].time <= now:
+            return self._heap[0]
+
+    def pop(self):
+        """ Remove the event last returned by first() """
+        return heapq.heappop(self._heap)
+
+    def next_time(self):
+        """ Time of the earliest event, None when empty """
+        if self._heap:
+            return self._heap[0].time
+
+    def compact(self, is_live):
+        """ Drop the events is_live(event) is False for """
+        self._heap[:] = [event for event in self._heap if is_live(event)]
+        heapq.heapify(self._heap)
+
+
+# bits of the tick covered by each level of the timing wheel
+_LEVEL_BITS = 8
+_SLOTS = 1 << _LEVEL_BITS
+_MASK = _SLOTS - 1
+_LEVELS = 4
+
+
+def _lowest_bit(value):
+    """ Index of the lowest bit set in value """
+    return (value & -value).bit_length() - 1
+
+
+class TimingWheelQueue(object):
+
+    """ Hierarchical timing wheel of events
+
+    Time is divided in ticks of `resolution` seconds. The wheel has four
+    levels of 256 slots, level n holding events due within 256 ** (n + 1)
+    ticks. An event goes to the level of the highest digit (in base 256)
+    where its tick differs from the current tick, and it is moved to lower
+    levels as the current tick reaches the start of its slot. Events past
+    the last level wait in an overflow heap.
+
+    Inserting an event is O(1). Finding the next slot holding events is a
+    few bit operations per level, so jumping ahead over long spans of time
+    only visits the ticks that have events. Events of the ticks reached
+    are handed over in time order through a small heap.
+    """
+
+    def __init__(self, resolution):
+        self._resolution = resolution
+        self._slots = [[[] for _ in range(_SLOTS)] for _ in range(_LEVELS)]
+        # bit n of a level's bitmap is set when its slot n holds events
+        self._bitmaps = [0] * _LEVELS
+        # events of the ticks already reached, ordered by time
+        self._due = []
+        self._overflow = []
+        self._current = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for level in self._slots:
+            for slot in level:
+                yield from slot
+        yield from self._due
+        yield from self._overflow
+
+    def reset(self, now):
+        self._reset(self._tick(now))
+
+    def _reset(self, tick):
+        """ Empty the wheel, its current tick set to tick """
+        for level in self._slots:
+            for slot in level:
+                slot[:] = []
+        self._bitmaps = [0] * _LEVELS
+        self._due = []
+        self._overflow = []
+        self._current = tick
+        self._size = 0
+
+    def push(self, event):
+        self._insert(event)
+        self._size += 1
+
+    def push_many(self, events):
+        for event in events:
+            self._insert(event)
+        self._size += len(events)
+
+    def first(self, now):
+        """ Return the earliest event if it is due at time now, else None """
+        now_tick = self._tick(now)
+        while not self._due:
+            tick = self._next_tick()
+            if tick is None or tick > now_tick:
+                return None
+            self._reach(tick)
+        if self._due[0].time <= now:
+            return self._due[0]
+
+    def pop(self):
+        """ Remove the event last returned by first() """
+        self._size -= 1
+        return heapq.heappop(self._due)
+
+    def next_time(self):
+        """ Time of the earliest event, or of the start of the earliest tick
+        holding events, None when empty
+        """
+        if self._due:
+            return self._due[0].time
+        tick = self._next_tick()
+        if tick is not None:
+            return tick * self._resolution
+
+    def compact(self, is_live):
+        """ Drop the events is_live(event) is False for """
+        events = [event for event in self if is_live(event)]
+        # the tick, which going through the time could round down
+        self._reset(self._current)
+        for event in events:
+            self.push(event)
+
+    def _tick(self, time):
+        return int(time / self._resolution)
+
+    def _insert(self, event):
+        tick = self._tick(event.time)
+        if tick <= self._current:
+            heapq.heappush(self._due, event)
+            return
+        level = ((tick ^ self._current).bit_length() - 1) // _LEVEL_BITS
+        if level >= _LEVELS:
+            heapq.heappush(self._overflow, event)
+            return
+        slot = (tick >> (level * _LEVEL_BITS)) & _MASK
+        self._slots[level][slot].append(event)
+        self._bitmaps[level] |= 1 << slot
+
+    def _next_tick(self):
+        """ The next tick holding events, or where events move to a lower
+        level, None when the wheel is empty
+        """
+        for level in range(_LEVELS):
+            bitmap = self._bitmaps[level]
+            if not bitmap:
+                continue
+            shift = level * _LEVEL_BITS
+            position = (self._current >> shift) & _MASK
+            # slots of a level are always ahead of the current tick, and
+            # lower levels are always ahead of higher ones
+            slot = position + 1 + _lowest_bit(bitmap >> (position + 1))
+            upper = self._current >> (shift + _LEVEL_BITS)
+            return (upper << (shift + _LEVEL_BITS)) | (slot << shift)
+        if self._overflow:
+            bits = _LEVELS * _LEVEL_BITS
+            return (self._tick(self._overflow[0].time) >> bits) << bits
+
+    def _reach(self, tick):
+        """ Move the current tick, cascading the slots starting there """
+        self._current = tick
+        bits = _LEVELS * _LEVEL_BITS
+        while self._overflow and \
+                self._tick(self._overflow[0].time) >> bits <= tick >> bits:
+            self._insert(heapq.heappop(self._overflow))
+        for level in range(_LEVELS - 1, -1, -1):
+            shift = level * _LEVEL_BITS
+            if tick & ((1 << shift) - 1):
+                continue
+            slot = (tick >> shift) & _MASK
+            if not self._bitmaps[level] >> slot & 1:
+                continue
+            events = self._slots[level][slot]
+            self._slots[level][slot] = []
+            self._bitmaps[level] &= ~(1 << slot)
+            for event in events:
+                self._insert(event)
+
+
+QUEUES = {
+    QueueBackend.heap: HeapQueue,
+    QueueBackend.timing_wheel: TimingWheelQueue,
+}
@@ -1,16 +1,75 @@
-import heapq
-from collections import namedtuple
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from threading import Event, RLock
+from enum import Enum
+from itertools import count
+from threading import Condition, Event, RLock
 from time import monotonic
-from uuid import uuid4
 
 from nio.modules.module import ModuleNotInitialized
 from nio.util.logging import get_nio_logger
 from nio.util.runner import RunnerStatus, Runner
 from nio.util.threading import spawn
 
-QueueEvent = namedtuple('Event', 'time, id, target, frequency, args, kwargs')
+from .queues import QUEUES, HeapQueue, QueueBackend
+
+
+class QueueEvent(object):
+
+    """ A scheduled run of a job, ordered by time then id
+
+    The same record stays in the queue and in the events dictionary for
+    the life of the job, a repeating job's record is moved to its next
+    time and pushed back after every run.
+    """
+
+    __slots__ = ("time", "id", "target", "frequency", "args", "kwargs")
+
+    def __init__(self, time, id, target, frequency, args, kwargs):
+        self.time = time
+        self.id = id
+        self.target = target
+        self.frequency = frequency
+        self.args = args
+        # None rather than an empty dictionary per job
+        self.kwargs = kwargs or None
+
+    def __lt__(self, other):
+        return self.time < other.time or \
+            (self.time == other.time and self.id < other.id)
+
+
+# number of cancelled events tolerated in the queue before compacting it
+DEFAULT_COMPACTION_THRESHOLD = 1000
+# seconds jump_ahead and fast_forward wait for the runs they started on the
+# executor
+DEFAULT_JUMP_TIMEOUT = 10
+
+
+class OverlapPolicy(Enum):
+    """ What to do with a run of a job whose previous run is not done """
+    # drop the run
+    skip = 1
+    # start the run once the previous one is done
+    queue = 2
+    # start the run right away, next to the previous one
+    concurrent = 3
+
+
+class CatchUpPolicy(Enum):
+    """ How a repeating job catches up with the runs it missed, when time
+    jumped ahead or the scheduler fell behind
+    """
+    # run once per missed interval
+    all = 1
+    # run once, at the last missed interval
+    once = 2
+    # run once, passing the number of runs missed as `missed_runs`
+    count = 3
+
+
+# overlap policy, lateness budget and catch up policy of a job
+JobOptions = namedtuple('JobOptions', 'overlap, max_lateness, catch_up')
 
 
 class SynchronousSchedulerRunner(Runner):
@@ -20,22 +79,74 @@ class SynchronousSchedulerRunner(Runner):
         self._sched_min_delta = 0.1
         self._sched_resolution = 0.1
         self.logger = get_nio_logger("Custom Scheduler")
-        self._queue = []
-        self._queue_lock = RLock()
+        self._queue = HeapQueue(self._sched_resolution)
         self._stop_event = Event()
+        # job id -> its event in the queue
         self._events = dict()
-        self._events_lock = RLock()
+        # ids keep increasing across resets, an old job id never matches a
+        # new job
+        self._ids = count(1)
+        # guards the queue, the events and the runs in progress
+        self._lock = RLock()
+        # cancelled events are left in the queue as tombstones, the queue is
+        # compacted once they pass the threshold and outnumber live events
+        self._tombstones = 0
+        self._compaction_threshold = DEFAULT_COMPACTION_THRESHOLD
+        # event popped from the queue and being run, not a tombstone when
+        # cancelled meanwhile
+        self._popped = None
         self._process_events_thread = None
         self.offset = 0
         # event used to wait for next task to execute and/or wait at scheduler
-        # resolution
+        # resolution, set to wake the thread up early
         self._sleep_interrupt_event = Event()
+        # when tickless, the thread sleeps until the next event is due
+        # instead of waking up at least every resolution
+        self._tickless = False
+        # time the thread sleeps until, scheduling an earlier event wakes it
+        self._wakeup_time = 0
+        # held while executing tasks, so that jump_ahead does not return
+        # while the scheduler thread is still executing due tasks
+        self._execution_lock = RLock()
+        # jobs run on the scheduler thread unless given executor workers
+        self._executor_workers = 0
+        self._executor = None
+        self._jump_timeout = DEFAULT_JUMP_TIMEOUT
+        self._default_options = JobOptions(
+            OverlapPolicy.queue, None, CatchUpPolicy.all)
+        # catch up policy of every job during a jump, when given
+        self._catch_up = None
+        # job id -> JobOptions, for jobs not using the defaults
+        self._job_options = {}
+        # job id -> number of runs in progress, and runs waiting for them
+        self._running = {}
+        self._backlog = {}
+        # notified when no runs are left in progress
+        self._idle = Condition(self._lock)
+        self._stats = dict(runs=0, skipped=0, late=0, caught_up=0)
+        # time reached by the last jump_ahead, runs due during the jump
+        # are late from then on only
+        self._jumped_to = 0
 
     def configure(self, context):
         # Load in the minimum delta and resolution from the config
         self._reset_scheduler()
         self._sched_min_delta = context.min_interval
         self._sched_resolution = context.resolution
+        self._tickless = getattr(context, "tickless", False)
+        self._executor_workers = getattr(context, "executor_workers", 0)
+        self._jump_timeout = getattr(
+            context, "jump_timeout", DEFAULT_JUMP_TIMEOUT)
+        self._default_options = JobOptions(
+            getattr(context, "overlap_policy", OverlapPolicy.queue),
+            getattr(context, "max_lateness", None),
+            getattr(context, "catch_up_policy", CatchUpPolicy.all))
+        self._compaction_threshold = getattr(
+            context, "compaction_threshold", DEFAULT_COMPACTION_THRESHOLD)
+        # data structure holding the pending events
+        queue_backend = getattr(context, "queue_backend", QueueBackend.heap)
+        self._queue = QUEUES[queue_backend](self._sched_resolution)
+        self._queue.reset(monotonic())
 
     def _reset_scheduler(self):
         """ Reset the scheduler to the basic state.
@@ -44,11 +155,19 @@ class SynchronousSchedulerRunner(Runner):
         restarted or start fresh. It will clear out the queue, reset the
         stop event, etc.
         """
-        self._queue[:] = []
+        self._queue.reset(monotonic())
         # Set and then clear the event to trigger any needed stops
         self._stop_event.set()
+        self._sleep_interrupt_event.set()
         self._stop_event.clear()
         self._events.clear()
+        self._tombstones = 0
+        self._popped = None
+        self._job_options.clear()
+        with self._lock:
+            self._backlog.clear()
+        self._stats = dict(runs=0, skipped=0, late=0, caught_up=0)
+        self._jumped_to = 0
         if self._process_events_thread is not None:
             self._process_events_thread.join(self._sched_resolution)
         self.offset = 0
@@ -74,6 +193,48 @@ class SynchronousSchedulerRunner(Runner):
         if self.status != RunnerStatus.started:
             raise ModuleNotInitialized("Scheduler module is not started")
 
+        with self._lock:
+            event = self._new_event(
+                target, delta, repeatable, args, kwargs, self._get_time())
+            self._events[event.id] = event
+            self._queue.push(event)
+            if event.time < self._wakeup_time:
+                # due before the thread wakes up, wake it up now
+                self._sleep_interrupt_event.set()
+        return event.id
+
+    def schedule_many(self, tasks):
+        """ Add a batch of tasks to the Scheduler at once
+
+        Cheaper than scheduling the tasks one by one, the queue takes the
+        whole batch in one step.
+
+        Args:
+            tasks (iterable): (target, delta, repeatable) tuples, optionally
+                followed by the positional arguments tuple and keyword
+                arguments dictionary to pass to target, see schedule_task
+
+        Returns:
+            list: the jobs scheduled, in the order of the tasks
+        """
+        if self.status != RunnerStatus.started:
+            raise ModuleNotInitialized("Scheduler module is not started")
+
+        with self._lock:
+            now = self._get_time()
+            events = [self._new_event(*task, now=now)
+                      for task in tasks]
+            for event in events:
+                self._events[event.id] = event
+            self._queue.push_many(events)
+            if events and \
+                    min(event.time for event in events) < self._wakeup_time:
+                self._sleep_interrupt_event.set()
+        return [event.id for event in events]
+
+    def _new_event(self, target, delta, repeatable, args=(), kwargs=None,
+                   now=None):
+        """ Event of a task scheduled at time now """
         if not isinstance(delta, timedelta):
             raise AttributeError('delta must be of type: timedelta')
 
@@ -91,20 +252,8 @@ class SynchronousSchedulerRunner(Runner):
             # it to be
             frequency = 0
 
-        event_id = uuid4().hex
-        event = QueueEvent(
-            self._get_time() + delta, event_id, target,
-            frequency, args, kwargs)
-
-        # add to queue
-        with self._queue_lock:
-            heapq.heappush(self._queue, event)
-
-        # add to events
-        with self._events_lock:
-            self._events[event_id] = event
-
-        return event_id
+        return QueueEvent(
+            now + delta, next(self._ids), target, frequency, args, kwargs)
 
     def unschedule(self, job):
         """Remove a job from the scheduler.
@@ -120,33 +269,82 @@ class SynchronousSchedulerRunner(Runner):
 
         """
         self.logger.debug("Un-scheduling %s" % job)
-        # remove it from events dictionary
-        event = None
-        with self._events_lock:
-            if job in self._events:
-                event = self._events.pop(job)
-        if event:
-            try:
-                with self._queue_lock:
-                    if event in self._queue:
-                        self._queue.remove(event)
-                        heapq.heapify(self._queue)
-                self.logger.debug('Success cancelling event')
-                return True
-            except Exception:
-                self.logger.debug('Failure to remove event {0} from queue'
-                                  ' while cancelling a job'.format(event))
-        return False
+        # remove it from events dictionary, the event left in the queue is
+        # now a tombstone skipped when popped
+        with self._lock:
+            event = self._events.pop(job, None)
+            if event is None:
+                return False
+            self._job_options.pop(job, None)
+            self._backlog.pop(job, None)
+            if event is not self._popped:
+                self._tombstones += 1
+                if self._tombstones > self._compaction_threshold and \
+                        self._tombstones * 2 > len(self._queue):
+                    self._compact()
+        self.logger.debug('Success cancelling event')
+        return True
+
+    def configure_job(self, job, overlap=None, max_lateness=None,
+                      catch_up=None):
+        """ Set how runs of a scheduled job are executed
+
+        Args:
+            job: The ID of the job
+            overlap (OverlapPolicy): what to do with a run due while the
+                previous one is still running, only happens when jobs run
+                on executor workers
+            max_lateness (float): seconds a run may start after it was due,
+                later runs are dropped and counted as late
+            catch_up (CatchUpPolicy): how a repeating job catches up with
+                the runs it missed
+
+        Returns:
+            bool: whether the job is scheduled
+        """
+        with self._lock:
+            if job not in self._events:
+                return False
+            options = self._job_options.get(job, self._default_options)
+            if overlap is not None:
+                options = options._replace(overlap=overlap)
+            if max_lateness is not None:
+                options = options._replace(max_lateness=max_lateness)
+            if catch_up is not None:
+                options = options._replace(catch_up=catch_up)
+            self._job_options[job] = options
+        return True
+
+    def stats(self):
+        """ Counters of the runs started, skipped as overlapping, dropped
+        as late and coalesced by catch up policies
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _compact(self):
+        """ Rebuild the queue without its tombstones
+
+        Must be called holding the lock.
+        """
+        self._queue.compact(lambda event: self._events.get(event.id) is event)
+        self._tombstones = 0
 
     def stop(self):
         self._stop_event.set()
+        self._sleep_interrupt_event.set()
         # do not join indefinitely, allow a reasonable time
         self._process_events_thread.join(10 * self._sched_resolution)
         if self._process_events_thread.is_alive():
             self.logger.warning("Scheduler thread did not end properly, "
                                 "it timed out")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
 
     def start(self):
+        if self._executor_workers:
+            self._executor = ThreadPoolExecutor(self._executor_workers)
         self._process_events_thread = spawn(self._process_events)
 
     def _process_events(self):
@@ -160,82 +358,183 @@ class SynchronousSchedulerRunner(Runner):
 
         while not self._stop_event.is_set():
             try:
+                # cleared before looking at the queue, so that events
+                # scheduled from now on cut the wait short
+                self._sleep_interrupt_event.clear()
                 next_try_time = self._execute_pending_tasks()
                 self._sleep_interrupt_event.wait(next_try_time)
             except Exception:
                 # log any exception, do not leave loop
                 self.logger.exception('Exception caught')
 
-    def _execute_pending_tasks(self):
+    def _execute_pending_tasks(self, end_offset=None):
         """ Executes pending tasks
 
         This method will execute pending tasks, as soon as no task is ready for
         execution it will return.
 
+        When fast forwarding, the offset is moved to the time of each event
+        as it is executed, for events due up to when the offset reaches
+        `end_offset`.
+
         General characteristics:
-            Scheduler tasks are launched asynchronously
+            Tasks run on the scheduler thread, or are handed to the
+            executor when it has workers, see _dispatch.
             When not a single event is scheduled, method will return the
             resolution time, however, when events are present the next wait
             time is calculated as the minimum between scheduler's resolution
             and next event scheduled time.
+            When tickless, the wait time is not capped by the resolution and
+            is None, to wait until woken up, when no event is scheduled.
 
         Returns:
             recommended time to wait before events are next considered
         """
-        while not self._stop_event.is_set():
-            with self._queue_lock:
-                # is queue empty?
-                if not self._queue:
-                    # amount of time recommended to wait before trying again
-                    return self._sched_resolution
-                # have access to first event in queue
-                event = heapq.heappop(self._queue)
-
-            # check event's time to see if it is up for execution.
-            event_time, event_id, target, frequency, args, kwargs = event
-            # get time to compare event against
-            now = self._get_time()
-            if now < event_time:
-                # event is in the future so push it back and recommend time
-                # to wait before trying again
-                with self._queue_lock:
-                    heapq.heappush(self._queue, event)
-                return min(event_time - now, self._sched_resolution)
-            else:
+        with self._execution_lock:
+            while not self._stop_event.is_set():
+                with self._lock:
+                    # get time to compare events against
+                    now = self._get_time()
+                    horizon = now if end_offset is None else \
+                        now - self.offset + end_offset
+                    # have access to first event in queue, if it is up for
+                    # execution
+                    event = self._queue.first(horizon)
+                    if event is None:
+                        wait = self._wait_time(now)
+                        self._wakeup_time = \
+                            now + wait if wait is not None else float("inf")
+                        return wait
+                    self._queue.pop()
+                    if self._events.get(event.id) is not event:
+                        # event was cancelled, drop its tombstone
+                        self._tombstones = max(self._tombstones - 1, 0)
+                        continue
+                    self._popped = event
+                    missed = self._catch_up_runs(event, horizon)
+
+                if event.time > now:
+                    # fast forwarding, move time to the event
+                    self.offset += event.time - now
+                    self._jumped_to = event.time
                 # time is up, execute
-                try:
-                    self.logger.debug("Executing: {0}".format(target))
-                    # launch target task from a different thread thus
-                    # making scheduler independent from task duration
-                    target(*args, **kwargs)
-                except Exception:
-                    self.logger.exception('Calling: {0}'.format(target))
+                self._dispatch(event, missed)
 
-                with self._events_lock:
+                with self._lock:
+                    self._popped = None
                     # before processing any further, make sure event has
                     # not been cancelled
-                    if event_id in self._events:
+                    if self._events.get(event.id) is event:
                         # is it repeatable?
-                        if frequency:
+                        if event.frequency:
                             # reschedule it back, adding frequency to
                             # event time
-                            event = QueueEvent(event_time + frequency,
-                                               event_id,
-                                               target,
-                                               frequency,
-                                               args, kwargs)
-                            # housekeeping new event in
-                            with self._queue_lock:
-                                heapq.heappush(self._queue, event)
-                            self._events[event_id] = event
+                            event.time += event.frequency
+                            self._queue.push(event)
                         else:
                             # remove event when not repeatable
-                            del self._events[event_id]
+                            del self._events[event.id]
+                            self._job_options.pop(event.id, None)
                     else:
                         self.logger.debug("Event: {0} was cancelled".
-                                          format(event_id))
+                                          format(event.id))
+
+    def _catch_up_runs(self, event, now):
+        """ Apply the catch up policy of a repeating event due at time now
 
-    def jump_ahead(self, seconds):
+        Moves the event to its last missed interval when its runs are
+        coalesced. Must be called holding the lock.
+
+        Returns:
+            the number of runs the event stands for on top of its own when
+            passed to the target, None otherwise
+        """
+        if not event.frequency:
+            return None
+        policy = self._catch_up or self._job_options.get(
+            event.id, self._default_options).catch_up
+        if policy is CatchUpPolicy.all:
+            return None
+        missed = int((now - event.time) // event.frequency)
+        if missed:
+            self._stats["caught_up"] += missed
+            event.time += missed * event.frequency
+        return missed if policy is CatchUpPolicy.count else None
+
+    def _dispatch(self, event, missed=None):
+        """ Run a due event, applying its job's overlap policy """
+        options = self._job_options.get(event.id, self._default_options)
+        # the event moves on to its next time when rescheduled
+        run = (event, event.time, missed, options)
+        with self._lock:
+            running = self._running.get(event.id, 0)
+            if running and options.overlap is OverlapPolicy.skip:
+                self._stats["skipped"] += 1
+                self.logger.debug("Skipping overlapping run of {}".format(
+                    event.target))
+                return
+            if running and options.overlap is OverlapPolicy.queue:
+                self._backlog.setdefault(event.id, deque()).append(run)
+                return
+            self._running[event.id] = running + 1
+        if self._executor is None:
+            self._run(*run)
+        else:
+            self._executor.submit(self._run, *run)
+
+    def _run(self, event, due, missed, options):
+        """ Run an event, then the runs of its job queued meanwhile """
+        job = event.id
+        while event is not None:
+            # runs due during a jump_ahead are due at the time jumped to
+            lateness = self._get_time() - max(due, self._jumped_to)
+            if options.max_lateness is not None and \
+                    lateness > options.max_lateness:
+                with self._lock:
+                    self._stats["late"] += 1
+                self.logger.debug("Dropping run of {} late by {:.3f}s".format(
+                    event.target, lateness))
+            else:
+                with self._lock:
+                    self._stats["runs"] += 1
+                kwargs = event.kwargs or {}
+                if missed is not None:
+                    kwargs = dict(kwargs, missed_runs=missed)
+                try:
+                    self.logger.debug("Executing: {0}".format(event.target))
+                    event.target(*event.args, **kwargs)
+                except Exception:
+                    self.logger.exception('Calling: {0}'.format(event.target))
+            with self._lock:
+                backlog = self._backlog.get(job)
+                if backlog:
+                    event, due, missed, options = backlog.popleft()
+                    continue
+                self._backlog.pop(job, None)
+                self._running[job] -= 1
+                if not self._running[job]:
+                    del self._running[job]
+                if not self._running:
+                    self._idle.notify_all()
+                event = None
+
+    def _wait_for_runs(self, timeout=None):
+        """ Wait for the runs handed to the executor to be done """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._running, timeout)
+
+    def _wait_time(self, now):
+        """ Time to wait for the next event to be due, from time now """
+        next_time = self._queue.next_time()
+        if next_time is None:
+            # amount of time recommended to wait before trying again
+            return None if self._tickless else self._sched_resolution
+        # events are in the future, recommend time to wait before trying
+        # again
+        wait = max(next_time - now, 0)
+        return wait if self._tickless else min(wait, self._sched_resolution)
+
+    def jump_ahead(self, seconds, catch_up=None):
         """ Simulate a jump forward in time
 
         This will update the scheduler's offset a certain number of seconds
@@ -250,17 +549,70 @@ class SynchronousSchedulerRunner(Runner):
 
         Args:
             seconds (float): How many seconds to simulate passing in time.
+            catch_up (CatchUpPolicy): catch up policy of every repeating job
+                for this jump, instead of their own
 
         Raises:
             ValueError: If seconds is negative - can't go back in time
+            TimeoutError: If the runs started on the executor are not done
+                within the jump timeout
         """
         if float(seconds) < 0:
             raise ValueError("Cannot jump backwards in time")
 
-        self.offset += seconds
+        with self._execution_lock:
+            self.offset += seconds
+            self._jumped_to = self._get_time()
+            self._catch_up = catch_up
+            try:
+                # have scheduler execute tasks that might be ready after
+                # this jump
+                self._execute_pending_tasks()
+            finally:
+                self._catch_up = None
+        self._after_jump()
+
+    def fast_forward(self, seconds, catch_up=None):
+        """ Simulate time passing, one due event after the other
+
+        Unlike jump_ahead, time is moved straight to each event due within
+        `seconds` as it is executed, so jobs see the time they were due at
+        and jobs they schedule fire within the same call when due in time.
+
+        Args:
+            seconds (float): How many seconds to simulate passing in time.
+            catch_up (CatchUpPolicy): catch up policy of every repeating job
+                for this call, instead of their own
+
+        Raises:
+            ValueError: If seconds is negative - can't go back in time
+            TimeoutError: If the runs started on the executor are not done
+                within the jump timeout
+        """
+        if float(seconds) < 0:
+            raise ValueError("Cannot jump backwards in time")
 
-        # have scheduler execute tasks that might be ready after this jump
-        self._execute_pending_tasks()
+        with self._execution_lock:
+            end_offset = self.offset + seconds
+            self._catch_up = catch_up
+            try:
+                self._execute_pending_tasks(end_offset)
+            finally:
+                self._catch_up = None
+                self.offset = max(self.offset, end_offset)
+                self._jumped_to = self._get_time()
+        self._after_jump()
+
+    def _after_jump(self):
+        # the thread's wait was computed before the jump
+        self._sleep_interrupt_event.set()
+        if self._executor is not None and \
+                not self._wait_for_runs(self._jump_timeout):
+            with self._lock:
+                jobs = sorted(self._running)
+            raise TimeoutError(
+                "Runs of jobs {} are not done after {}s".format(
+                    jobs, self._jump_timeout))
 
     def _get_time(self):
         """ Time retrieval method to use when comparing against event time
@@ -269,5 +621,30 @@ class SynchronousSchedulerRunner(Runner):
         # This clock is not affected by system clock updates
         return monotonic() + self.offset
 
-# Singleton reference to a scheduler
-SyncScheduler = SynchronousSchedulerRunner()
+
+class SchedulerReference(object):
+
+    """ Stands for the scheduler in use, forwarding attributes to it
+
+    Each scheduler module creates its own SynchronousSchedulerRunner and
+    makes it the one in use while it is initialized, so that state never
+    leaks from one test to the next; jobs and tests keep reaching it
+    through SyncScheduler.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "current", SynchronousSchedulerRunner())
+
+    def use(self, scheduler):
+        """ Make scheduler the one in use """
+        object.__setattr__(self, "current", scheduler)
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.current, name, value)
+
+
+# Reference to the scheduler in use
+SyncScheduler = SchedulerReference()
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+from nio.testing.test_case import NIOTestCase
+
+from ..module import SynchronousSchedulerModule
+from ..scheduler import CatchUpPolicy, SyncScheduler
+
+
+class TestCatchUp(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+
+    def _callback(self, **kwargs):
+        self.calls.append((SyncScheduler._get_time(), kwargs))
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return SynchronousSchedulerModule()
+
+    def test_catch_up_once(self):
+        """ Missed runs are coalesced into one """
+        job = SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=1), True)
+        SyncScheduler.configure_job(job, catch_up=CatchUpPolicy.once)
+        SyncScheduler.jump_ahead(10.5)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(SyncScheduler.stats()["caught_up"], 9)
+        # back on schedule afterwards
+        SyncScheduler.jump_ahead(1)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_catch_up_count(self):
+        """ The coalesced run is told how many runs it missed """
+        job = SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=1), True)
+        SyncScheduler.configure_job(job, catch_up=CatchUpPolicy.count)
+        SyncScheduler.jump_ahead(3.5)
+        SyncScheduler.jump_ahead(1)
+        self.assertEqual([kwargs for _, kwargs in self.calls],
+                         [{"missed_runs": 2}, {"missed_runs": 0}])
+
+    def test_jump_catch_up_override(self):
+        """ A jump can coalesce the runs of every job """
+        for seconds in (1, 2):
+            SyncScheduler.schedule_task(
+                self._callback, timedelta(seconds=seconds), True)
+        SyncScheduler.jump_ahead(86400, catch_up=CatchUpPolicy.once)
+        self.assertEqual(len(self.calls), 2)
+        # jobs keep their own policy afterwards
+        SyncScheduler.jump_ahead(4)
+        self.assertEqual(len(self.calls), 2 + 4 + 2)
+
+    def test_fast_forward(self):
+        """ Jobs run at the time they were due """
+        start = SyncScheduler._get_time()
+
+        def _chain():
+            self._callback()
+            SyncScheduler.schedule_task(
+                self._callback, timedelta(seconds=0.5), False)
+
+        SyncScheduler.schedule_task(_chain, timedelta(seconds=2), True)
+        SyncScheduler.fast_forward(5)
+        times = [time - start for time, _ in self.calls]
+        self.assertEqual(len(times), 4)
+        for time, expected in zip(times, (2, 2.5, 4, 4.5)):
+            self.assertAlmostEqual(time, expected, delta=0.05)
+        self.assertGreaterEqual(SyncScheduler._get_time() - start, 5)
+
+    def test_fast_forward_catch_up(self):
+        """ Fast forwarding with catch up runs the last missed interval """
+        start = SyncScheduler._get_time()
+        SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=1), True)
+        SyncScheduler.fast_forward(10.5, catch_up=CatchUpPolicy.once)
+        self.assertEqual(len(self.calls), 1)
+        self.assertAlmostEqual(self.calls[0][0] - start, 10, delta=0.05)
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from threading import Event
+from time import sleep
+
+from nio.testing.test_case import NIOTestCase
+
+from ..module import SynchronousSchedulerModule
+from ..scheduler import OverlapPolicy, SyncScheduler
+
+
+class ExecutorSchedulerModule(SynchronousSchedulerModule):
+
+    executor_workers = 2
+
+
+class TestExecutor(NIOTestCase):
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return ExecutorSchedulerModule()
+
+    def test_slow_job_does_not_delay_others(self):
+        """ A job runs on time while a slow one is still running """
+        slow_done = Event()
+        fast_done = Event()
+
+        def _slow():
+            sleep(0.3)
+            slow_done.set()
+
+        SyncScheduler.schedule_task(_slow, timedelta(seconds=0.01), False)
+        SyncScheduler.schedule_task(
+            fast_done.set, timedelta(seconds=0.05), False)
+        self.assertTrue(fast_done.wait(0.2))
+        self.assertFalse(slow_done.is_set())
+        self.assertTrue(slow_done.wait(1))
+
+    def test_queued_runs(self):
+        """ Overlapping runs of a job are queued and run in order """
+        runs = []
+        SyncScheduler.schedule_task(
+            lambda: runs.append(len(runs)), timedelta(seconds=1), True)
+        SyncScheduler.jump_ahead(5.5)
+        self.assertEqual(runs, [0, 1, 2, 3, 4])
+
+    def test_skipped_runs(self):
+        """ Runs due while the previous one is running can be skipped """
+        job = SyncScheduler.schedule_task(
+            sleep, timedelta(seconds=0.02), True, 0.15)
+        SyncScheduler.configure_job(job, overlap=OverlapPolicy.skip)
+        sleep(0.4)
+        SyncScheduler.unschedule(job)
+        stats = SyncScheduler.stats()
+        self.assertGreater(stats["skipped"], 0)
+        self.assertLessEqual(stats["runs"], 3)
+
+
+class TestLateness(NIOTestCase):
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return SynchronousSchedulerModule()
+
+    def test_late_runs_are_dropped(self):
+        """ Runs starting past their lateness budget are dropped """
+        ran = []
+        SyncScheduler.schedule_task(
+            sleep, timedelta(seconds=0.9), False, 0.2)
+        job = SyncScheduler.schedule_task(
+            lambda: ran.append(True), timedelta(seconds=1), False)
+        SyncScheduler.configure_job(job, max_lateness=0.05)
+        SyncScheduler.jump_ahead(1)
+        self.assertEqual(ran, [])
+        self.assertEqual(SyncScheduler.stats()["late"], 1)
+
+    def test_jumped_runs_are_not_late(self):
+        """ Runs due during a jump_ahead are due when the jump ends """
+        job = SyncScheduler.schedule_task(
+            lambda: None, timedelta(seconds=1), True)
+        SyncScheduler.configure_job(job, max_lateness=0.05)
+        SyncScheduler.jump_ahead(10)
+        self.assertEqual(SyncScheduler.stats(),
+                         dict(runs=10, skipped=0, late=0, caught_up=0))
+
+
+class TimedOutSchedulerModule(ExecutorSchedulerModule):
+
+    jump_timeout = 0.1
+
+
+class TestJumpTimeout(NIOTestCase):
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return TimedOutSchedulerModule()
+
+    def test_jump_times_out(self):
+        """ Jumps stop waiting for runs that are not done in time """
+        release = Event()
+        SyncScheduler.schedule_task(
+            release.wait, timedelta(seconds=1), False, 5)
+        with self.assertRaises(TimeoutError):
+            SyncScheduler.jump_ahead(1)
+        release.set()
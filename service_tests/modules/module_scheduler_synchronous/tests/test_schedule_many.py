@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from nio.testing.test_case import NIOTestCase
+
+from ..module import SynchronousSchedulerModule
+from ..scheduler import SyncScheduler
+
+
+class TestScheduleMany(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+
+    def _callback(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return SynchronousSchedulerModule()
+
+    def test_schedule_many(self):
+        """ A batch of tasks is scheduled in one call """
+        first = SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=3), False, "single")
+        jobs = SyncScheduler.schedule_many(
+            [(self._callback, timedelta(seconds=seconds), False, (seconds,))
+             for seconds in (2, 1, 4)] +
+            [(self._callback, timedelta(seconds=1), True, (), {"a": 1})])
+        self.assertEqual(len(set(jobs + [first])), 5)
+        self.assertTrue(SyncScheduler.unschedule(jobs[2]))
+
+        SyncScheduler.jump_ahead(5)
+        self.assertEqual([args for args, _ in self.calls if args],
+                         [(1,), (2,), ("single",)])
+        self.assertEqual(self.calls.count(((), {"a": 1})), 5)
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from nio.testing.test_case import NIOTestCase
+
+from ..module import SynchronousSchedulerModule
+from ..scheduler import SyncScheduler, SynchronousSchedulerRunner
+
+
+class TestSchedulerReference(NIOTestCase):
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return SynchronousSchedulerModule()
+
+    def test_module_scheduler_in_use(self):
+        """ SyncScheduler forwards to the scheduler of the module """
+        module = next(iter(self._modules_mapping))
+        self.assertIs(SyncScheduler.current, module.scheduler)
+        job = SyncScheduler.schedule_task(
+            lambda: None, timedelta(seconds=1), False)
+        self.assertIn(job, module.scheduler._events)
+        SyncScheduler.offset = 5
+        self.assertEqual(module.scheduler.offset, 5)
+
+    def test_scheduler_per_module(self):
+        """ Jobs of a previous module's scheduler never run """
+        calls = []
+        SyncScheduler.schedule_task(
+            lambda: calls.append("previous"), timedelta(seconds=1), False)
+        previous = SyncScheduler.current
+        self.tearDownModules()
+        self.setupModules()
+        self.assertIsNot(SyncScheduler.current, previous)
+        self.assertIsInstance(SyncScheduler.current,
+                              SynchronousSchedulerRunner)
+        SyncScheduler.schedule_task(
+            lambda: calls.append("current"), timedelta(seconds=1), False)
+        SyncScheduler.jump_ahead(2)
+        self.assertEqual(calls, ["current"])
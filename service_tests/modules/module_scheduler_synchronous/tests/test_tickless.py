@@ -0,0 +1,48 @@
+from datetime import timedelta
+from threading import Event
+
+from nio.testing.test_case import NIOTestCase
+
+from ..module import SynchronousSchedulerModule
+from ..scheduler import SyncScheduler
+from .test_unschedule import TestUnschedule
+
+
+class TicklessSchedulerModule(SynchronousSchedulerModule):
+
+    tickless = True
+
+
+class TestTickless(NIOTestCase):
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return TicklessSchedulerModule()
+
+    def test_idle_wait(self):
+        """ With nothing scheduled the thread waits until woken up """
+        self.assertIsNone(SyncScheduler._execute_pending_tasks())
+        job = SyncScheduler.schedule_task(
+            lambda: None, timedelta(seconds=60), False)
+        # not capped by the resolution
+        self.assertGreater(SyncScheduler._execute_pending_tasks(), 59)
+        SyncScheduler.unschedule(job)
+
+    def test_earlier_job_wakes_thread(self):
+        """ A job due before the thread wakes up runs on time """
+        fired = Event()
+        SyncScheduler.schedule_task(
+            lambda: None, timedelta(seconds=60), False)
+        SyncScheduler.schedule_task(
+            fired.set, timedelta(seconds=0.05), False)
+        self.assertTrue(fired.wait(1))
+
+
+class TestTicklessUnschedule(TestUnschedule):
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return TicklessSchedulerModule()
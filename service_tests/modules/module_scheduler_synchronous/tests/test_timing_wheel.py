@@ -0,0 +1,108 @@
+import random
+from datetime import timedelta
+
+from nio.testing.test_case import NIOTestCase
+
+from ..module import SynchronousSchedulerModule
+from ..queues import HeapQueue, QueueBackend, TimingWheelQueue
+from ..scheduler import QueueEvent, SyncScheduler
+from .test_unschedule import TestUnschedule
+
+
+def _event(time, id):
+    return QueueEvent(time, id, None, 0, (), {})
+
+
+class TestTimingWheelQueue(NIOTestCase):
+
+    def _drain(self, queue, until, step):
+        """ Pop due events as time goes by, the way the scheduler does """
+        popped = []
+        now = 0
+        while now <= until:
+            event = queue.first(now)
+            while event is not None:
+                popped.append(queue.pop().id)
+                event = queue.first(now)
+            now += step
+        return popped
+
+    def test_same_order_as_heap(self):
+        """ The wheel hands events over in the same order as the heap """
+        wheel = TimingWheelQueue(0.01)
+        heap = HeapQueue(0.01)
+        wheel.reset(0)
+        heap.reset(0)
+        rng = random.Random(1)
+        # spread events over all levels of the wheel
+        for id in range(2000):
+            time = rng.choice((rng.uniform(0, 2), rng.uniform(0, 600),
+                               rng.uniform(0, 2e5)))
+            wheel.push(_event(time, id))
+            heap.push(_event(time, id))
+        self.assertEqual(len(wheel), 2000)
+        self.assertEqual(self._drain(wheel, 2e5, 1.5),
+                         self._drain(heap, 2e5, 1.5))
+        self.assertEqual(len(wheel), 0)
+        self.assertIsNone(wheel.next_time())
+
+    def test_events_beyond_last_level(self):
+        """ Events past the wheel's range wait in the overflow heap """
+        wheel = TimingWheelQueue(1)
+        wheel.reset(0)
+        wheel.push(_event(2 ** 33, 1))
+        wheel.push(_event(5, 2))
+        self.assertEqual(wheel.first(10).id, 2)
+        wheel.pop()
+        self.assertIsNone(wheel.first(2 ** 33 - 1))
+        self.assertEqual(wheel.first(2 ** 33).id, 1)
+
+    def test_next_time(self):
+        """ next_time never reports a time after the next event """
+        wheel = TimingWheelQueue(0.01)
+        wheel.reset(0)
+        wheel.push(_event(12.345, 1))
+        self.assertLessEqual(wheel.next_time(), 12.345)
+        self.assertIsNone(wheel.first(12.34))
+        self.assertEqual(wheel.next_time(), 12.345)
+        self.assertEqual(wheel.first(12.345).id, 1)
+
+    def test_compact_keeps_current_tick(self):
+        """ Compacting never moves the wheel back a tick """
+        wheel = TimingWheelQueue(0.01)
+        # 29 * 0.01 / 0.01 rounds down to tick 28
+        wheel.reset(0.29 + 1e-9)
+        self.assertEqual(wheel._current, 29)
+        wheel.push(_event(0.5, 1))
+        wheel.push(_event(0.6, 2))
+        wheel.compact(lambda event: event.id == 2)
+        self.assertEqual(wheel._current, 29)
+        self.assertEqual(len(wheel), 1)
+        self.assertEqual(wheel.first(0.6).id, 2)
+
+
+class TimingWheelSchedulerModule(SynchronousSchedulerModule):
+
+    queue_backend = QueueBackend.timing_wheel
+
+
+class TestTimingWheelScheduler(TestUnschedule):
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return TimingWheelSchedulerModule()
+
+    def test_uses_timing_wheel(self):
+        self.assertIsInstance(SyncScheduler._queue, TimingWheelQueue)
+
+    def test_jump_repeatable(self):
+        """ Repeating jobs fire once per interval jumped over """
+        SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=5), True)
+        SyncScheduler.jump_ahead(6)
+        self.assertEqual(self.times_called, 1)
+        SyncScheduler.jump_ahead(15)
+        self.assertEqual(self.times_called, 4)
+        # a day ahead
+        SyncScheduler.jump_ahead(86400)
+        self.assertEqual(self.times_called, 4 + 86400 // 5)
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from nio.testing.test_case import NIOTestCase
+
+from ..module import SynchronousSchedulerModule
+from ..scheduler import SyncScheduler
+
+
+class TestUnschedule(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.times_called = 0
+
+    def _callback(self):
+        self.times_called += 1
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return SynchronousSchedulerModule()
+
+    def test_cancelled_jobs_do_not_run(self):
+        """ Cancelled jobs are skipped while the others still run """
+        kept = SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=5), True)
+        cancelled = SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=1), True)
+        self.assertTrue(SyncScheduler.unschedule(cancelled))
+        # cancelling twice has no effect
+        self.assertFalse(SyncScheduler.unschedule(cancelled))
+
+        SyncScheduler.jump_ahead(6)
+        self.assertEqual(self.times_called, 1)
+        SyncScheduler.jump_ahead(5)
+        self.assertEqual(self.times_called, 2)
+        self.assertTrue(SyncScheduler.unschedule(kept))
+        SyncScheduler.jump_ahead(5)
+        self.assertEqual(self.times_called, 2)
+
+    def test_reschedule_after_cancel(self):
+        """ A job can be cancelled and scheduled again, like Sleep does """
+        for _ in range(10):
+            job = SyncScheduler.schedule_task(
+                self._callback, timedelta(seconds=1), False)
+            SyncScheduler.unschedule(job)
+        SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=1), False)
+        SyncScheduler.jump_ahead(2)
+        self.assertEqual(self.times_called, 1)
+
+    def test_tombstones_are_compacted(self):
+        """ The queue drops cancelled events past the threshold """
+        SyncScheduler._compaction_threshold = 10
+        jobs = [SyncScheduler.schedule_task(
+            self._callback, timedelta(seconds=60), False)
+            for _ in range(30)]
+        for job in jobs[:20]:
+            SyncScheduler.unschedule(job)
+        # compacted once tombstones outnumbered the live events
+        self.assertLess(len(SyncScheduler._queue), 30)
+        self.assertEqual(len(SyncScheduler._events), 10)
+
+        SyncScheduler.jump_ahead(61)
+        self.assertEqual(self.times_called, 10)
+        self.assertEqual(len(SyncScheduler._queue), 0)
+
+    def test_running_job_cancelling_itself(self):
+        """ A job cancelled while it runs leaves no tombstone """
+        jobs = []
+
+        def _cancel():
+            self._callback()
+            SyncScheduler.unschedule(jobs[0])
+
+        jobs.append(SyncScheduler.schedule_task(
+            _cancel, timedelta(seconds=1), True))
+        SyncScheduler.jump_ahead(5)
+        self.assertEqual(self.times_called, 1)
+        self.assertEqual(SyncScheduler._tombstones, 0)
+        self.assertEqual(len(SyncScheduler._queue), 0)
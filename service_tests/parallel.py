@@ -0,0 +1,155 @@
+""" Run service tests in parallel, spreading test classes over processes
+
+    python -m service_tests.parallel tests -j 4
+
+Tests are discovered as unittest discovers them, from the project root,
+the packages under a directory that is not one, as service_tests/modules,
+are discovered each in turn.
+Each worker process runs whole test classes, one at a time, so that a
+class's setUpClass and tearDownClass run once and its tests share a
+process; tests of different classes run concurrently. The output of each
+class is printed once it is done, followed by a summary, and the exit
+status is 1 when a test failed.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import unittest
+from collections import OrderedDict
+from time import perf_counter
+
+
+def _test_ids(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _test_ids(test)
+        else:
+            yield test.id()
+
+
+def group_by_class(suite):
+    """ Ids of the tests of a suite by test class, largest class first
+
+    Returns:
+        OrderedDict: class id -> list of test ids
+    """
+    classes = OrderedDict()
+    for test_id in _test_ids(suite):
+        classes.setdefault(test_id.rpartition(".")[0], []).append(test_id)
+    return OrderedDict(sorted(classes.items(),
+                              key=lambda item: -len(item[1])))
+
+
+def discover(start_dir, pattern="test*.py", top_level_dir=None):
+    """ Tests in start_dir, as unittest discovers them
+
+    A start_dir that is not a package, as a namespace package, has the
+    directories under it discovered each in turn.
+
+    Returns:
+        unittest.TestSuite: tests discovered
+    """
+    loader = unittest.defaultTestLoader
+    top_level_dir = os.path.abspath(top_level_dir or os.getcwd())
+    start_dir = os.path.abspath(start_dir)
+    if start_dir == top_level_dir or \
+            os.path.isfile(os.path.join(start_dir, "__init__.py")):
+        return loader.discover(start_dir, pattern, top_level_dir)
+    suite = unittest.TestSuite()
+    for entry in sorted(os.scandir(start_dir), key=lambda entry: entry.name):
+        if entry.is_dir() and entry.name.isidentifier():
+            suite.addTests(discover(entry.path, pattern, top_level_dir))
+    return suite
+
+
+def _init_worker(top_level_dir):
+    if top_level_dir not in sys.path:
+        sys.path.insert(0, top_level_dir)
+
+
+def run_class(test_ids, verbosity=1):
+    """ Run the tests of a class, in a worker process
+
+    Returns:
+        dict: number of tests run, failed, errored and skipped, the runner
+            output and the seconds taken
+    """
+    stream = io.StringIO()
+    suite = unittest.defaultTestLoader.loadTestsFromNames(test_ids)
+    start = perf_counter()
+    result = unittest.TextTestRunner(
+        stream=stream, verbosity=verbosity, buffer=True).run(suite)
+    return dict(run=result.testsRun, failures=len(result.failures),
+                errors=len(result.errors), skipped=len(result.skipped),
+                output=stream.getvalue(), seconds=perf_counter() - start)
+
+
+def _run_class(task):
+    class_id, test_ids, verbosity = task
+    return class_id, run_class(test_ids, verbosity)
+
+
+def run(start_dir, jobs=None, pattern="test*.py", top_level_dir=None,
+        verbosity=1, stream=sys.stdout):
+    """ Discover the tests in start_dir and run their classes in parallel
+
+    Args:
+        start_dir (str): directory to discover tests in
+        jobs (int): worker processes, one per cpu by default
+        pattern (str): pattern of the test files
+        top_level_dir (str): directory tests are imported from, the
+            current directory by default
+        verbosity (int): verbosity of the output of each class
+        stream: where the output goes
+
+    Returns:
+        dict: total number of tests run, failed, errored and skipped
+    """
+    top_level_dir = os.path.abspath(top_level_dir or os.getcwd())
+    _init_worker(top_level_dir)
+    suite = discover(start_dir, pattern, top_level_dir)
+    classes = group_by_class(suite)
+    totals = dict(run=0, failures=0, errors=0, skipped=0)
+    jobs = max(min(jobs or os.cpu_count() or 1, len(classes)), 1)
+    start = perf_counter()
+    # spawned workers, as nio tests set, start without inherited threads
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(jobs, _init_worker, (top_level_dir,)) as pool:
+        results = pool.imap_unordered(_run_class, [
+            (class_id, ids, verbosity) for class_id, ids in classes.items()])
+        for class_id, result in results:
+            stream.write("{} ({:.2f}s)\n{}".format(
+                class_id, result["seconds"], result["output"]))
+            for key in totals:
+                totals[key] += result[key]
+    stream.write("Ran {run} tests in {classes} classes over {jobs} "
+                 "processes in {seconds:.2f}s: {failures} failures, "
+                 "{errors} errors, {skipped} skipped\n".format(
+                     classes=len(classes), jobs=jobs,
+                     seconds=perf_counter() - start, **totals))
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m service_tests.parallel",
+        description="Run service tests, test classes in parallel")
+    parser.add_argument("start_dir", nargs="?", default="tests")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="worker processes, one per cpu by default")
+    parser.add_argument("-p", "--pattern", default="test*.py")
+    parser.add_argument("-t", "--top-level-dir",
+                        help="directory tests are imported from, the "
+                             "current directory by default")
+    parser.add_argument("-v", "--verbose", action="store_const", const=2,
+                        default=1, dest="verbosity")
+    args = parser.parse_args(argv)
+    totals = run(args.start_dir, args.jobs, args.pattern,
+                 args.top_level_dir, args.verbosity)
+    return 1 if totals["failures"] or totals["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
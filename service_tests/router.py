@@ -1,74 +1,175 @@
 from collections import defaultdict
-from copy import copy, deepcopy
 from threading import Event
+from time import perf_counter, thread_time
 
 from nio.router.base import BlockRouter
+from nio.util.logging import get_nio_logger
 from nio.util.threading import spawn
 
+from .fan_out import ISOLATION, SignalIsolation
+from .waiters import AsyncWaiters
+
+DEFAULT_TERMINAL = "__default_terminal_value"
+
 
 class ServiceTestRouter(BlockRouter):
 
-    def __init__(self, synchronous):
+    def __init__(self, synchronous,
+                 signal_isolation=SignalIsolation.copy_on_write,
+                 dispatcher=None, instrumentation=None, coalescer=None):
+        """ Router delivering signals between the blocks of a tested service
+
+        Args:
+            synchronous (bool): deliver signals from the notifying thread
+            signal_isolation (SignalIsolation): how receivers are isolated
+                from each other's changes to the signals
+            dispatcher (MailboxDispatcher): when not synchronous, deliver
+                signals from this dispatcher's worker pool instead of
+                spawning a thread per receiver
+            instrumentation (RouterInstrumentation): when given, record
+                hops and block processing times into it
+            coalescer (SignalCoalescer): when given, batch the signals
+                sent to each block input before delivering them
+        """
         super().__init__()
         self._execution = []
         self._synchronous = synchronous
+        self._isolate = ISOLATION[signal_isolation]
+        self._dispatcher = dispatcher
+        self.instrumentation = instrumentation
+        self._coalescer = coalescer
+        if coalescer is not None:
+            coalescer.bind(self._deliver)
+        self.logger = get_nio_logger("ServiceTestRouter")
         self._blocks = {}
+        # sender block -> {output_id: [(receiver name, block, input_id)]}
+        self._routes = {}
         self._processed_signals = defaultdict(list)
         self.processed_signals_input = \
             defaultdict(lambda: defaultdict(list))
+        # lets coroutines wait for blocks to process signals
+        self.processed_waiters = AsyncWaiters()
 
     def configure(self, context):
         self._execution = context.execution
         self._blocks = context.blocks
+        self._routes = self._build_routes(context.execution, context.blocks)
         self._setup_processed()
 
+    @staticmethod
+    def _build_routes(execution, blocks):
+        """Compile the service execution into a routing table.
+
+        Execution entries and receivers may reference blocks by "name" or by
+        "id", blocks being keyed by the names the service gives them, so
+        that every reference points straight at the block object receiving
+        the signals.
+
+        Returns:
+            dict: sender block -> {output_id: [(receiver name, receiver
+                block, input_id)]}, input_id being None for the default
+                terminal.
+        """
+        def resolve(entry):
+            block_name = entry.get("name", entry.get("id"))
+            return block_name, blocks.get(block_name)
+
+        routes = {}
+        for entry in execution:
+            _, from_block = resolve(entry)
+            if from_block is None:
+                continue
+            outputs = {}
+            for output_id, receivers in (entry.get("receivers") or {}).items():
+                outputs[output_id] = []
+                for receiver in receivers:
+                    receiver_name, to_block = resolve(receiver)
+                    if to_block is None:
+                        continue
+                    input_id = receiver.get("input", DEFAULT_TERMINAL)
+                    outputs[output_id].append((
+                        receiver_name, to_block,
+                        None if input_id == DEFAULT_TERMINAL else input_id))
+            if outputs:
+                routes[from_block] = outputs
+        return routes
+
     def notify_signals(self, block, signals, output_id):
         if not signals:
-            print("Block {} notified an empty signal list".format(block))
+            self.logger.debug(
+                "Block {} notified an empty signal list".format(block))
             return
-        from_block_name = block.name()
-        all_receivers = [block["receivers"] for block in self._execution
-                         if block["name"] == from_block_name][0]
-        if not all_receivers:
+        outputs = self._routes.get(block)
+        if not outputs:
             return
         # If output_id isn't in receivers, then use default output
-        receivers = all_receivers.get(
-            output_id, all_receivers.get("__default_terminal_value", []))
-        for receiver in receivers:
-            receiver_name = receiver["name"]
-            input_id = receiver["input"]
-            to_block = self._blocks[receiver_name]
-            print("{} -> {}".format(from_block_name, receiver_name))
-            try:
-                cloned_signals = deepcopy(signals)
-            except:
-                cloned_signals = copy(signals)
-            if input_id == "__default_terminal_value":
-                # don't include input_id if it's default terminal
-                if self._synchronous:
-                    to_block.process_signals(cloned_signals)
-                else:
-                    spawn(to_block.process_signals, cloned_signals)
+        receivers = outputs.get(output_id)
+        if receivers is None:
+            receivers = outputs.get(DEFAULT_TERMINAL, ())
+        instrumentation = self.instrumentation
+        isolated = self._isolate(signals, len(receivers))
+        for (receiver_name, to_block, input_id), receiver_signals in zip(
+                receivers, isolated):
+            if instrumentation is not None:
+                instrumentation.record_hop(
+                    block.name(), receiver_name, input_id, len(signals))
+            if self._coalescer is not None:
+                self._coalescer.add(to_block, receiver_signals, input_id)
             else:
-                if self._synchronous:
-                    to_block.process_signals(cloned_signals, input_id)
-                else:
-                    spawn(to_block.process_signals, cloned_signals, input_id)
+                self._deliver(to_block, receiver_signals, input_id)
+
+    def _deliver(self, to_block, signals, input_id):
+        # don't include input_id if it's default terminal
+        args = (signals,) if input_id is None else (signals, input_id)
+        if self._synchronous:
+            to_block.process_signals(*args)
+        elif self._dispatcher is not None:
+            self._dispatcher.dispatch(to_block, signals, input_id)
+        else:
+            spawn(to_block.process_signals, *args)
+
+    def start(self):
+        if self._dispatcher is not None:
+            self._dispatcher.start()
+
+    def stop(self):
+        if self._coalescer is not None:
+            self._coalescer.stop()
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
+
+    def flush(self):
+        """ Deliver the signals held by the coalescer right away """
+        if self._coalescer is not None:
+            self._coalescer.flush()
 
     def _processed_signals_set(self, block_name):
         self._blocks[block_name]._processed_event.set()
         self._blocks[block_name]._processed_event.clear()
+        self.processed_waiters.notify()
 
     def _call_processed(self, process_signals, block_name):
         """function wrapper for calling a block's _processed_signals after
         its process_signals.
         """
+        instrumentation = self.instrumentation
+
         def process_wrapper(*args, **kwargs):
+            input_id = args[1] if len(args) > 1 else None
+            if instrumentation is not None:
+                wall_start, cpu_start = perf_counter(), thread_time()
             try:
-                input_id = args[1] if len(args) > 1 else None
                 process_signals(*args, **kwargs)
+                error = None
             except Exception as e:
-                print("Exception in block {}: {}".format(block_name, e))
+                error = e
+            if instrumentation is not None:
+                instrumentation.record_process(
+                    block_name, perf_counter() - wall_start,
+                    thread_time() - cpu_start, error is not None)
+            if error is not None:
+                self.logger.error(
+                    "Exception in block {}".format(block_name), exc_info=error)
             self._processed_signals[block_name].extend(args[0])
             self.processed_signals_input[block_name][input_id].extend(args[0])
             self._processed_signals_set(block_name)
@@ -1,11 +1,9 @@
-import json
-import jsonschema
 import os
-import re
 import sys
 from threading import Event
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+from jsonschema import SchemaError
 from nio.block.base import Base
 from nio.block.context import BlockContext
 from nio.modules.communication.publisher import Publisher
@@ -15,18 +13,24 @@ from nio.testing.test_case import NIOTestCase
 from nio.router.context import RouterContext
 from nio.util.discovery import is_class_discoverable as _is_class_discoverable
 from nio.util.runner import RunnerStatus
-from niocore.core.loader.discover import Discover
 
+from .async_router import AsyncServiceTestRouter
+from .block_registry import block_classes
+from .coalesce import SignalCoalescer
+from .dispatch import MailboxDispatcher, QueueFullPolicy
+from .env_vars import substitution
+from .fan_out import SignalIsolation
+from .instrumentation import RouterInstrumentation
 from .router import ServiceTestRouter
+from .signal_index import SignalIndex, count_expected, diff, unexpected
+from .topic_schema import TopicValidators, compile_topic_schema
+from .waiters import AsyncWaiters
 from .modules.module_persistence_file.module import FilePersistenceModule
 from .modules.module_persistence_file.persistence import Persistence
 from .modules.module_scheduler_synchronous.module import \
     SynchronousSchedulerModule
 from .modules.module_scheduler_synchronous.scheduler import SyncScheduler
 
-Persistence.save = MagicMock()
-Persistence.save_collection = MagicMock()
-
 
 def is_class_discoverable(_class, default_discoverability=True):
     return _is_class_discoverable(_class, default_discoverability)
@@ -49,33 +53,96 @@ class NioServiceTestCase(NIOTestCase):
         * Mock blocks with `mock_blocks` by mapping block names to mocked
             process_signals method for that block.
         * Test by notifying signals from a block with `notify_signals`
+        * Set `signal_isolation` to `SignalIsolation.strict` to hand every
+            receiver its own deep copy of the notified signals
+        * When not synchronous, set `dispatch_workers` to deliver signals
+            from a bounded pool of workers instead of a thread per hop
+        * Set `use_asyncio` to deliver signals from a single event loop, and
+            await `async_wait_for_published_signals` and
+            `async_wait_for_processed_signals` in tests
+        * Set `instrument_router` to record signal counts and processing
+            times, and get them from `router_stats`
+        * Set `coalesce_window` and/or `coalesce_size` to batch the signals
+            sent to each block input into a single process_signals call
     """
 
     service_name = None
     auto_start = True
     synchronous = True
+    signal_isolation = SignalIsolation.copy_on_write
+    # asynchronous delivery, a thread is spawned per hop when not set
+    dispatch_workers = None
+    dispatch_queue_depth = 100
+    dispatch_full_policy = QueueFullPolicy.block
+    # deliver signals from an asyncio event loop
+    use_asyncio = False
+    # names of blocks to run off the event loop, see AsyncServiceTestRouter
+    blocking_blocks = []
+    # record per edge and per block statistics in the router
+    instrument_router = False
+    # number of recent hops kept by the router instrumentation
+    router_trace_size = 100
+    # batch signals per block input for this many seconds
+    coalesce_window = None
+    # or until this many signals are batched
+    coalesce_size = None
+    # validate 1 in N signals of the topics matching a pattern, as in
+    # fnmatch, e.g. {"dni.client_stats.*": 10}
+    schema_sampling = {}
 
     def __init__(self, methodName='runTests'):
         super().__init__(methodName)
         self._blocks = {}
-        self._router = ServiceTestRouter(self.synchronous)
-        # Set this Scheduler object to be used in tests for jump_ahead
-        self._scheduler = SyncScheduler if self.synchronous else None
+        instrumentation = RouterInstrumentation(self.router_trace_size) \
+            if self.instrument_router else None
+        coalescer = SignalCoalescer(self.coalesce_window, self.coalesce_size) \
+            if self.coalesce_window or self.coalesce_size else None
+        if self.use_asyncio:
+            self._router = AsyncServiceTestRouter(
+                signal_isolation=self.signal_isolation,
+                blocking_blocks=self.blocking_blocks,
+                instrumentation=instrumentation, coalescer=coalescer)
+        else:
+            dispatcher = None
+            if not self.synchronous and self.dispatch_workers:
+                dispatcher = MailboxDispatcher(
+                    workers=self.dispatch_workers,
+                    queue_depth=self.dispatch_queue_depth,
+                    full_policy=self.dispatch_full_policy)
+            self._router = ServiceTestRouter(
+                self.synchronous, signal_isolation=self.signal_isolation,
+                dispatcher=dispatcher, instrumentation=instrumentation,
+                coalescer=coalescer)
+        # Scheduler of this test, to be used in tests for jump_ahead, set
+        # once the scheduler module is initialized
+        self._scheduler = None
         # Subscribe to publishers in the service
         self._subscribers = {}
         # Capture published signals for assertions
         self.published_signals = []
+        # Index of the published signals, by topic
+        self._signal_index = SignalIndex()
         # Set an event when those publishers publish signals
         self._publisher_event = Event()
+        # Lets coroutines wait for published signals
+        self._published_waiters = AsyncWaiters()
         # Allow tests to publish signals to any subscriber
         self._publishers = {}
-        # Json schema for publisher and subscriber validation
-        self._schema = {}
+        # Json schema validators for publisher and subscriber validation
+        self._topic_validators = TopicValidators({})
 
     @property
     def processed_signals(self):
         return self._router._processed_signals
 
+    def router_stats(self):
+        """ Snapshot of the router instrumentation, see RouterInstrumentation
+
+        Returns None unless `instrument_router` is set.
+        """
+        if self._router.instrumentation is not None:
+            return self._router.instrumentation.snapshot()
+
     def publisher_topics(self):
         """Topics this service publishes to"""
         return []
@@ -99,6 +166,12 @@ class NioServiceTestCase(NIOTestCase):
         self._router.notify_signals(
             self._blocks[block_name], signals, terminal)
 
+    def flush_signals(self):
+        """deliver the signals batched by the router when coalescing,
+        without waiting for the coalescing window to end.
+        """
+        self._router.flush()
+
     def mock_blocks(self):
         """Optionally create a mocked block class instead of the real thing
         Return:
@@ -116,11 +189,24 @@ class NioServiceTestCase(NIOTestCase):
         return {}
 
     def setUp(self):
+        # Tests never save over the project configuration, patched for this
+        # test only before the persistence module is proxied
+        persistence_patch = patch.multiple(
+            Persistence, save=MagicMock(), save_collection=MagicMock())
+        persistence_patch.start()
+        self.addCleanup(persistence_patch.stop)
         super().setUp()
+        if self.synchronous:
+            self._scheduler = SyncScheduler.current
         self._invalid_topics = {}
+        self._env_var_substitution = substitution(self.env_vars())
         persistence = Persistence()
-        self.block_configs = persistence.load_collection("blocks")
-        self.service_configs = persistence.load_collection("services")
+        # Every load gets its own items, copied from the persistence parse
+        # cache, a test changing its configs changes no other test's
+        # configs of the blocks the service uses are the only ones decoded
+        # when served from a snapshot
+        self.block_configs = persistence.load_collection("blocks", {})
+        self.service_configs = persistence.load_collection("services", {})
         self.service_config = self.service_configs.get(self.service_name, {})
         self._setup_blocks()
         self._setup_pubsub()
@@ -156,7 +242,8 @@ class NioServiceTestCase(NIOTestCase):
 
     def _setup_blocks(self):
         # Instantiate and configure blocks
-        blocks = Discover.discover_classes('blocks', Base, is_class_discoverable)
+        blocks = block_classes('blocks', Base, is_class_discoverable)
+        mocks = self.mock_blocks()
         service_block_names = [service_block["name"] for service_block in
                                self.service_config.get("execution", [])]
         service_block_mappings = {}
@@ -173,68 +260,57 @@ class NioServiceTestCase(NIOTestCase):
                       .format(service_block_name))
                 continue
             # use mapping name for block
-            block_config["name"] = service_block_name
+            block_config = dict(block_config, name=service_block_name)
             # instantiate the block
-            block = self._init_block(block_config, blocks)
+            block = self._init_block(block_config, blocks, mocks)
             block_config = self._override_block_config(block_config)
-            block_config = self._replace_env_vars(block_config)
+            # this test's own copy, configured for the test
+            block_config = self.block_configs[mapping_name] = \
+                self._replace_env_vars(block_config)
             block.configure(BlockContext(
                 self._router, block_config, 'TestSuite', ''))
             self._blocks[service_block_name] = block
         # Configure router
-        self._router.configure(RouterContext(
+        router_context = RouterContext(
             execution=self.service_config.get("execution", []),
-            blocks=self._blocks))
+            blocks=self._blocks)
+        self._router.configure(router_context)
 
     def start(self):
         # Start blocks
         if self._router.status != RunnerStatus.started:
             self._router.status = RunnerStatus.starting
+            self._router.start()
             for block in self._blocks:
                 self._blocks[block].start()
             self._router.status = RunnerStatus.started
         else:
             print('Already started this service, cannot start again.')
 
-    def _init_block(self, block_config, blocks):
-        """create a mocked block for each block given in self.mock_blocks."""
-        if block_config["name"] in self.mock_blocks():
+    def _init_block(self, block_config, blocks, mocks=None):
+        """create a mocked block for each block given in self.mock_blocks.
+
+        blocks maps block type names to block classes, mocks is the result
+        of self.mock_blocks().
+        """
+        if mocks is None:
+            mocks = self.mock_blocks()
+        if block_config["name"] in mocks:
             block = MagicMock()
             block.name.return_value = block_config["name"]
-            block.process_signals.side_effect = \
-                self.mock_blocks()[block_config["name"]]
+            block.process_signals.side_effect = mocks[block_config["name"]]
+        elif block_config["type"] in blocks:
+            block = blocks[block_config["type"]]()
         else:
-            block = [block for block in blocks if
-                     block.__name__ == block_config["type"]][0]()
+            raise ValueError(
+                'Block "{}" is of type "{}", no block of that type was '
+                'discovered'.format(block_config["name"],
+                                    block_config["type"]))
         return block
 
     def _replace_env_vars(self, config):
-        """Return config with environment variables swapped out"""
-        for var in self.env_vars():
-            config = \
-                self._replace_env_var(config, var, self.env_vars()[var])
-        return config
-
-    def _replace_env_var(self, config, name, value):
-        for property in config:
-            if isinstance(config[property], str):
-                config[property] = re.sub("\[\[" + name + "\]\]",
-                                          str(value),
-                                          config[property])
-            elif isinstance(config[property], dict):
-                self._replace_env_var(config[property], name, value)
-            elif isinstance(config[property], list):
-                new_list = []
-                for item in config[property]:
-                    if isinstance(item, str):
-                        new_list.append(re.sub("\[\[" + name + "\]\]",
-                                               str(value),
-                                               item))
-                    elif isinstance(item, dict):
-                        new_list.append(
-                                self._replace_env_var(item, name, value))
-                config[property] = new_list
-        return config
+        """Return a copy of config with environment variables swapped out"""
+        return self._env_var_substitution.replace(config)
 
     def tearDown(self):
         # Tear down publishers and subscribers for tests
@@ -244,6 +320,7 @@ class NioServiceTestCase(NIOTestCase):
             self._blocks[block].stop()
 
         # set runner status
+        self._router.stop()
         self._router.status = RunnerStatus.stopped
 
         super().tearDown()
@@ -278,9 +355,10 @@ class NioServiceTestCase(NIOTestCase):
     def _published_signals(self, signals, topic=None):
         # Save published signals for assertions
         self.schema_validate(signals, topic)
-        self.published_signals.extend(signals)
+        self._signal_index.extend(self.published_signals, signals, topic)
         self._publisher_event.set()
         self._publisher_event.clear()
+        self._published_waiters.notify()
 
     def _override_block_config(self, block_config):
         """override a blocks config with the given block config"""
@@ -325,6 +403,38 @@ class NioServiceTestCase(NIOTestCase):
                 if not self._publisher_event.wait(timeout):
                     return
 
+    async def async_wait_for_processed_signals(
+            self, block_name, count=0, timeout=1, input_id=None):
+        """ Awaitable version of `wait_for_processed_signals`
+
+        Returns:
+            bool: False if the timeout expired before the signals were
+                processed
+        """
+        if input_id is not None:
+            signal_list = \
+                self._router.processed_signals_input[block_name][input_id]
+        else:
+            signal_list = self._router._processed_signals[block_name]
+        if not count:
+            # Wait for the block to process its next signals
+            count = len(signal_list) + 1
+        return await self._router.processed_waiters.wait_for(
+            lambda: count <= len(signal_list), timeout)
+
+    async def async_wait_for_published_signals(self, count=0, timeout=1):
+        """ Awaitable version of `wait_for_published_signals`
+
+        Returns:
+            bool: False if the timeout expired before the signals were
+                published
+        """
+        if not count:
+            # Wait for the next signals to be published
+            count = len(self.published_signals) + 1
+        return await self._published_waiters.wait_for(
+            lambda: count <= len(self.published_signals), timeout)
+
     def command_block(self, block_name, command_name, **kwargs):
         """call a specified blocks command with given keyword arguments"""
         try:
@@ -343,6 +453,9 @@ class NioServiceTestCase(NIOTestCase):
         root, then look in the same directory as service_tests/, which should
         be project root. then one more directory up to system root, stopping at
         the first topic_schema.json found.
+
+        Validators of its topics are compiled once per process while the file
+        is unchanged.
         """
         file_name = "topic_schema.json"
         file_paths = [os.path.abspath(
@@ -351,41 +464,39 @@ class NioServiceTestCase(NIOTestCase):
                          os.path.join(__file__, "../../", "tests", file_name)),
                       os.path.abspath(
                          os.path.join(__file__, "../../../", file_name))]
+        validators = {}
         for file_path in file_paths:
             if os.path.isfile(file_path):
-                with open(file_path, 'r') as json_file:
-                    try:
-                        self._schema = json.load(json_file)
-                    except Exception as e:
-                        self.fail(
-                            "Problem parsing topic validation file located at "
-                            "{}: {}".format(file_path, e))
-                    break
+                try:
+                    # topic env vars are replaced
+                    validators = compile_topic_schema(
+                        file_path, self._env_var_substitution)
+                except ValueError as e:
+                    self.fail(
+                        "Problem parsing topic validation file located at "
+                        "{}: {}".format(file_path, e))
+                except SchemaError as e:
+                    self.fail(
+                        "Invalid schema in topic validation file located at "
+                        "{}: {}".format(file_path, e.message))
+                break
         else:
             print('Could not find a topic schema file. If you wish to '
                   'do publisher/subscriber topic validation, put a '
                   '"topic_schema.json" file at {}, {}, or {}.'
                   .format(file_paths[0], file_paths[1], file_paths[2]))
-
-        # replace env vars for schema topics
-        if self._schema:
-            self._schema = {self._replace_env_vars({'topic': topic})['topic']:
-                            self._schema[topic] for topic in self._schema}
+        self._topic_validators = TopicValidators(
+            validators, self.schema_sampling)
 
     def schema_validate(self, signals, topic=None):
-        """validate each signal in a list against the given json schema.
-        Update any error information to be collected at the end of the test."""
-        if topic in self._schema:
-            for signal in signals:
-                try:
-                    jsonschema.validate(signal.to_dict(), self._schema[topic])
-                except Exception as e:
-                    print("Topic {} received an invalid signal: {}"
-                          .format(topic, signal))
-
-                    self._invalid_topics.update(
-                        {topic: " ".join(str(e).replace("\n", " ").split())}
-                    )
+        """validate a list of signals against the given json schema.
+        Every error of every invalid signal is collected, to be reported at
+        the end of the test. When sampling the topic, only some signals are
+        validated, see `schema_sampling`."""
+        for signal, errors in self._topic_validators.validate(signals, topic):
+            print("Topic {} received an invalid signal: {}"
+                  .format(topic, signal))
+            self._invalid_topics.setdefault(topic, []).extend(errors)
 
     def assert_num_signals_published(self, expected):
         """asserts that the amount of published signals is equal to expected"""
@@ -415,13 +526,66 @@ class NioServiceTestCase(NIOTestCase):
             raise AssertionError('Amount of processed signals not equal to {}.'
                                  ' Actual: {}'.format(expected, actual))
 
-    def assert_signal_published(self, signal_dict):
-        """asserts signal_dict is in the list of published signals"""
-        for published_signal in self.published_signals:
-            try:
-                self.assertDictEqual(published_signal.to_dict(), signal_dict)
-                return
-            except:
-                # Check next signal
-                continue
-        self.fail("Signal has not been published: {}".format(signal_dict))
+    def assert_signal_published(self, signal_dict, topic=None):
+        """asserts signal_dict is in the list of published signals, published
+        to topic when given"""
+        if not self._signal_index.count(
+                self.published_signals, signal_dict, topic):
+            self.fail(self._not_published(signal_dict, topic))
+
+    def assert_signals_published(self, signal_dicts, topic=None):
+        """asserts every signal dict in signal_dicts is in the list of
+        published signals, in any order, a signal dict listed several times
+        must be published as many times"""
+        failures = []
+        for signal_dict, count in count_expected(signal_dicts):
+            published = self._signal_index.count(
+                self.published_signals, signal_dict, topic)
+            if not published:
+                failures.append(self._not_published(signal_dict, topic))
+            elif published < count:
+                failures.append(
+                    "Signal published {} times, expected {}: {}".format(
+                        published, count, signal_dict))
+        if failures:
+            self.fail("\n".join(failures))
+
+    def assert_signals_published_exactly(self, signal_dicts, topic=None):
+        """asserts the published signals, published to topic when given, are
+        signal_dicts in any order, as many times as each is listed"""
+        self.assert_signals_published(signal_dicts, topic)
+        actual = self._signal_index.size(self.published_signals, topic)
+        if actual != len(signal_dicts):
+            extra = unexpected(self._signal_index.signals(
+                self.published_signals, topic), signal_dicts)
+            self.fail("{} signals published, expected {}. {}".format(
+                actual, len(signal_dicts),
+                "Unexpected signals: {}".format(extra) if extra else
+                "Signals were published more times than listed"))
+
+    def assert_signals_published_in_order(self, signal_dicts, topic=None):
+        """asserts signal_dicts are in the list of published signals in this
+        order, other signals may have been published in between"""
+        position = -1
+        for index, signal_dict in enumerate(signal_dicts):
+            found = self._signal_index.next_position(
+                self.published_signals, signal_dict, topic, position)
+            if found is None:
+                self.fail("Signal {} of {} has not been published{}:\n{}"
+                          .format(index, len(signal_dicts),
+                                  " after the previous ones" if index else "",
+                                  self._not_published(
+                                      signal_dict, topic, position)))
+            position = found
+
+    def _not_published(self, signal_dict, topic=None, after=-1):
+        """failure message of a signal not published, with the differences
+        from the nearest signal published"""
+        message = "Signal has not been published{}: {}".format(
+            " to {}".format(topic) if topic is not None else "", signal_dict)
+        nearest = self._signal_index.nearest(
+            self.published_signals, signal_dict, topic, after)
+        if nearest is None:
+            return message + "\nNo signals were published"
+        return "{}\nNearest published signal:\n{}".format(
+            message, diff(nearest, signal_dict))
@@ -0,0 +1,238 @@
+""" Index of the published signals, for assertions about them
+
+Signals are indexed by a hashable canonical form of their dict as they are
+published, per topic, so that finding whether and where a signal was
+published takes constant time rather than a scan of every signal.
+"""
+import difflib
+import pprint
+from bisect import bisect_right
+from collections import defaultdict
+from threading import Lock
+
+
+def canonical(value, unhashable=None):
+    """ Hashable form of a value, equal for values that compare equal
+
+    Containers are tagged with their kind, as a list never equals a tuple.
+
+    Args:
+        value: value to get the form of
+        unhashable (callable): hashable form of the unhashable values held,
+            TypeError is raised for them by default
+
+    Raises:
+        TypeError: when the value holds something unhashable
+    """
+    if isinstance(value, dict):
+        return dict, frozenset((key, canonical(item, unhashable))
+                               for key, item in value.items())
+    if isinstance(value, list):
+        return list, tuple(canonical(item, unhashable) for item in value)
+    if isinstance(value, tuple):
+        return tuple, tuple(canonical(item, unhashable) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return set, frozenset(value)
+    try:
+        hash(value)
+    except TypeError:
+        if unhashable is None:
+            raise
+        return unhashable(value)
+    return value
+
+
+def _by_repr(value):
+    return type(value), repr(value)
+
+
+def count_expected(signal_dicts):
+    """ Signal dicts expected with the number of times each is listed
+
+    Signal dicts holding something unhashable are grouped by the repr of
+    those values, and told apart by equality within a group.
+
+    Returns:
+        list: (signal dict, count) of each distinct signal dict, in order
+    """
+    # canonical dict -> [signal dict, count] of the distinct signal dicts
+    groups = {}
+    counts = []
+    for signal_dict in signal_dicts:
+        group = groups.setdefault(canonical(signal_dict, _by_repr), [])
+        for counted in group:
+            if counted[0] == signal_dict:
+                counted[1] += 1
+                break
+        else:
+            counted = [signal_dict, 1]
+            group.append(counted)
+            counts.append(counted)
+    return [tuple(counted) for counted in counts]
+
+
+def unexpected(signals, signal_dicts):
+    """ Signal dicts of signals equal to none of signal_dicts """
+    keys = set()
+    unhashable = []
+    for signal_dict in signal_dicts:
+        try:
+            keys.add(canonical(signal_dict))
+        except TypeError:
+            unhashable.append(signal_dict)
+    result = []
+    for signal in signals:
+        try:
+            if canonical(signal) in keys:
+                continue
+        except TypeError:
+            pass
+        if signal not in unhashable:
+            result.append(signal)
+    return result
+
+
+def _similarity(published, expected):
+    """ Items two signal dicts have in common, less the items they differ
+    by
+    """
+    same = sum(1 for key, value in expected.items()
+               if key in published and published[key] == value)
+    return 2 * same - len(expected) - len(published)
+
+
+def diff(published, expected):
+    """ Lines of differences from a published signal to the one expected,
+    as unittest shows them
+    """
+    return "\n".join(difflib.ndiff(
+        pprint.pformat(published).splitlines(),
+        pprint.pformat(expected).splitlines()))
+
+
+class SignalIndex(object):
+
+    """ Positions of the published signals by topic and canonical dict
+
+    The index follows a list of published signals, signals are appended to
+    it through `extend`. When the list is replaced or changed otherwise, the
+    index is rebuilt from it on next use, without the topics.
+
+    Signal dicts are taken when signals are published, a signal changed
+    after it was published is found as it was then.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._source = None
+        # (topic, canonical dict) -> positions of the signals, topic None
+        # for signals of any topic
+        self._positions = defaultdict(list)
+        # (topic, dict) of every signal, in order
+        self._signals = []
+        # positions of the signals with something unhashable, compared one
+        # by one
+        self._unindexed = []
+        # topic -> number of signals
+        self._sizes = defaultdict(int)
+
+    def extend(self, published, signals, topic=None):
+        """ Append signals published to a topic to the published list """
+        with self._lock:
+            self._follow(published)
+            published.extend(signals)
+            for signal in signals:
+                self._add(signal.to_dict(), topic)
+
+    def count(self, published, expected, topic=None):
+        """ Number of signals equal to expected
+
+        Args:
+            published (list): signals published
+            expected (dict): signal dict
+            topic (str): topic the signals were published to, any by
+                default
+        """
+        with self._lock:
+            self._follow(published)
+            return len(self._find(expected, topic))
+
+    def next_position(self, published, expected, topic=None, after=-1):
+        """ Position of the first signal equal to expected after position
+        `after`, None if not found, see count
+        """
+        with self._lock:
+            self._follow(published)
+            positions = self._find(expected, topic)
+            index = bisect_right(positions, after)
+            return positions[index] if index < len(positions) else None
+
+    def signals(self, published, topic=None):
+        """ Dicts of the signals published to a topic, any by default """
+        with self._lock:
+            self._follow(published)
+            return [signal for signal_topic, signal in self._signals
+                    if topic in (None, signal_topic)]
+
+    def size(self, published, topic=None):
+        """ Number of signals published to a topic, any by default """
+        with self._lock:
+            self._follow(published)
+            return self._sizes[topic]
+
+    def nearest(self, published, expected, topic=None, after=-1):
+        """ Published signal dict most similar to expected, None if none was
+        published to the topic after position `after`
+        """
+        with self._lock:
+            self._follow(published)
+            candidates = [signal for position, (signal_topic, signal) in
+                          enumerate(self._signals) if position > after and
+                          topic in (None, signal_topic)]
+        if not isinstance(expected, dict):
+            return candidates[0] if candidates else None
+        return max(candidates, default=None,
+                   key=lambda signal: _similarity(signal, expected))
+
+    def _follow(self, published):
+        """ Rebuild the index unless it follows the published list """
+        if published is self._source and \
+                len(published) == len(self._signals):
+            return
+        self._source = published
+        self._positions.clear()
+        self._signals = []
+        self._unindexed = []
+        self._sizes.clear()
+        for signal in published:
+            self._add(signal.to_dict(), None)
+
+    def _find(self, expected, topic):
+        """ Positions of the signals equal to expected, in order """
+        try:
+            found = self._positions.get((topic, canonical(expected)), [])
+        except TypeError:
+            return [position for position, (signal_topic, signal) in
+                    enumerate(self._signals) if signal == expected and
+                    topic in (None, signal_topic)]
+        if not self._unindexed:
+            return found
+        return sorted(found + [
+            position for position in self._unindexed
+            if self._signals[position][1] == expected and
+            topic in (None, self._signals[position][0])])
+
+    def _add(self, signal, topic):
+        position = len(self._signals)
+        self._signals.append((topic, signal))
+        self._sizes[None] += 1
+        if topic is not None:
+            self._sizes[topic] += 1
+        try:
+            key = canonical(signal)
+        except TypeError:
+            self._unindexed.append(position)
+            return
+        self._positions[(None, key)].append(position)
+        if topic is not None:
+            self._positions[(topic, key)].append(position)
@@ -0,0 +1,123 @@
+import asyncio
+from threading import Thread, get_ident
+from unittest.mock import patch
+
+from nio.router.context import RouterContext
+from nio.signal.base import Signal
+from nio.testing.test_case import NIOTestCase
+
+from ..async_router import AsyncServiceTestRouter
+from ..waiters import AsyncWaiters
+
+
+class _Block(object):
+
+    def __init__(self, name, router=None):
+        self._name = name
+        self.router = router
+        self.received = []
+        self.threads = set()
+
+    def name(self):
+        return self._name
+
+    def process_signals(self, signals, input_id=None):
+        self.received.extend(signal.value for signal in signals)
+        self.threads.add(get_ident())
+        if self.router is not None:
+            self.router.notify_signals(
+                self, signals, "__default_terminal_value")
+
+
+def _execution(*names):
+    """ Execution of blocks sending to the next one """
+    return [{"name": name, "receivers": {"__default_terminal_value": [
+        {"name": receiver, "input": "__default_terminal_value"}
+        for receiver in names[index + 1:index + 2]]}}
+        for index, name in enumerate(names)]
+
+
+class TestAsyncServiceTestRouter(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.router = AsyncServiceTestRouter(
+            executor_workers=2, blocking_blocks=["io"])
+        self.blocks = {"sender": _Block("sender"),
+                       "relay": _Block("relay", self.router),
+                       "io": _Block("io", self.router),
+                       "sink": _Block("sink")}
+        self.router.configure(RouterContext(
+            execution=_execution("sender", "relay", "io", "sink"),
+            blocks=self.blocks))
+
+    def tearDown(self):
+        self.router.stop()
+        super().tearDown()
+
+    def _notify(self, *values):
+        self.router.notify_signals(
+            self.blocks["sender"], [Signal({"value": value})
+                                    for value in values],
+            "__default_terminal_value")
+
+    def _wait_for_sink(self, count, timeout=1):
+        sink = self.blocks["sink"]
+        return asyncio.run(self.router.processed_waiters.wait_for(
+            lambda: len(sink.received) >= count, timeout))
+
+    def test_end_to_end(self):
+        """ Signals go through the loop and the executor, in order """
+        self.router.start()
+        for value in range(20):
+            self._notify(value)
+        self.assertTrue(self._wait_for_sink(20))
+        self.assertEqual(self.blocks["sink"].received, list(range(20)))
+        loop_threads = self.blocks["relay"].threads
+        self.assertEqual(len(loop_threads), 1)
+        self.assertTrue(self.blocks["io"].threads.isdisjoint(loop_threads))
+
+    def test_held_until_started(self):
+        """ Signals notified before the loop starts are delivered once it
+        does
+        """
+        self._notify(1, 2)
+        self.assertFalse(self._wait_for_sink(2, timeout=0.05))
+        self.router.start()
+        self.assertTrue(self._wait_for_sink(2))
+        self.assertEqual(self.blocks["sink"].received, [1, 2])
+
+    def test_dropped_after_stop(self):
+        """ Signals notified once stopped are dropped with a warning """
+        self.router.start()
+        self._notify(1)
+        self.assertTrue(self._wait_for_sink(1))
+        self.router.stop()
+        with patch.object(self.router.logger, "warning") as warning:
+            self._notify(2)
+        self.assertEqual(warning.call_count, 1)
+        self.assertIsNone(self.router._pending)
+        self.assertEqual(self.blocks["relay"].received, [1])
+
+
+class TestAsyncWaiters(NIOTestCase):
+
+    def test_notified_from_another_thread(self):
+        waiters = AsyncWaiters()
+        values = []
+
+        async def wait():
+            thread = Thread(target=lambda: (values.append(1),
+                                            waiters.notify()))
+            thread.start()
+            result = await waiters.wait_for(lambda: values, 1)
+            thread.join()
+            return result
+
+        self.assertTrue(asyncio.run(wait()))
+
+    def test_timeout(self):
+        waiters = AsyncWaiters()
+        self.assertFalse(asyncio.run(waiters.wait_for(lambda: False, 0.01)))
+        # the waiter is dropped once timed out
+        self.assertEqual(waiters._waiters, [])
@@ -0,0 +1,35 @@
+from nio.testing.test_case import NIOTestCase
+
+from ..benchmarks.bench_persistence import regressions
+
+
+def _result(id, seconds):
+    return {"id": id, "seconds": seconds}
+
+
+class TestRegressions(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.baseline = [_result("load/files/json/1024", 1.0),
+                         _result("save/files/json/1024", 2.0),
+                         _result("remove_collection/files/json/1024/10", 1.0)]
+
+    def test_within_tolerance(self):
+        results = [_result("load/files/json/1024", 1.25),
+                   _result("save/files/json/1024", 1.0)]
+        self.assertEqual(regressions(results, self.baseline, 0.25), [])
+
+    def test_over_tolerance(self):
+        results = [_result("load/files/json/1024", 1.26),
+                   _result("save/files/json/1024", 2.1)]
+        self.assertEqual(regressions(results, self.baseline, 0.25),
+                         [(results[0], self.baseline[0])])
+        self.assertEqual(len(regressions(results, self.baseline, 0)), 2)
+
+    def test_missing_operations(self):
+        """ Operations missing from either side are not regressions """
+        results = [_result("load/files/pickle/1024", 10.0)]
+        self.assertEqual(regressions(results, self.baseline, 0.25), [])
+        self.assertEqual(regressions([], self.baseline, 0.25), [])
+        self.assertEqual(regressions(results, [], 0.25), [])
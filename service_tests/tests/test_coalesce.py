@@ -0,0 +1,79 @@
+from nio.testing.test_case import NIOTestCase
+
+from ..coalesce import SignalCoalescer
+from ..modules.module_scheduler_synchronous.module import \
+    SynchronousSchedulerModule
+from ..modules.module_scheduler_synchronous.scheduler import SyncScheduler
+
+
+class TestSignalCoalescer(NIOTestCase):
+
+    def get_test_modules(self):
+        return {'scheduler'}
+
+    def get_module(self, module_name):
+        if module_name == 'scheduler':
+            return SynchronousSchedulerModule()
+
+    def setUp(self):
+        super().setUp()
+        self.delivered = []
+
+    def _coalescer(self, **kwargs):
+        coalescer = SignalCoalescer(**kwargs)
+        coalescer.bind(lambda block, signals, input_id:
+                       self.delivered.append((block, signals, input_id)))
+        return coalescer
+
+    def test_window(self):
+        """ Signals of a block input are delivered together at the end of
+        the window
+        """
+        coalescer = self._coalescer(window=1)
+        coalescer.add("block", [1], None)
+        coalescer.add("block", [2, 3], None)
+        coalescer.add("block", [4], "other")
+        coalescer.add("receiver", [5], None)
+        SyncScheduler.jump_ahead(0.5)
+        self.assertEqual(self.delivered, [])
+        SyncScheduler.jump_ahead(0.6)
+        self.assertCountEqual(self.delivered, [("block", [1, 2, 3], None),
+                                               ("block", [4], "other"),
+                                               ("receiver", [5], None)])
+
+    def test_max_size(self):
+        """ A buffer reaching the max size is delivered right away, its
+        window cancelled
+        """
+        coalescer = self._coalescer(window=1, max_size=3)
+        coalescer.add("block", [1, 2], None)
+        coalescer.add("block", [3], None)
+        self.assertEqual(self.delivered, [("block", [1, 2, 3], None)])
+        coalescer.add("block", [4], None)
+        SyncScheduler.jump_ahead(1.1)
+        self.assertEqual(self.delivered[1:], [("block", [4], None)])
+        SyncScheduler.jump_ahead(2)
+        self.assertEqual(len(self.delivered), 2)
+
+    def test_flush(self):
+        coalescer = self._coalescer(max_size=10)
+        coalescer.add("block", [1], None)
+        coalescer.add("block", [2], "other")
+        coalescer.flush()
+        self.assertCountEqual(self.delivered, [("block", [1], None),
+                                               ("block", [2], "other")])
+        coalescer.flush()
+        self.assertEqual(len(self.delivered), 2)
+
+    def test_stop(self):
+        """ Stopping discards the buffered signals and their windows """
+        coalescer = self._coalescer(window=1)
+        coalescer.add("block", [1], None)
+        coalescer.stop()
+        SyncScheduler.jump_ahead(2)
+        coalescer.flush()
+        self.assertEqual(self.delivered, [])
+
+    def test_needs_window_or_size(self):
+        with self.assertRaises(ValueError):
+            SignalCoalescer()
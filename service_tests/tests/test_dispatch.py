@@ -0,0 +1,172 @@
+from threading import Lock
+from time import monotonic, sleep
+
+from nio.testing.test_case import NIOTestCase
+
+from ..dispatch import MailboxDispatcher, QueueFullPolicy
+
+
+class _Block(object):
+
+    # blocks processing signals at once, across blocks
+    active = 0
+    most_active = 0
+    lock = Lock()
+
+    def __init__(self, name, delay=0):
+        self._name = name
+        self.delay = delay
+        self.received = []
+        self.inputs = []
+        self.concurrent = 0
+        self.most_concurrent = 0
+
+    def name(self):
+        return self._name
+
+    def process_signals(self, signals, input_id=None):
+        with self.lock:
+            _Block.active += 1
+            _Block.most_active = max(_Block.most_active, _Block.active)
+            self.concurrent += 1
+            self.most_concurrent = max(self.most_concurrent, self.concurrent)
+        sleep(self.delay)
+        self.received.extend(signals)
+        self.inputs.append(input_id)
+        with self.lock:
+            _Block.active -= 1
+            self.concurrent -= 1
+
+
+class TestMailboxDispatcher(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        _Block.active = _Block.most_active = 0
+        self.dispatcher = None
+
+    def tearDown(self):
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+        super().tearDown()
+
+    def _dispatcher(self, **kwargs):
+        self.dispatcher = MailboxDispatcher(**kwargs)
+        return self.dispatcher
+
+    def _wait_delivered(self, count, timeout=2):
+        deadline = monotonic() + timeout
+        while self.dispatcher.stats()["delivered"] < count:
+            if monotonic() > deadline:
+                self.fail("{} of {} deliveries made".format(
+                    self.dispatcher.stats()["delivered"], count))
+            sleep(0.005)
+
+    def test_order_per_block(self):
+        """ Each block gets its signals in the order they were sent """
+        dispatcher = self._dispatcher(workers=3, batch_size=2)
+        blocks = [_Block("block_{}".format(index)) for index in range(4)]
+        dispatcher.start()
+        for value in range(50):
+            for block in blocks:
+                dispatcher.dispatch(block, [value], "input")
+        self._wait_delivered(200)
+        for block in blocks:
+            self.assertEqual(block.received, list(range(50)))
+            self.assertEqual(block.inputs, ["input"] * 50)
+
+    def test_worker_limit(self):
+        """ No more blocks process signals at once than there are workers,
+        and a block processes one delivery at a time
+        """
+        dispatcher = self._dispatcher(workers=2)
+        blocks = [_Block("block_{}".format(index), 0.005)
+                  for index in range(4)]
+        dispatcher.start()
+        for value in range(5):
+            for block in blocks:
+                dispatcher.dispatch(block, [value])
+        self._wait_delivered(20)
+        self.assertLessEqual(_Block.most_active, 2)
+        for block in blocks:
+            self.assertEqual(block.most_concurrent, 1)
+
+    def test_queued_until_started(self):
+        dispatcher = self._dispatcher(workers=1)
+        block = _Block("block")
+        self.assertTrue(dispatcher.dispatch(block, [1]))
+        sleep(0.01)
+        self.assertEqual(block.received, [])
+        self.assertEqual(dispatcher.stats()["pending"], {"block": 1})
+        dispatcher.start()
+        self._wait_delivered(1)
+        self.assertEqual(block.received, [1])
+
+    def test_block_before_started(self):
+        """ Before the dispatcher starts, a full mailbox takes the signals
+        anyway, counted as overflowed
+        """
+        dispatcher = self._dispatcher(queue_depth=2)
+        block = _Block("block")
+        for value in range(5):
+            self.assertTrue(dispatcher.dispatch(block, [value]))
+        self.assertEqual(dispatcher.stats()["overflowed"], 3)
+        self.assertEqual(dispatcher.stats()["pending"], {"block": 5})
+        dispatcher.start()
+        self._wait_delivered(5)
+        self.assertEqual(block.received, list(range(5)))
+        self.assertEqual(dispatcher.stats()["dropped"], 0)
+
+    def test_drop_newest(self):
+        dispatcher = self._dispatcher(
+            queue_depth=2, full_policy=QueueFullPolicy.drop_newest)
+        block = _Block("block")
+        results = [dispatcher.dispatch(block, [value]) for value in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        dispatcher.start()
+        self._wait_delivered(2)
+        self.assertEqual(block.received, [0, 1])
+        self.assertEqual(dispatcher.stats()["dropped"], 2)
+
+    def test_drop_oldest(self):
+        dispatcher = self._dispatcher(
+            queue_depth=2, full_policy=QueueFullPolicy.drop_oldest)
+        block = _Block("block")
+        for value in range(4):
+            self.assertTrue(dispatcher.dispatch(block, [value]))
+        dispatcher.start()
+        self._wait_delivered(2)
+        self.assertEqual(block.received, [2, 3])
+        self.assertEqual(dispatcher.stats()["dropped"], 2)
+
+    def test_stop_discards_and_refuses(self):
+        dispatcher = self._dispatcher(workers=1)
+        block = _Block("block", 0.05)
+        dispatcher.start()
+        for value in range(5):
+            dispatcher.dispatch(block, [value])
+        dispatcher.stop()
+        self.assertFalse(dispatcher.dispatch(block, [5]))
+        self.assertLess(len(block.received), 5)
+        self.assertEqual(dispatcher.stats()["pending"], {})
+
+    def test_stopped_before_started(self):
+        """ Stopping a dispatcher not started refuses deliveries until it
+        starts
+        """
+        dispatcher = self._dispatcher()
+        block = _Block("block")
+        dispatcher.dispatch(block, [1])
+        dispatcher.stop()
+        self.assertFalse(dispatcher.dispatch(block, [2]))
+        self.assertEqual(dispatcher.stats()["pending"], {})
+        dispatcher.start()
+        self.assertTrue(dispatcher.dispatch(block, [3]))
+        self._wait_delivered(1)
+        self.assertEqual(block.received, [3])
+
+    def test_invalid_sizes(self):
+        with self.assertRaises(ValueError):
+            MailboxDispatcher(workers=0)
+        with self.assertRaises(ValueError):
+            MailboxDispatcher(queue_depth=0)
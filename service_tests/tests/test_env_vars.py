@@ -0,0 +1,54 @@
+from nio.testing.test_case import NIOTestCase
+
+from ..env_vars import EnvVarSubstitution, substitution
+
+
+class TestEnvVarSubstitution(NIOTestCase):
+
+    def test_nested(self):
+        """ Strings are replaced at any depth, config is left unchanged """
+        config = {"url": "[[HOST]]:[[PORT]]",
+                  "nested": {"list": ["[[HOST]]", {"port": "[[PORT]]"}]},
+                  "[[HOST]]": "key left as it is"}
+        result = EnvVarSubstitution(
+            {"HOST": "localhost", "PORT": 8080}).replace(config)
+        self.assertEqual(result, {
+            "url": "localhost:8080",
+            "nested": {"list": ["localhost", {"port": "8080"}]},
+            "[[HOST]]": "key left as it is"})
+        self.assertEqual(config["nested"]["list"][1], {"port": "[[PORT]]"})
+
+    def test_missing_vars(self):
+        """ Placeholders of variables not given are left as they are """
+        replace = EnvVarSubstitution({"HOST": "localhost"}).replace
+        self.assertEqual(replace({"url": "[[HOST]]/[[PATH]]"}),
+                         {"url": "localhost/[[PATH]]"})
+        self.assertEqual(EnvVarSubstitution({}).replace({"a": "[[HOST]]"}),
+                         {"a": "[[HOST]]"})
+
+    def test_non_string_values(self):
+        """ Values other than strings are kept, values are inserted as
+        strings and not substituted again
+        """
+        replace = EnvVarSubstitution({"COUNT": 3, "NESTED": "[[COUNT]]",
+                                      "FLAG": True}).replace
+        self.assertEqual(
+            replace({"count": 1, "ratio": 0.5, "on": None,
+                     "list": [1, "[[COUNT]]", False],
+                     "values": "[[FLAG]] [[NESTED]]"}),
+            {"count": 1, "ratio": 0.5, "on": None,
+             "list": [1, "3", False], "values": "True [[COUNT]]"})
+
+    def test_strings_cache_bounded(self):
+        substitution_ = EnvVarSubstitution({"NAME": "value"}, cache_size=2)
+        for index in range(5):
+            self.assertEqual(
+                substitution_.replace_string("[[NAME]]{}".format(index)),
+                "value{}".format(index))
+        self.assertEqual(substitution_._substitute.cache_info().currsize, 2)
+
+    def test_shared(self):
+        """ The same variables and values share their substitution """
+        self.assertIs(substitution({"A": 1, "B": "2"}),
+                      substitution({"B": 2, "A": "1"}))
+        self.assertIsNot(substitution({"A": 1}), substitution({"A": 2}))
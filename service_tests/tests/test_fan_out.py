@@ -0,0 +1,75 @@
+import json
+from copy import deepcopy
+
+from nio.signal.base import Signal
+from nio.testing.test_case import NIOTestCase
+
+from ..fan_out import CopyOnWriteSignal, isolate_copy_on_write
+
+
+class TestCopyOnWriteSignal(NIOTestCase):
+
+    def test_changes_after_notify_not_seen(self):
+        """ Receivers see the signal as it was when notified """
+        source = Signal({"a": {"x": 1}, "b": [1, 2], "name": "source"})
+        view, = CopyOnWriteSignal.views(source, 1)
+        source.a["x"] = 99
+        source.b.append(3)
+        source.name = "changed"
+        self.assertEqual(view.a, {"x": 1})
+        self.assertEqual(view.to_dict(),
+                         {"a": {"x": 1}, "b": [1, 2], "name": "source"})
+
+    def test_receivers_isolated(self):
+        """ Changes a receiver makes are not seen by the others """
+        source = Signal({"a": {"x": 1}, "b": [1]})
+        first, second, third = CopyOnWriteSignal.views(source, 3)
+        first.a["x"] = 2
+        second.b.append(2)
+        del third.a
+        self.assertEqual(second.a, {"x": 1})
+        self.assertEqual(third.b, [1])
+        self.assertEqual(first.to_dict(), {"a": {"x": 2}, "b": [1]})
+        self.assertEqual(second.to_dict(), {"a": {"x": 1}, "b": [1, 2]})
+        self.assertEqual(third.to_dict(), {"b": [1]})
+        self.assertEqual(source.to_dict(), {"a": {"x": 1}, "b": [1]})
+
+    def test_renotified_view(self):
+        """ A view notified again is snapshot with its own changes """
+        source = Signal({"a": {"x": 1}, "b": [1]})
+        view, = CopyOnWriteSignal.views(source, 1)
+        view.b.append(2)
+        renotified, = CopyOnWriteSignal.views(view, 1)
+        view.a["x"] = 2
+        view.b.append(3)
+        self.assertEqual(renotified.to_dict(), {"a": {"x": 1}, "b": [1, 2]})
+
+    def test_hidden_attributes(self):
+        """ Hidden dumps and dir() hold only the signal's attributes """
+        source = Signal({"a": {"x": 1}, "_hidden": [1], "name": "source"})
+        view, = CopyOnWriteSignal.views(source, 1)
+        self.assertFalse([name for name in dir(view)
+                          if name.startswith("_cow_")])
+        self.assertIn("a", dir(view))
+        dumped = view.to_dict(include_hidden=True)
+        self.assertEqual(dumped, source.to_dict(include_hidden=True))
+        json.dumps(dumped)
+
+    def test_copies_are_signals(self):
+        """ Copies of a view are plain signals """
+        source = Signal({"a": {"x": 1}})
+        view, = CopyOnWriteSignal.views(source, 1)
+        copied = deepcopy(view)
+        self.assertIs(type(copied), Signal)
+        self.assertEqual(copied.to_dict(), {"a": {"x": 1}})
+
+    def test_isolate_signal_lists(self):
+        """ Every receiver gets a list of views, other types are copied """
+        other = {"not": "a signal"}
+        lists = isolate_copy_on_write([Signal({"a": 1}), other], 2)
+        self.assertEqual(len(lists), 2)
+        for signals in lists:
+            self.assertIsInstance(signals[0], CopyOnWriteSignal)
+            self.assertEqual(signals[1], other)
+            self.assertIsNot(signals[1], other)
+        self.assertIsNot(lists[0][1], lists[1][1])
@@ -0,0 +1,109 @@
+import json
+
+from nio.router.context import RouterContext
+from nio.signal.base import Signal
+from nio.testing.test_case import NIOTestCase
+
+from ..instrumentation import Histogram, RouterInstrumentation
+from ..router import ServiceTestRouter
+
+
+class _Block(object):
+
+    def __init__(self, name, router=None, fail=False):
+        self._name = name
+        self.router = router
+        self.fail = fail
+
+    def name(self):
+        return self._name
+
+    def process_signals(self, signals, input_id=None):
+        if self.fail:
+            raise RuntimeError("failing block")
+        if self.router is not None:
+            self.router.notify_signals(
+                self, signals, "__default_terminal_value")
+
+
+class TestHistogram(NIOTestCase):
+
+    def test_buckets(self):
+        histogram = Histogram()
+        for seconds in (0.0000001, 0.000003, 0.000004, 0.001):
+            histogram.add(seconds)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 4)
+        self.assertEqual(snapshot["min"], 0.0000001)
+        self.assertEqual(snapshot["max"], 0.001)
+        self.assertEqual(snapshot["buckets"],
+                         {"<1us": 1, "<4us": 1, "<8us": 1, "<1024us": 1})
+
+    def test_empty(self):
+        self.assertIsNone(Histogram().snapshot()["mean"])
+
+
+class TestRouterInstrumentation(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.instrumentation = RouterInstrumentation(trace_size=3)
+        self.router = ServiceTestRouter(
+            True, instrumentation=self.instrumentation)
+        blocks = {"sender": _Block("sender"),
+                  "relay": _Block("relay", self.router),
+                  "sink": _Block("sink"),
+                  "failing": _Block("failing", fail=True)}
+        self.sender = blocks["sender"]
+        execution = [
+            {"name": "sender", "receivers": {"__default_terminal_value": [
+                {"name": "relay", "input": "__default_terminal_value"},
+                {"name": "failing", "input": "__default_terminal_value"}]}},
+            {"name": "relay", "receivers": {"__default_terminal_value": [
+                {"name": "sink", "input": "other"}]}},
+        ]
+        self.router.configure(
+            RouterContext(execution=execution, blocks=blocks))
+
+    def _notify(self, count):
+        self.router.notify_signals(
+            self.sender, [Signal({"value": value}) for value in range(count)],
+            "__default_terminal_value")
+
+    def test_hops_and_processes(self):
+        """ Every hop and process_signals call is accounted for """
+        self._notify(2)
+        self._notify(3)
+        snapshot = self.instrumentation.snapshot()
+        json.dumps(snapshot)
+        edges = {(edge["from"], edge["to"], edge["input"]):
+                 (edge["notifications"], edge["signals"])
+                 for edge in snapshot["edges"]}
+        self.assertEqual(edges, {("sender", "relay", None): (2, 5),
+                                 ("sender", "failing", None): (2, 5),
+                                 ("relay", "sink", "other"): (2, 5)})
+        blocks = snapshot["blocks"]
+        self.assertEqual(sorted(blocks), ["failing", "relay", "sink"])
+        for name in ("failing", "relay", "sink"):
+            self.assertEqual(blocks[name]["wall"]["count"], 2)
+            self.assertEqual(blocks[name]["cpu"]["count"], 2)
+        self.assertEqual(blocks["failing"]["exceptions"], 2)
+        self.assertEqual(blocks["relay"]["exceptions"], 0)
+        # the relay's time includes the sink's
+        self.assertEqual(
+            self.instrumentation.slowest_blocks(1), ["relay"])
+
+    def test_trace_keeps_latest_hops(self):
+        self._notify(1)
+        self._notify(2)
+        trace = self.instrumentation.snapshot()["trace"]
+        self.assertEqual([(hop["from"], hop["to"], hop["signals"])
+                          for hop in trace],
+                         [("sender", "relay", 2), ("relay", "sink", 2),
+                          ("sender", "failing", 2)])
+
+    def test_reset(self):
+        self._notify(1)
+        self.instrumentation.reset()
+        self.assertEqual(self.instrumentation.snapshot(),
+                         {"edges": [], "blocks": {}, "trace": []})
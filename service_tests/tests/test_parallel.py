@@ -0,0 +1,85 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+from nio.testing.test_case import NIOTestCase
+
+from ..parallel import _test_ids, discover, group_by_class, run
+
+TESTS = '''import unittest
+
+
+class TestPassing(unittest.TestCase):
+
+    def test_one(self):
+        pass
+
+    def test_two(self):
+        pass
+
+    @unittest.skip("skipped")
+    def test_skipped(self):
+        pass
+
+
+class TestFailing(unittest.TestCase):
+
+    def test_failing(self):
+        self.fail("failing")
+
+    def test_error(self):
+        raise RuntimeError("error")
+'''
+
+
+class TestParallel(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.top_level_dir = directory.name
+        # a namespace package holding a package of tests
+        self.start_dir = os.path.join(self.top_level_dir, "parallel_sample")
+        package = os.path.join(self.start_dir, "module", "tests")
+        os.makedirs(package)
+        for path in (os.path.join(self.start_dir, "module"), package):
+            open(os.path.join(path, "__init__.py"), "w").close()
+        with open(os.path.join(package, "test_sample.py"), "w") as file:
+            file.write(TESTS)
+        self.addCleanup(self._unimport)
+
+    def _unimport(self):
+        if self.top_level_dir in sys.path:
+            sys.path.remove(self.top_level_dir)
+        for name in list(sys.modules):
+            if name.split(".")[0] == "parallel_sample":
+                del sys.modules[name]
+
+    def test_discover_namespace_package(self):
+        """ Packages under a directory that is not one are discovered """
+        with self.assertRaises(ImportError):
+            unittest.defaultTestLoader.discover(
+                self.start_dir, top_level_dir=self.top_level_dir)
+        suite = discover(self.start_dir, top_level_dir=self.top_level_dir)
+        self.assertEqual(len(list(_test_ids(suite))), 5)
+
+    def test_group_by_class(self):
+        classes = group_by_class(
+            discover(self.start_dir, top_level_dir=self.top_level_dir))
+        prefix = "parallel_sample.module.tests.test_sample."
+        self.assertEqual(list(classes), [prefix + "TestPassing",
+                                         prefix + "TestFailing"])
+        self.assertEqual(len(classes[prefix + "TestFailing"]), 2)
+
+    def test_run(self):
+        """ Classes run in worker processes, their results are totalled """
+        stream = io.StringIO()
+        totals = run(self.start_dir, jobs=2,
+                     top_level_dir=self.top_level_dir, stream=stream)
+        self.assertEqual(totals, dict(run=5, failures=1, errors=1,
+                                      skipped=1))
+        self.assertIn("Ran 5 tests in 2 classes over 2 processes",
+                      stream.getvalue())
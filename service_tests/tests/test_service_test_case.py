@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import tempfile
+
+from ..modules.module_persistence_file.snapshot import SNAPSHOT_NAME, \
+    build_snapshot
+from ..service_test_case import NioServiceTestCase
+
+BLOCKS = {
+    "first": {"name": "first", "type": "Mocked",
+              "nested": {"value": 1}, "list": [1]},
+    "unused": {"name": "unused", "type": "Mocked"},
+}
+SERVICES = {
+    "Service": {"name": "Service", "mappings": [],
+                "execution": [{"name": "first", "receivers": {}}]},
+}
+
+
+class TestConfigsPerTest(NioServiceTestCase):
+
+    """ Tests of a process each get their own configs, the first test
+    changes nested values the second one must not see
+    """
+
+    service_name = "Service"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root_folder = tempfile.mkdtemp()
+        for collection, items in (("blocks", BLOCKS),
+                                  ("services", SERVICES)):
+            os.mkdir(os.path.join(cls.root_folder, collection))
+            for id, item in items.items():
+                with open(os.path.join(cls.root_folder, collection,
+                                       id + ".cfg"), "w") as file:
+                    json.dump(item, file)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root_folder)
+        super().tearDownClass()
+
+    def get_context(self, module_name, module):
+        context = super().get_context(module_name, module)
+        if module_name == "persistence":
+            context.root_folder = self.root_folder
+        return context
+
+    def mock_blocks(self):
+        return {"first": lambda signals: None}
+
+    def test_1_change_configs(self):
+        self.block_configs["first"]["nested"]["value"] = 2
+        self.block_configs["first"]["list"].append(2)
+        self.service_config["mappings"].append(
+            {"name": "first", "mapping": "other"})
+        self.service_configs["Service"]["execution"].clear()
+
+    def test_2_configs_unchanged(self):
+        self.assertEqual(self.block_configs["first"], BLOCKS["first"])
+        self.assertEqual(self.service_config, SERVICES["Service"])
+        self.assertEqual(self.service_configs, SERVICES)
+
+
+class TestSnapshotConfigs(TestConfigsPerTest):
+
+    """ Configs served from a snapshot, the blocks the service does not use
+    are not decoded
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        build_snapshot(cls.root_folder, extension=".cfg")
+
+    def get_context(self, module_name, module):
+        context = super().get_context(module_name, module)
+        if module_name == "persistence":
+            context.snapshot = os.path.join(self.root_folder, SNAPSHOT_NAME)
+        return context
+
+    def test_3_used_configs_decoded(self):
+        self.assertEqual(self.block_configs["first"], BLOCKS["first"])
+        self.assertIsNot(type(dict.get(self.block_configs, "unused")), dict)
+        self.assertEqual(self.block_configs, BLOCKS)
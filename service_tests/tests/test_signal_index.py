@@ -0,0 +1,122 @@
+from nio.signal.base import Signal
+from nio.testing.test_case import NIOTestCase
+
+from ..signal_index import SignalIndex, canonical, count_expected, \
+    unexpected
+
+
+class TestCanonical(NIOTestCase):
+
+    def test_equal_values(self):
+        self.assertEqual(canonical({"a": [1, {"b": {2, 3}}], "c": 1.0}),
+                         canonical({"c": 1, "a": [1, {"b": {3, 2}}]}))
+        self.assertNotEqual(canonical({"a": [1]}), canonical({"a": (1,)}))
+
+    def test_unhashable(self):
+        with self.assertRaises(TypeError):
+            canonical({"a": bytearray(b"1")})
+        self.assertEqual(canonical({"a": bytearray(b"1")}, repr),
+                         canonical({"a": bytearray(b"1")}, repr))
+
+
+class TestCountExpected(NIOTestCase):
+
+    def test_counts_in_order(self):
+        self.assertEqual(
+            count_expected([{"a": 1}, {"b": [2]}, {"a": 1}]),
+            [({"a": 1}, 2), ({"b": [2]}, 1)])
+
+    def test_unhashable(self):
+        """ Equal signal dicts holding unhashable values are counted
+        together, each distinct one apart
+        """
+        self.assertEqual(
+            count_expected([{"a": bytearray(b"1")}, {"a": bytearray(b"2")},
+                            {"a": bytearray(b"1")}]),
+            [({"a": bytearray(b"1")}, 2), ({"a": bytearray(b"2")}, 1)])
+
+    def test_unexpected(self):
+        signals = [{"a": 1}, {"a": bytearray(b"1")}, {"a": 2},
+                   {"a": bytearray(b"2")}]
+        self.assertEqual(
+            unexpected(signals, [{"a": 1}, {"a": bytearray(b"1")}]),
+            [{"a": 2}, {"a": bytearray(b"2")}])
+
+
+class TestSignalIndex(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.index = SignalIndex()
+        self.published = []
+
+    def _publish(self, topic, *signal_dicts):
+        signals = [Signal(signal_dict) for signal_dict in signal_dicts]
+        self.index.extend(self.published, signals, topic)
+        return signals
+
+    def test_count_by_topic(self):
+        self._publish("first", {"a": 1}, {"a": 2}, {"a": 1})
+        self._publish("second", {"a": 1})
+        self.assertEqual(self.index.count(self.published, {"a": 1}), 3)
+        self.assertEqual(
+            self.index.count(self.published, {"a": 1}, "first"), 2)
+        self.assertEqual(
+            self.index.count(self.published, {"a": 2}, "second"), 0)
+        self.assertEqual(self.index.size(self.published), 4)
+        self.assertEqual(self.index.size(self.published, "second"), 1)
+        self.assertEqual(self.index.signals(self.published, "second"),
+                         [{"a": 1}])
+
+    def test_next_position(self):
+        self._publish("first", {"a": 1}, {"a": 2}, {"a": 1})
+        self._publish("second", {"a": 1})
+        self.assertEqual(
+            self.index.next_position(self.published, {"a": 1}), 0)
+        self.assertEqual(
+            self.index.next_position(self.published, {"a": 1}, after=0), 2)
+        self.assertEqual(self.index.next_position(
+            self.published, {"a": 1}, "second", after=0), 3)
+        self.assertIsNone(
+            self.index.next_position(self.published, {"a": 2}, after=1))
+
+    def test_unhashable(self):
+        """ Signals holding unhashable values are found one by one """
+        self._publish(None, {"a": bytearray(b"1")}, {"a": 1},
+                      {"a": bytearray(b"1")})
+        self.assertEqual(
+            self.index.count(self.published, {"a": bytearray(b"1")}), 2)
+        self.assertEqual(self.index.next_position(
+            self.published, {"a": bytearray(b"1")}, after=0), 2)
+        self.assertEqual(self.index.count(self.published, {"a": 1}), 1)
+
+    def test_snapshot_at_publish(self):
+        """ Signals are found as they were when published """
+        signal, = self._publish("topic", {"a": 1})
+        signal.a = 2
+        self.assertEqual(self.index.count(self.published, {"a": 1}), 1)
+        self.assertEqual(self.index.count(self.published, {"a": 2}), 0)
+
+    def test_rebuilt_when_replaced(self):
+        """ A published list replaced or changed is indexed again, without
+        the topics
+        """
+        self._publish("topic", {"a": 1})
+        self.published = [Signal({"a": 2})]
+        self.assertEqual(self.index.count(self.published, {"a": 1}), 0)
+        self.assertEqual(self.index.count(self.published, {"a": 2}), 1)
+        self.published.append(Signal({"a": 3}))
+        self.assertEqual(self.index.size(self.published), 2)
+        self.assertEqual(self.index.size(self.published, "topic"), 0)
+
+    def test_nearest(self):
+        self._publish(None, {"a": 1, "b": 1}, {"a": 1, "b": 2, "c": 3},
+                      {"a": 2})
+        self.assertEqual(
+            self.index.nearest(self.published, {"a": 1, "b": 2}),
+            {"a": 1, "b": 2, "c": 3})
+        self.assertEqual(
+            self.index.nearest(self.published, {"a": 1}, after=1),
+            {"a": 2})
+        self.assertIsNone(
+            self.index.nearest(self.published, {"a": 1}, after=2))
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+
+from jsonschema import SchemaError
+from nio.signal.base import Signal
+from nio.testing.test_case import NIOTestCase
+
+from ..env_vars import substitution
+from ..topic_schema import TopicValidators, compile_topic_schema
+
+SCHEMA = {
+    "[[PREFIX]].readings": {
+        "type": "object",
+        "properties": {"value": {"type": "number"},
+                       "name": {"type": "string"}},
+        "required": ["value", "name"]},
+}
+
+
+class TestTopicSchema(NIOTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "topics.json")
+        self._write(SCHEMA)
+        self.substitution = substitution({"PREFIX": "sensors"})
+
+    def _write(self, schema):
+        with open(self.path, "w") as schema_file:
+            json.dump(schema, schema_file)
+
+    def test_compiled_once(self):
+        """ Validators are shared while the file is unchanged """
+        validators = compile_topic_schema(self.path, self.substitution)
+        self.assertEqual(list(validators), ["sensors.readings"])
+        self.assertIs(compile_topic_schema(self.path, self.substitution),
+                      validators)
+        self.assertIsNot(
+            compile_topic_schema(self.path, substitution({})), validators)
+
+    def test_compiled_again_when_changed(self):
+        validators = compile_topic_schema(self.path, self.substitution)
+        self._write(dict(SCHEMA, other={"type": "object"}))
+        # the size changes even when the mtime does not
+        changed = compile_topic_schema(self.path, self.substitution)
+        self.assertIsNot(changed, validators)
+        self.assertEqual(sorted(changed), ["other", "sensors.readings"])
+
+    def test_invalid_schema(self):
+        self._write({"topic": {"type": "not a type"}})
+        with self.assertRaises(SchemaError):
+            compile_topic_schema(self.path, self.substitution)
+        self._write({"topic": {"type": "object"}})
+        self.assertIn(
+            "topic", compile_topic_schema(self.path, self.substitution))
+
+    def test_every_error_reported(self):
+        """ Each invalid signal of a batch is reported with all its
+        errors
+        """
+        validators = TopicValidators(
+            compile_topic_schema(self.path, self.substitution))
+        self.assertIn("sensors.readings", validators)
+        valid = Signal({"value": 1, "name": "a"})
+        wrong_types = Signal({"value": "1", "name": 2})
+        missing = Signal({})
+        invalid = validators.validate(
+            [valid, wrong_types, missing], "sensors.readings")
+        self.assertEqual([signal for signal, _ in invalid],
+                         [wrong_types, missing])
+        self.assertCountEqual(invalid[0][1], [
+            "value: '1' is not of type 'number'",
+            "name: 2 is not of type 'string'"])
+        self.assertEqual(len(invalid[1][1]), 2)
+        self.assertEqual(validators.validate([missing], "unknown"), [])
+
+    def test_sampling(self):
+        """ 1 in every N signals of the topics matching a pattern is
+        validated, counting across batches
+        """
+        validators = TopicValidators(
+            compile_topic_schema(self.path, self.substitution),
+            sampling={"sensors.*": 3})
+        signals = [Signal({"index": index}) for index in range(5)]
+        invalid = validators.validate(signals[:2], "sensors.readings") + \
+            validators.validate(signals[2:], "sensors.readings")
+        self.assertEqual([signal.index for signal, _ in invalid], [0, 3])
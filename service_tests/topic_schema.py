@@ -0,0 +1,113 @@
+""" Validation of the signals of topics against a topic schema
+
+Validators are compiled once per topic schema file, the schema of each
+topic is checked then, and shared by the tests of a process while the file
+is unchanged. Signals are validated in batches, every error of every
+signal is reported.
+"""
+import json
+import os
+from fnmatch import fnmatchcase
+from itertools import count
+from threading import Lock
+
+from jsonschema.validators import validator_for
+
+# (path, substitution) -> ((mtime, size), topic -> validator)
+_compiled = {}
+_compiled_lock = Lock()
+
+
+def compile_topic_schema(path, substitution):
+    """ Validators of the topics of a topic schema file
+
+    Args:
+        path (str): topic schema file, a json object of topic -> schema
+        substitution (EnvVarSubstitution): replaces the environment
+            variables of topic names
+
+    Returns:
+        dict: topic -> validator
+
+    Raises:
+        ValueError: when the file is not json
+        jsonschema.SchemaError: when the schema of a topic is not valid
+    """
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _compiled_lock:
+        compiled = _compiled.get((path, substitution))
+        if compiled is not None and compiled[0] == key:
+            return compiled[1]
+    with open(path) as schema_file:
+        schema = json.load(schema_file)
+    validators = {}
+    for topic, topic_schema in schema.items():
+        validator_class = validator_for(topic_schema)
+        validator_class.check_schema(topic_schema)
+        validators[substitution.replace_string(topic)] = \
+            validator_class(topic_schema)
+    with _compiled_lock:
+        _compiled[(path, substitution)] = (key, validators)
+    return validators
+
+
+class TopicValidators(object):
+
+    """ Validates the signals of topics, optionally sampling them
+
+    When sampling, 1 in every N signals of the topics matching a pattern is
+    validated, counting signals per topic, for long runs over busy topics.
+    """
+
+    def __init__(self, validators, sampling=None):
+        """
+        Args:
+            validators (dict): topic -> validator, see compile_topic_schema
+            sampling (dict): topic pattern, as in fnmatch -> N, signals of
+                other topics are all validated
+        """
+        self._validators = validators
+        self._sampling = sampling or {}
+        # topic -> (N, signal counter) of the topics sampled
+        self._sampled = {}
+        self._lock = Lock()
+
+    def __contains__(self, topic):
+        return topic in self._validators
+
+    def validate(self, signals, topic):
+        """ Validate a batch of signals of a topic
+
+        Returns:
+            list: (signal, error messages) of the invalid signals
+        """
+        validator = self._validators.get(topic)
+        if validator is None:
+            return []
+        every, counter = self._sampler(topic)
+        invalid = []
+        for signal in signals:
+            if every > 1 and next(counter) % every:
+                continue
+            errors = [self._message(error) for error in
+                      validator.iter_errors(signal.to_dict())]
+            if errors:
+                invalid.append((signal, errors))
+        return invalid
+
+    def _sampler(self, topic):
+        with self._lock:
+            sampler = self._sampled.get(topic)
+            if sampler is None:
+                every = next((every for pattern, every in
+                              self._sampling.items()
+                              if fnmatchcase(topic, pattern)), 1)
+                sampler = self._sampled[topic] = (every, count())
+            return sampler
+
+    @staticmethod
+    def _message(error):
+        path = "/".join(str(part) for part in error.absolute_path)
+        return "{}: {}".format(path, error.message) if path else \
+            error.message
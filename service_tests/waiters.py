@@ -0,0 +1,57 @@
+import asyncio
+from threading import Lock
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class AsyncWaiters(object):
+
+    """ Lets coroutines wait for conditions updated from other threads
+
+    Coroutines register a predicate with `wait_for` and are woken up on
+    their own event loop once a call to `notify` finds the predicate true.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._waiters = []
+
+    async def wait_for(self, predicate, timeout=None):
+        """ Wait until predicate() is true
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future(), predicate)
+        with self._lock:
+            if predicate():
+                return True
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def notify(self):
+        """ Wake up the waiters whose predicate became true """
+        if not self._waiters:
+            return
+        with self._lock:
+            ready = [waiter for waiter in self._waiters if waiter[2]()]
+            for waiter in ready:
+                self._waiters.remove(waiter)
+        for loop, future, _ in ready:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # the waiting loop is already closed
+                pass